@@ -0,0 +1,66 @@
+"""Run slow work off the Tk thread and hand the results back to it"""
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BackgroundTasks:
+    """Thread pool whose callbacks always run on the Tk main loop
+
+    Tk is not thread safe, so workers never touch widgets. They put callbacks
+    on a queue that the main loop drains with ``after`` while work is pending.
+    """
+
+    def __init__(self, root, max_workers=2, poll_interval=15):
+        self.root = root
+        self.poll_interval = poll_interval
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="background"
+        )
+        self.callbacks = queue.Queue()
+        self.pending = 0
+        self.polling = False
+
+    def post(self, callback, *args):
+        """Schedule callback(*args) on the Tk thread; safe to call from any thread"""
+        self.callbacks.put((callback, args))
+
+    def run(self, func, *args, on_success=None, on_error=None):
+        """Call func(*args) on a worker thread and report back on the Tk thread"""
+        self.pending += 1
+
+        def task():
+            try:
+                result = func(*args)
+            except Exception as e:
+                self.post(self._finish, on_error, e)
+            else:
+                self.post(self._finish, on_success, result)
+
+        future = self.executor.submit(task)
+        self._schedule_poll()
+        return future
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _finish(self, callback, value):
+        self.pending -= 1
+        if callback is not None:
+            callback(value)
+
+    def _schedule_poll(self):
+        if not self.polling:
+            self.polling = True
+            self.root.after(self.poll_interval, self._poll)
+
+    def _poll(self):
+        self.polling = False
+        while True:
+            try:
+                callback, args = self.callbacks.get_nowait()
+            except queue.Empty:
+                break
+            callback(*args)
+
+        if self.pending or not self.callbacks.empty():
+            self._schedule_poll()
@@ -0,0 +1,433 @@
+"""Benchmark load, draw, hit-testing, drag and save on synthetic keymaps
+
+Usage:
+    python benchmarks/run.py                       run everything
+    python benchmarks/run.py --quick               small sizes, fewer repeats
+    python benchmarks/run.py --json results.json   also write machine-readable results
+    python benchmarks/run.py --baseline old.json   exit 1 if anything got slower
+
+GUI benchmarks need a display. Without one, a virtual X server (Xvfb) is
+started if it is installed; otherwise they are skipped.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Make the editor's modules importable when run as a script
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import imaging
+import keymap
+import lint
+from model_store import plain_keymap, store_keymap
+from pyramid import TilePyramid
+from spatial import SpatialGrid
+
+from synthetic import SCREENSHOT_SIZES, make_keymap, make_screenshot
+
+BUTTON_COUNTS = (10, 1000, 10000, 50000)
+QUICK_BUTTON_COUNTS = (10, 1000)
+QUICK_SCREENSHOTS = ("1080p",)
+
+# Screen the editor is assumed to fit images into
+SCREEN_SIZE = (1920, 1080)
+
+# A benchmark regresses when its median grows by more than this fraction
+# and by more than MIN_REGRESSION_MS, so timer noise on tiny cases is ignored
+DEFAULT_TOLERANCE = 0.25
+MIN_REGRESSION_MS = 1.0
+
+HIT_TESTS = 1000
+DRAG_EVENTS = 120
+
+# Runs main.main() in a fresh interpreter and prints the wall-clock time at
+# which the first file dialog would open, then cancels it
+FIRST_DIALOG_SCRIPT = """
+import time
+import main
+
+def cancel(**options):
+    print(time.time(), flush=True)
+    return ""
+
+main.filedialog.askopenfilename = cancel
+# Ignore any saved session so the dialog is always reached
+main.main(["--choose"])
+"""
+
+
+def measure(func, repeat, setup=None):
+    """Time func(*setup()) repeat times and summarize in milliseconds"""
+    times = []
+    for _ in range(repeat):
+        args = setup() if setup is not None else ()
+        start = time.perf_counter()
+        func(*args)
+        times.append((time.perf_counter() - start) * 1000)
+    return {
+        "median_ms": round(statistics.median(times), 3),
+        "min_ms": round(min(times), 3),
+        "max_ms": round(max(times), 3),
+        "runs": repeat,
+    }
+
+
+def random_points(count, width, height, seed=0):
+    rng = random.Random(seed)
+    return [(rng.uniform(0, width), rng.uniform(0, height)) for _ in range(count)]
+
+
+def run_python(code):
+    """Run code in a fresh interpreter; returns (start time, stdout)"""
+    start = time.time()
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return start, result.stdout
+
+
+def measure_wall(func, repeat):
+    """Like measure(), for funcs that return their own duration in seconds"""
+    times = [func() * 1000 for _ in range(repeat)]
+    return {
+        "median_ms": round(statistics.median(times), 3),
+        "min_ms": round(min(times), 3),
+        "max_ms": round(max(times), 3),
+        "runs": repeat,
+    }
+
+
+def startup_benchmarks(repeat, gui):
+    """Yield (name, result) for cold starts in a new interpreter"""
+
+    def import_main():
+        start, _ = run_python("import main")
+        return time.time() - start
+
+    yield "startup/import_main", measure_wall(import_main, repeat)
+
+    if gui:
+
+        def first_dialog():
+            start, output = run_python(FIRST_DIALOG_SCRIPT)
+            return float(output.split()[0]) - start
+
+        yield "startup/first_dialog", measure_wall(first_dialog, repeat)
+
+
+def write_inputs(directory, counts, screenshots):
+    """Write the synthetic keymaps and screenshots once, up front"""
+    keymaps = {}
+    for count in counts:
+        data = make_keymap(count)
+        paths = {}
+        for name, binary in (("playmap", False), ("json", False), ("bin.playmap", True)):
+            path = os.path.join(directory, f"keymap_{count}.{name}")
+            keymap.save_keymap(data, path, binary=binary)
+            paths[name] = path
+        keymaps[count] = paths
+
+    images = {}
+    for label in screenshots:
+        path = os.path.join(directory, f"screenshot_{label}.png")
+        make_screenshot(*SCREENSHOT_SIZES[label]).save(path, compress_level=1)
+        images[label] = path
+    return keymaps, images
+
+
+def headless_benchmarks(keymaps, images, repeat):
+    """Yield (name, result) for everything that runs without Tk"""
+    display_width, display_height = SCREEN_SIZE[0] - 100, SCREEN_SIZE[1] - 100
+
+    for count, paths in keymaps.items():
+        yield f"load_plist/{count}", measure(
+            lambda: store_keymap(keymap.load_plist(paths["playmap"])), repeat
+        )
+        yield f"load_binary_plist/{count}", measure(
+            lambda: store_keymap(keymap.load_plist(paths["bin.playmap"])), repeat
+        )
+        yield f"load_json/{count}", measure(
+            lambda: store_keymap(keymap.load_json(paths["json"])), repeat
+        )
+
+        data = store_keymap(keymap.load_json(paths["json"]))
+        # What save_data hands to its worker thread, then the encoders
+        yield f"save_plist/{count}", measure(
+            lambda: keymap.dump_keymap(plain_keymap(data), "out.playmap"), repeat
+        )
+        yield f"save_binary_plist/{count}", measure(
+            lambda: keymap.dump_keymap(plain_keymap(data), "out.playmap", True), repeat
+        )
+        yield f"save_json/{count}", measure(
+            lambda: keymap.dump_keymap(plain_keymap(data), "out.json"), repeat
+        )
+        yield f"lint/{count}", measure(lambda: lint.lint_keymap(data), repeat)
+
+        grid = SpatialGrid()
+        buttons = data["buttonModels"]
+        for row, _, x_coord, y_coord, size in buttons.iter_drawable():
+            grid.insert(
+                row,
+                *keymap.circle_geometry(
+                    x_coord, y_coord, size, display_width, display_height
+                ),
+            )
+        points = random_points(HIT_TESTS, display_width, display_height)
+        yield f"hit_test_x{HIT_TESTS}/{count}", measure(
+            lambda: [grid.hit(x, y, 4) for x, y in points], repeat
+        )
+
+    for label, path in images.items():
+        width, height = imaging.read_size(path)
+        size = imaging.fit_size(width, height, display_width, display_height)
+        yield f"decode_image/{label}", measure(
+            lambda: imaging.decode_display_image(path, size), repeat
+        )
+        yield f"build_pyramid/{label}", measure(
+            lambda: TilePyramid(imaging.Image.open(path)).build(), max(1, repeat // 2)
+        )
+
+
+def start_virtual_display():
+    """Start Xvfb if there is no display; returns (process, reason)"""
+    if os.environ.get("DISPLAY") or sys.platform in ("darwin", "win32"):
+        return None, None
+    xvfb = shutil.which("Xvfb")
+    if xvfb is None:
+        return None, "no display and Xvfb is not installed"
+
+    for number in range(99, 199):
+        if os.path.exists(f"/tmp/.X11-unix/X{number}"):
+            continue
+        process = subprocess.Popen(
+            [xvfb, f":{number}", "-screen", "0", "6400x3600x24", "-nolisten", "tcp"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            if os.path.exists(f"/tmp/.X11-unix/X{number}"):
+                os.environ["DISPLAY"] = f":{number}"
+                return process, None
+            if process.poll() is not None:
+                break
+            time.sleep(0.05)
+        process.kill()
+    return None, "Xvfb failed to start"
+
+
+class FakeEvent:
+    """Stands in for Tk events passed to the editor's handlers"""
+
+    def __init__(self, x, y, state=0):
+        self.x = x
+        self.y = y
+        self.state = state
+
+
+def pump(root, until, timeout=120):
+    """Run the Tk event loop until until() is true"""
+    deadline = time.monotonic() + timeout
+    while not until():
+        if time.monotonic() > deadline:
+            raise Exception("Timed out waiting for the editor")
+        root.update()
+        time.sleep(0.001)
+
+
+def gui_benchmarks(keymaps, images, repeat):
+    """Yield (name, result) for the editor itself, on a real Tk root"""
+    import tkinter as tk
+
+    import main
+
+    root = tk.Tk()
+    try:
+        viewer = main.ImageViewer(root)
+        # Measure cold decodes, not the on-disk scaled image cache
+        viewer.image_cache = None
+
+        for label, path in images.items():
+
+            def load(path=path):
+                viewer.current_image = None
+                viewer.load_image(path)
+                pump(root, lambda: viewer.current_image is not None)
+
+            yield f"load_image/{label}", measure(load, repeat)
+
+        # Everything else is drawn over the smallest screenshot
+        load(next(iter(images.values())))
+
+        for count, paths in keymaps.items():
+            viewer.plist_data = store_keymap(keymap.load_json(paths["json"]))
+
+            def clear():
+                for layer in viewer.layers.layers.values():
+                    layer.clear()
+                viewer.layers.mark_dirty()
+                root.update()
+                return ()
+
+            def draw():
+                viewer.draw_button_models()
+                root.update_idletasks()
+
+            yield f"draw_button_models/{count}", measure(draw, repeat, setup=clear)
+
+            def mark_dirty():
+                viewer.layers.mark_dirty()
+                return ()
+
+            yield f"redraw_unchanged/{count}", measure(draw, repeat, setup=mark_dirty)
+
+            points = random_points(HIT_TESTS, viewer.canvas_width, viewer.canvas_height)
+            yield f"find_button_at_x{HIT_TESTS}/{count}", measure(
+                lambda: [viewer.find_button_at(x, y) for x, y in points], repeat
+            )
+
+            yield f"drag_x{DRAG_EVENTS}/{count}", measure(
+                lambda: drag(viewer, root), repeat
+            )
+    finally:
+        root.destroy()
+
+
+def drag(viewer, root):
+    """Grab the button nearest the centre and drag it in a circle, then release"""
+    buttons = viewer.buttons
+    rows = [row for row in range(len(buttons)) if buttons.is_drawable(row)]
+    if not rows:
+        return
+    row = min(
+        rows,
+        key=lambda r: (buttons.x[r] - 0.5) ** 2 + (buttons.y[r] - 0.5) ** 2,
+    )
+    start_x = float(buttons.x[row]) * viewer.content_width
+    start_y = float(buttons.y[row]) * viewer.content_height
+
+    viewer.on_click(FakeEvent(start_x, start_y))
+    for step in range(DRAG_EVENTS):
+        offset = step % 40
+        viewer.on_drag(FakeEvent(start_x + offset, start_y + offset / 2))
+        # Several motion events arrive per frame on a fast pointer
+        if step % 4 == 3:
+            root.update()
+    viewer.on_release(FakeEvent(start_x + 10, start_y + 5))
+    root.update_idletasks()
+    viewer.undo()
+
+
+def compare(results, baseline, tolerance):
+    """Annotate results with baseline limits and return the names that regressed"""
+    regressed = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        base = previous["median_ms"]
+        limit = max(base * (1 + tolerance), base + MIN_REGRESSION_MS)
+        result["baseline_ms"] = base
+        result["limit_ms"] = round(limit, 3)
+        result["regressed"] = result["median_ms"] > limit
+        if result["regressed"]:
+            regressed.append(name)
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="small sizes, 3 repeats")
+    parser.add_argument("--repeat", type=int, help="runs per benchmark (default: 7)")
+    parser.add_argument("--no-gui", action="store_true", help="skip the Tk benchmarks")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="results file to check for regressions")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help="allowed slowdown as a fraction of the baseline (default: 0.25)",
+    )
+    args = parser.parse_args(argv)
+
+    counts = QUICK_BUTTON_COUNTS if args.quick else BUTTON_COUNTS
+    screenshots = QUICK_SCREENSHOTS if args.quick else tuple(SCREENSHOT_SIZES)
+    repeat = args.repeat or (3 if args.quick else 7)
+
+    results = {}
+    skipped = []
+    xvfb = None
+    with tempfile.TemporaryDirectory(prefix="keymap-bench-") as directory:
+        keymaps, images = write_inputs(directory, counts, screenshots)
+
+        gui = False
+        if args.no_gui:
+            skipped.append("gui: disabled with --no-gui")
+        else:
+            xvfb, reason = start_virtual_display()
+            if reason:
+                skipped.append(f"gui: {reason}")
+            else:
+                gui = True
+
+        suites = [
+            startup_benchmarks(repeat, gui),
+            headless_benchmarks(keymaps, images, repeat),
+        ]
+        if gui:
+            suites.append(gui_benchmarks(keymaps, images, repeat))
+
+        try:
+            for suite in suites:
+                for name, result in suite:
+                    results[name] = result
+                    print(f"{name:<36} {result['median_ms']:>10.2f} ms", flush=True)
+        finally:
+            if xvfb is not None:
+                xvfb.terminate()
+
+    regressed = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressed = compare(results, baseline, args.tolerance)
+        for name in regressed:
+            result = results[name]
+            print(
+                f"REGRESSION {name}: {result['median_ms']:.2f} ms "
+                f"> {result['limit_ms']:.2f} ms (baseline {result['baseline_ms']:.2f} ms)"
+            )
+
+    for note in skipped:
+        print(f"skipped {note}")
+
+    if args.json:
+        report = {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": repeat,
+            "tolerance": args.tolerance,
+            "skipped": skipped,
+            "results": results,
+        }
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
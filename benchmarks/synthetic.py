@@ -0,0 +1,85 @@
+"""Synthetic keymaps and screenshots for the benchmark suite"""
+import random
+
+from PIL import Image, ImageDraw
+
+import keycodes
+
+# Codes a keyboard button can be bound to
+KEY_CODES = [code for code in keycodes.CodeToKeys if code >= 0]
+
+SCREENSHOT_SIZES = {
+    "1080p": (1920, 1080),
+    "4K": (3840, 2160),
+    "6K": (6016, 3384),
+}
+
+
+def make_keymap(button_count, seed=0):
+    """Keymap data with button_count buttons spread over the screen
+
+    Buttons are laid out on a jittered grid so their density (and with it
+    the number of overlaps) stays realistic as the count grows. A joystick
+    and a mouse area are included as in real playmaps.
+    """
+    rng = random.Random(seed)
+    columns = max(1, int(button_count**0.5 * 1.6))
+    rows = max(1, -(-button_count // columns))
+    size = min(8.0, max(0.2, 90 / columns))
+
+    buttons = []
+    for i in range(button_count):
+        code = rng.choice(KEY_CODES)
+        col, row = divmod(i, rows)
+        buttons.append(
+            {
+                "keyCode": code,
+                "keyName": keycodes.CodeToKeys[code],
+                "transform": {
+                    "size": round(size * rng.uniform(0.8, 1.2), 4),
+                    "xCoord": round((col + rng.uniform(0.2, 0.8)) / columns, 6),
+                    "yCoord": round((row + rng.uniform(0.2, 0.8)) / rows, 6),
+                },
+            }
+        )
+
+    return {
+        "buttonModels": buttons,
+        "draggableButtonModels": [],
+        "joystickModel": [
+            {
+                "upKeyCode": 26,
+                "rightKeyCode": 7,
+                "downKeyCode": 22,
+                "leftKeyCode": 4,
+                "keyName": "Keyboard",
+                "transform": {"size": 20.0, "xCoord": 0.15, "yCoord": 0.75},
+            }
+        ],
+        "mouseAreaModel": [
+            {"keyName": "Mouse", "transform": {"size": 25.0, "xCoord": 0.7, "yCoord": 0.5}}
+        ],
+    }
+
+
+def make_screenshot(width, height, seed=0):
+    """An RGB image with gradients and shapes, so it compresses like a screenshot"""
+    rng = random.Random(seed)
+    gradient = Image.linear_gradient("L").resize((width, height))
+    image = Image.merge(
+        "RGB",
+        (
+            gradient,
+            gradient.transpose(Image.Transpose.ROTATE_90).resize((width, height)),
+            Image.new("L", (width, height), 96),
+        ),
+    )
+
+    draw = ImageDraw.Draw(image)
+    for _ in range(200):
+        x = rng.randrange(width)
+        y = rng.randrange(height)
+        radius = rng.randrange(10, max(11, width // 20))
+        color = tuple(rng.randrange(256) for _ in range(3))
+        draw.ellipse((x - radius, y - radius, x + radius, y + radius), fill=color)
+    return image
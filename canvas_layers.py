@@ -0,0 +1,618 @@
+"""Retained-mode canvas layers that only touch the Tk items whose model changed"""
+from collections import OrderedDict
+
+from PIL import ImageTk
+
+import keymap
+from model_store import ButtonStore
+from spatial import SpatialGrid
+
+# Clicks this many pixels outside a circle's outline still pick it
+PICK_TOLERANCE = 4
+
+BUTTON_COLOR = "red"
+SELECTED_COLOR = "#1E90FF"
+CONFLICT_COLOR = "orange"
+
+
+class ButtonLayer:
+    """Owns the circle and label items drawn for each row of a ButtonStore
+
+    Every model index keeps its canvas items and the signature they were drawn
+    from, so a change to one button costs one or two Tk calls instead of a
+    delete-and-redraw of the whole layout. Items are keyed by store row, and
+    the store is the only copy of the button data.
+    """
+
+    def __init__(
+        self,
+        canvas,
+        circle_tag="button_circle",
+        text_tag="button_text",
+        selected_tag="selected",
+    ):
+        self.canvas = canvas
+        self.circle_tag = circle_tag
+        self.text_tag = text_tag
+        self.selected_tag = selected_tag
+        self.selected = set()  # model indices; survives redraws
+        self.items = {}  # model index -> [circle_id, text_id, signature]
+        self.button_circles = {}  # circle_id -> button_index/text_id
+        self.text_to_circle = {}  # text_id -> circle_id
+        self.index = SpatialGrid()  # circle_id -> circle geometry
+        self.hover_item = None
+        self.conflicts = set()  # circle_ids highlighted as overlapping
+        self.visible = True
+
+    def forget(self):
+        """Drop all bookkeeping after the canvas items were deleted elsewhere"""
+        self.items = {}
+        self.button_circles.clear()
+        self.text_to_circle = {}
+        self.index.clear()
+        self.hover_item = None
+        self.conflicts = set()
+
+    def clear(self):
+        """Delete every item owned by this layer"""
+        self.canvas.delete(self.circle_tag)
+        self.canvas.delete(self.text_tag)
+        self.forget()
+
+    def sync(self, buttons, width, height):
+        """Bring the canvas in line with a ButtonStore, touching only changed items"""
+        seen = set()
+
+        for i, key_name, x_coord, y_coord, size in buttons.iter_drawable():
+            seen.add(i)
+            self.update(i, key_name, x_coord, y_coord, size, width, height)
+
+        for i in [i for i in self.items if i not in seen]:
+            self.remove(i)
+
+    def update(self, index, key_name, x_coord, y_coord, size, width, height):
+        """Create or adjust the items of a single button model"""
+        center_x, center_y, radius = keymap.circle_geometry(
+            x_coord, y_coord, size, width, height
+        )
+        signature = (center_x, center_y, radius, key_name)
+
+        entry = self.items.get(index)
+        if entry is None:
+            # Draw circle (outline only for visibility)
+            circle_id = self.canvas.create_oval(
+                center_x - radius,
+                center_y - radius,
+                center_x + radius,
+                center_y + radius,
+                outline=self._color(index),
+                width=2,
+                fill="",
+                tags=self._tags(index, self.circle_tag),
+                state=self._state(),
+            )
+            text_id = self._create_text(index, center_x, center_y, key_name)
+            self.items[index] = [circle_id, text_id, signature]
+            self.index.insert(circle_id, center_x, center_y, radius)
+        else:
+            circle_id, text_id, old_signature = entry
+            if signature != old_signature:
+                self.canvas.coords(
+                    circle_id,
+                    center_x - radius,
+                    center_y - radius,
+                    center_x + radius,
+                    center_y + radius,
+                )
+                if text_id and not key_name:
+                    self.canvas.delete(text_id)
+                    self.text_to_circle.pop(text_id, None)
+                    text_id = None
+                elif text_id:
+                    self.canvas.coords(text_id, center_x, center_y)
+                    if key_name != old_signature[3]:
+                        self.canvas.itemconfigure(text_id, text=key_name)
+                else:
+                    text_id = self._create_text(index, center_x, center_y, key_name)
+                entry[1] = text_id
+                entry[2] = signature
+                self.index.move(circle_id, center_x, center_y, radius)
+
+        if text_id:
+            self.text_to_circle[text_id] = circle_id
+
+        # Keep the mapping between circle ID and model index current
+        self.button_circles[circle_id] = {"button_index": index, "text_id": text_id}
+
+    def remove(self, index):
+        """Delete the items of a single button model"""
+        circle_id, text_id, _ = self.items.pop(index)
+        self.canvas.delete(circle_id)
+        if text_id:
+            self.canvas.delete(text_id)
+            self.text_to_circle.pop(text_id, None)
+        self.button_circles.pop(circle_id, None)
+        self.index.remove(circle_id)
+        self.selected.discard(index)
+        self.conflicts.discard(circle_id)
+        if self.hover_item == circle_id:
+            self.hover_item = None
+
+    def set_selection(self, indices):
+        """Select exactly the given model indices, restyling only those that change"""
+        indices = set(indices)
+        for index in self.selected - indices:
+            self._style_selected(index, False)
+        for index in indices - self.selected:
+            self._style_selected(index, True)
+        self.selected = {index for index in indices if index in self.items}
+
+    def _style_selected(self, index, selected):
+        entry = self.items.get(index)
+        if entry is None:
+            return
+        for item in entry[:2]:
+            if item is None:
+                continue
+            if selected:
+                self.canvas.addtag_withtag(self.selected_tag, item)
+            else:
+                self.canvas.dtag(item, self.selected_tag)
+        color = SELECTED_COLOR if selected else BUTTON_COLOR
+        self.canvas.itemconfigure(entry[0], outline=color)
+        if entry[1]:
+            self.canvas.itemconfigure(entry[1], fill=color)
+
+    def in_rect(self, x1, y1, x2, y2):
+        """Return the model indices of buttons centred inside a rectangle"""
+        return [
+            self.button_circles[circle_id]["button_index"]
+            for circle_id in self.index.in_rect(x1, y1, x2, y2)
+        ]
+
+    def shift_selection(self, dx, dy):
+        """Move every selected item with a single Tk call"""
+        self.canvas.move(self.selected_tag, dx, dy)
+
+    def drag_selection(self, dx, dy):
+        """Track a drag of the selection in the spatial index and flag overlaps
+
+        (dx, dy) is the pixel offset from where the selection was last
+        adopted. Only the moved circles' grid buckets are updated and only
+        their neighbours are examined, so each frame costs O(k) in the number
+        of nearby buttons. Circles the selection lands on are outlined in
+        CONFLICT_COLOR.
+        """
+        moving = set()
+        for index in self.selected:
+            entry = self.items.get(index)
+            if entry is None:
+                continue
+            center_x, center_y, radius, _ = entry[2]
+            self.index.move(entry[0], center_x + dx, center_y + dy, radius)
+            moving.add(entry[0])
+
+        conflicts = set()
+        for circle_id in moving:
+            others = [
+                other
+                for other in self.index.neighbours(circle_id)
+                if other not in moving
+            ]
+            if others:
+                conflicts.add(circle_id)
+                conflicts.update(others)
+        self._show_conflicts(conflicts)
+
+    def clear_conflicts(self):
+        self._show_conflicts(set())
+
+    def _show_conflicts(self, conflicts):
+        # Restyle only the circles whose state changed
+        for circle_id in self.conflicts - conflicts:
+            index = self.button_circles[circle_id]["button_index"]
+            self.canvas.itemconfigure(circle_id, outline=self._color(index))
+        for circle_id in conflicts - self.conflicts:
+            self.canvas.itemconfigure(circle_id, outline=CONFLICT_COLOR)
+        self.conflicts = conflicts
+
+    def scale_selection(self, pivot_x, pivot_y, factor):
+        """Scale every selected item about a pivot with a single Tk call"""
+        self.canvas.scale(self.selected_tag, pivot_x, pivot_y, factor, factor)
+
+    def adopt(self, index, key_name, x_coord, y_coord, size, width, height):
+        """Record new model geometry for items that were already moved on the canvas
+
+        Used after batched tag operations: it updates the bookkeeping and the
+        spatial index without any Tk calls.
+        """
+        center_x, center_y, radius = keymap.circle_geometry(
+            x_coord, y_coord, size, width, height
+        )
+        entry = self.items[index]
+        entry[2] = (center_x, center_y, radius, key_name)
+        self.index.move(entry[0], center_x, center_y, radius)
+
+    def _color(self, index):
+        return SELECTED_COLOR if index in self.selected else BUTTON_COLOR
+
+    def _tags(self, index, tag):
+        if index in self.selected:
+            return (tag, self.selected_tag)
+        return tag
+
+    def hit(self, x, y):
+        """Return the circle ID of the button at canvas position (x, y), or None"""
+        if not self.visible:
+            return None
+        circle_id = self.index.hit(x, y, PICK_TOLERANCE)
+        if circle_id is not None:
+            return circle_id
+
+        # Long labels can stick out of small circles; Tk already tracks the
+        # item under the pointer as "current", so resolve that in O(1)
+        for item in self.canvas.find_withtag("current"):
+            if item in self.text_to_circle:
+                return self.text_to_circle[item]
+        return None
+
+    def set_hover(self, circle_id):
+        """Thicken the outline of the hovered button"""
+        if circle_id == self.hover_item:
+            return
+        if self.hover_item is not None:
+            self.canvas.itemconfigure(self.hover_item, width=2)
+        if circle_id is not None:
+            self.canvas.itemconfigure(circle_id, width=3)
+        self.hover_item = circle_id
+
+    def _create_text(self, index, center_x, center_y, key_name):
+        # Draw key name if available - use original keyName from the file
+        if not key_name:
+            return None
+        return self.canvas.create_text(
+            center_x,
+            center_y,
+            text=key_name,
+            fill=self._color(index),
+            font=("Arial", 14, "bold"),
+            tags=self._tags(index, self.text_tag),
+            state=self._state(),
+        )
+
+    def _state(self):
+        return "normal" if self.visible else "hidden"
+
+    def set_visible(self, visible):
+        """Show or hide every item of the layer with one Tk call per tag"""
+        self.visible = visible
+        self.canvas.itemconfigure(self.circle_tag, state=self._state())
+        self.canvas.itemconfigure(self.text_tag, state=self._state())
+        if not visible:
+            self.set_hover(None)
+
+
+class ModelLayer:
+    """Draws the rows of one non-button model array (joysticks, mouse areas...)
+
+    Like ButtonLayer, every row keeps its items and the signature they were
+    drawn from, so syncing an unchanged layout makes no Tk calls. Rows are
+    drawn as circles or squares sized like buttons.
+    """
+
+    def __init__(self, canvas, tag, color, shape="oval", dash=None):
+        self.canvas = canvas
+        self.tag = tag
+        self.color = color
+        self.shape = shape
+        self.dash = dash
+        self.items = {}  # row -> [shape_id, text_id, signature]
+        self.rows = {}  # shape_id -> row
+        self.index = SpatialGrid()  # shape_id -> circle geometry
+        self.visible = True
+
+    def forget(self):
+        self.items = {}
+        self.rows = {}
+        self.index.clear()
+
+    def clear(self):
+        self.canvas.delete(self.tag)
+        self.forget()
+
+    def sync(self, store, width, height):
+        """Bring the canvas in line with a ButtonStore, touching only changed items"""
+        seen = set()
+        for row, key_name, x_coord, y_coord, size in store.iter_drawable():
+            seen.add(row)
+            self.update(row, key_name, x_coord, y_coord, size, width, height)
+
+        for row in [row for row in self.items if row not in seen]:
+            self.remove(row)
+
+    def update(self, row, key_name, x_coord, y_coord, size, width, height):
+        """Create or adjust the items of a single row"""
+        center_x, center_y, radius = keymap.circle_geometry(
+            x_coord, y_coord, size, width, height
+        )
+        signature = (center_x, center_y, radius, key_name)
+        bounds = (
+            center_x - radius,
+            center_y - radius,
+            center_x + radius,
+            center_y + radius,
+        )
+
+        entry = self.items.get(row)
+        if entry is None:
+            create = (
+                self.canvas.create_rectangle
+                if self.shape == "rectangle"
+                else self.canvas.create_oval
+            )
+            shape_id = create(
+                *bounds,
+                outline=self.color,
+                width=2,
+                dash=self.dash,
+                fill="",
+                tags=self.tag,
+                state=self._state(),
+            )
+            text_id = self.canvas.create_text(
+                center_x,
+                center_y,
+                text=key_name,
+                fill=self.color,
+                font=("Arial", 12, "bold"),
+                tags=self.tag,
+                state=self._state(),
+            )
+            self.items[row] = [shape_id, text_id, signature]
+            self.rows[shape_id] = row
+            self.index.insert(shape_id, center_x, center_y, radius)
+            return
+
+        shape_id, text_id, old_signature = entry
+        if signature == old_signature:
+            return
+        self.canvas.coords(shape_id, *bounds)
+        self.canvas.coords(text_id, center_x, center_y)
+        if key_name != old_signature[3]:
+            self.canvas.itemconfigure(text_id, text=key_name)
+        entry[2] = signature
+        self.index.move(shape_id, center_x, center_y, radius)
+
+    def remove(self, row):
+        shape_id, text_id, _ = self.items.pop(row)
+        self.canvas.delete(shape_id)
+        self.canvas.delete(text_id)
+        self.rows.pop(shape_id, None)
+        self.index.remove(shape_id)
+
+    def shift(self, row, dx, dy):
+        """Move one row's items by a pixel offset without touching the bookkeeping"""
+        shape_id, text_id, _ = self.items[row]
+        self.canvas.move(shape_id, dx, dy)
+        self.canvas.move(text_id, dx, dy)
+
+    def hit(self, x, y):
+        """Return the row drawn at canvas position (x, y), or None"""
+        if not self.visible:
+            return None
+        shape_id = self.index.hit(x, y, PICK_TOLERANCE)
+        return None if shape_id is None else self.rows[shape_id]
+
+    def _state(self):
+        return "normal" if self.visible else "hidden"
+
+    def set_visible(self, visible):
+        self.visible = visible
+        self.canvas.itemconfigure(self.tag, state=self._state())
+
+
+class DiffLayer:
+    """Marks the changes of a keymap diff: where buttons were and where they went
+
+    Diffs are short and only redrawn on zoom or refresh, so the layer just
+    deletes and recreates its items instead of keeping them in sync.
+    """
+
+    COLORS = {
+        "removed": "#9E9E9E",
+        "added": "#00E676",
+        "moved": "#FF9800",
+        "resized": "#03A9F4",
+        "rebound": "#FFEB3B",
+    }
+
+    def __init__(self, canvas, tag="diff_overlay"):
+        self.canvas = canvas
+        self.tag = tag
+
+    def clear(self):
+        self.canvas.delete(self.tag)
+
+    def _geometry(self, entry, width, height):
+        transform = entry.get("transform") if isinstance(entry, dict) else None
+        if not isinstance(transform, dict):
+            return None
+        try:
+            return keymap.button_geometry(transform, width, height)
+        except TypeError:
+            return None
+
+    def _circle(self, geometry, color, dash=None, line_width=2):
+        center_x, center_y, radius = geometry
+        self.canvas.create_oval(
+            center_x - radius,
+            center_y - radius,
+            center_x + radius,
+            center_y + radius,
+            outline=color,
+            width=line_width,
+            dash=dash,
+            tags=self.tag,
+        )
+
+    def show(self, changes, width, height):
+        """Draw merge.Change tuples over the layers, replacing what was shown"""
+        self.clear()
+        for change in changes:
+            color = self.COLORS.get(change.kind)
+            if color is None:
+                continue
+            old = self._geometry(change.old, width, height)
+            new = self._geometry(change.new, width, height)
+
+            if change.kind == "removed" and old is not None:
+                self._circle(old, color, dash=(3, 3))
+                self.canvas.create_line(
+                    old[0] - old[2] * 0.7,
+                    old[1] - old[2] * 0.7,
+                    old[0] + old[2] * 0.7,
+                    old[1] + old[2] * 0.7,
+                    fill=color,
+                    width=2,
+                    tags=self.tag,
+                )
+            elif change.kind == "added" and new is not None:
+                self._circle(new, color, line_width=4)
+            elif change.kind == "moved" and old is not None and new is not None:
+                # Ghost at the old position and an arrow to the new one
+                self._circle(old, color, dash=(3, 3))
+                self.canvas.create_line(
+                    old[0],
+                    old[1],
+                    new[0],
+                    new[1],
+                    fill=color,
+                    width=2,
+                    arrow="last",
+                    tags=self.tag,
+                )
+            elif change.kind == "resized" and old is not None and new is not None:
+                self._circle((new[0], new[1], old[2]), color, dash=(3, 3))
+            elif change.kind == "rebound" and new is not None:
+                old_name = change.old.get("keyName") if change.old else None
+                self.canvas.create_text(
+                    new[0],
+                    new[1] - new[2] - 8,
+                    text=f"was {old_name}" if old_name else "rebound",
+                    fill=color,
+                    font=("Arial", 10, "bold"),
+                    tags=self.tag,
+                )
+        self.canvas.tag_raise(self.tag)
+
+
+class LayerStack:
+    """One layer per keymap model array, each redrawn only when marked dirty
+
+    Hidden layers are skipped entirely: they stay dirty and catch up the
+    next time they are shown.
+    """
+
+    def __init__(self):
+        self.layers = {}  # model key -> ButtonLayer or ModelLayer
+        self.dirty = set()
+
+    def add(self, key, layer):
+        self.layers[key] = layer
+        self.dirty.add(key)
+
+    def mark_dirty(self, key=None):
+        """Flag one layer (or, with no key, every layer) for the next render"""
+        if key is None:
+            self.dirty.update(self.layers)
+        else:
+            self.dirty.add(key)
+
+    def forget(self):
+        """Drop all bookkeeping after the canvas items were deleted elsewhere"""
+        for layer in self.layers.values():
+            layer.forget()
+        self.mark_dirty()
+
+    def render(self, data, width, height):
+        """Sync every dirty, visible layer with its model array in data
+
+        Layers go in the order they were added, so ones drawn for the first
+        time stack bottom to top the same way on every run.
+        """
+        for key in self.layers:
+            if key not in self.dirty or not self.layers[key].visible:
+                continue
+            store = data.get(key) if isinstance(data, dict) else None
+            if isinstance(store, ButtonStore):
+                self.layers[key].sync(store, width, height)
+            else:
+                self.layers[key].clear()
+            self.dirty.discard(key)
+
+    def set_visible(self, key, visible, data, width, height):
+        self.layers[key].set_visible(visible)
+        if visible and key in self.dirty:
+            self.render(data, width, height)
+
+    def hit(self, x, y, keys):
+        """Return (key, row) of the first layer in keys with an item at (x, y)"""
+        for key in keys:
+            row = self.layers[key].hit(x, y)
+            if row is not None:
+                return key, row
+        return None
+
+
+class TileLayer:
+    """Shows the visible tiles of a TilePyramid as canvas image items
+
+    Tiles scrolled out of view are removed from the canvas, while their
+    PhotoImages stay in a small LRU so panning back is free. Nothing larger
+    than one tile is ever handed to Tk.
+    """
+
+    def __init__(self, canvas, tag="image_tile", max_cached_tiles=192):
+        self.canvas = canvas
+        self.tag = tag
+        self.max_cached_tiles = max_cached_tiles
+        self.photos = OrderedDict()  # (scale, level, col, row) -> PhotoImage
+        self.visible = {}  # (scale, level, col, row) -> (canvas item, PhotoImage)
+
+    def forget(self):
+        """Drop all bookkeeping after the canvas items were deleted elsewhere"""
+        self.visible = {}
+        self.photos.clear()
+
+    def hide(self):
+        self.canvas.delete(self.tag)
+        self.visible = {}
+
+    def show(self, pyramid, scale, x1, y1, x2, y2):
+        """Display the tiles covering the canvas rectangle (x1, y1)-(x2, y2)"""
+        wanted = {}
+        for level, col, row, bounds in pyramid.visible_tiles(scale, x1, y1, x2, y2):
+            wanted[(scale, level, col, row)] = bounds
+
+        for key in [key for key in self.visible if key not in wanted]:
+            self.canvas.delete(self.visible.pop(key)[0])
+
+        for key, bounds in wanted.items():
+            if key in self.visible:
+                continue
+            photo = self.photos.get(key)
+            if photo is None:
+                photo = ImageTk.PhotoImage(pyramid.render_tile(*key))
+                self.photos[key] = photo
+                while len(self.photos) > self.max_cached_tiles:
+                    self.photos.popitem(last=False)
+            else:
+                self.photos.move_to_end(key)
+
+            item = self.canvas.create_image(
+                bounds[0], bounds[1], anchor="nw", image=photo, tags=self.tag
+            )
+            # Keep tiles underneath the button overlay
+            self.canvas.tag_lower(item)
+            # Visible tiles hold their own reference in case the LRU drops them
+            self.visible[key] = (item, photo)
@@ -0,0 +1,561 @@
+"""Headless batch processing of keymaps: validate, convert and rewrite whole libraries"""
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import history
+import keymap
+import library
+import lint
+import merge
+import model_store
+import overlay
+import thumbnails
+
+FORMAT_EXTENSIONS = {"playmap": ".playmap", "plist": ".plist", "json": ".json"}
+
+# Appended to a keymap's name for its rendered overlay
+OVERLAY_SUFFIX = ".overlay.png"
+
+
+def iter_keymap_files(paths):
+    """Yield keymap files from files and directory trees without listing them up front"""
+    for path in paths:
+        if os.path.isfile(path):
+            yield path
+            continue
+
+        pending = [path]
+        while pending:
+            directory = pending.pop()
+            try:
+                entries = sorted(os.scandir(directory), key=lambda entry: entry.name)
+            except OSError as e:
+                print(f"SKIP {directory}: {e.strerror}", file=sys.stderr)
+                continue
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                elif keymap.is_keymap_file(entry.name):
+                    yield entry.path
+
+
+def run_parallel(func, items, jobs):
+    """Run func over items on a process pool, yielding results as they finish
+
+    Only a bounded window of tasks is in flight at once, so huge directory
+    trees are streamed instead of being materialized as futures.
+    """
+    if jobs == 1:
+        for item in items:
+            yield func(item)
+        return
+
+    window = jobs * 4
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        in_flight = set()
+        for item in items:
+            in_flight.add(executor.submit(func, item))
+            if len(in_flight) >= window:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in in_flight:
+            yield future.result()
+
+
+def output_path(source, fmt, out_dir, root):
+    """Work out where a converted keymap (or, with fmt None, its overlay) goes"""
+    stem = os.path.splitext(source)[0]
+    base = stem + (FORMAT_EXTENSIONS[fmt] if fmt else OVERLAY_SUFFIX)
+    if not out_dir:
+        return base
+    relative = os.path.relpath(base, root) if root else os.path.basename(base)
+    return os.path.join(out_dir, relative)
+
+
+def paired_screenshot(path):
+    """The screenshot next to a keymap file, as the library pairs them"""
+    directory = os.path.dirname(path) or "."
+    try:
+        images = sorted(
+            name for name in os.listdir(directory) if keymap.is_image_file(name)
+        )
+    except OSError:
+        return None
+    image_name = library.pair_screenshot(os.path.basename(path), images)
+    return os.path.join(directory, image_name) if image_name else None
+
+
+def validate_task(path):
+    try:
+        data = keymap.load_keymap(path)
+    except Exception as e:
+        return path, False, [str(e)]
+    problems = keymap.validate_keymap(data)
+    return path, not problems, problems
+
+
+def lint_task(args):
+    path, aspect, strict = args
+    try:
+        data = keymap.load_keymap(path)
+        diagnostics = lint.lint_keymap(data, aspect)
+    except Exception as e:
+        # One bad file fails on its own instead of aborting the batch
+        return path, False, [str(e)]
+    failing = (lint.ERROR, lint.WARNING) if strict else (lint.ERROR,)
+    ok = not any(diagnostic.severity in failing for diagnostic in diagnostics)
+    return path, ok, [lint.format_diagnostic(diagnostic) for diagnostic in diagnostics]
+
+
+def convert_task(args):
+    path, destination, binary = args
+    try:
+        data = keymap.load_keymap(path)
+        os.makedirs(os.path.dirname(destination) or ".", exist_ok=True)
+        keymap.save_keymap(data, destination, binary=binary)
+    except Exception as e:
+        return path, False, [str(e)]
+    return path, True, [f"-> {destination}"]
+
+
+def rewrite_task(args):
+    path, clamp, precision = args
+    try:
+        data = keymap.load_keymap(path)
+        changed = keymap.rewrite_keymap(data, clamp=clamp, precision=precision)
+        if changed:
+            keymap.save_keymap(data, path)
+    except Exception as e:
+        return path, False, [str(e)]
+    return path, True, [f"{changed} values changed"] if changed else []
+
+
+def render_task(args):
+    path, image_path, destination, scale, labels = args
+    try:
+        if image_path is None:
+            raise Exception("No screenshot found next to the keymap; pass --image")
+        data = keymap.load_keymap(path)
+        if not isinstance(data, dict):
+            raise Exception("Top level object is not a dictionary")
+        image = overlay.render_overlay(image_path, data, scale, labels)
+        os.makedirs(os.path.dirname(destination) or ".", exist_ok=True)
+        image.save(destination)
+    except Exception as e:
+        return path, False, [str(e)]
+    return path, True, [f"-> {destination}"]
+
+
+def report(results, verbose):
+    """Print one line per file and return the process exit code"""
+    total = 0
+    failed = 0
+    for path, ok, messages in results:
+        total += 1
+        if not ok:
+            failed += 1
+        if ok and not verbose and not messages:
+            continue
+        print(f"{'OK  ' if ok else 'FAIL'} {path}")
+        for message in messages:
+            print(f"     {message}")
+
+    print(f"{total} files processed, {failed} failed")
+    return 1 if failed else 0
+
+
+def command_validate(options):
+    files = iter_keymap_files(options.paths)
+    return report(run_parallel(validate_task, files, options.jobs), options.verbose)
+
+
+def command_lint(options):
+    tasks = (
+        (path, options.aspect, options.strict)
+        for path in iter_keymap_files(options.paths)
+    )
+    return report(run_parallel(lint_task, tasks, options.jobs), options.verbose)
+
+
+def command_convert(options):
+    def tasks():
+        for path in options.paths:
+            root = path if os.path.isdir(path) else None
+            for source in iter_keymap_files([path]):
+                destination = output_path(source, options.to, options.out_dir, root)
+                yield source, destination, options.binary
+
+    return report(run_parallel(convert_task, tasks(), options.jobs), options.verbose)
+
+
+def command_rewrite(options):
+    tasks = (
+        (path, options.clamp, options.precision)
+        for path in iter_keymap_files(options.paths)
+    )
+    return report(run_parallel(rewrite_task, tasks, options.jobs), options.verbose)
+
+
+def command_render(options):
+    if options.scale <= 0:
+        print("--scale must be greater than 0", file=sys.stderr)
+        return 2
+
+    def tasks():
+        for path in options.paths:
+            if os.path.isdir(path):
+                pairs = (
+                    (entry.path, screenshot)
+                    for entry, screenshot in library.iter_folder(path)
+                )
+                root = path
+            else:
+                pairs = [(path, options.image or paired_screenshot(path))]
+                root = None
+            for source, image_path in pairs:
+                destination = output_path(source, None, options.out_dir, root)
+                yield source, image_path, destination, options.scale, options.labels
+
+    return report(run_parallel(render_task, tasks(), options.jobs), options.verbose)
+
+
+def command_diff(options):
+    try:
+        old = keymap.load_keymap(options.old)
+        new = keymap.load_keymap(options.new)
+    except Exception as e:
+        print(f"FAIL {e}", file=sys.stderr)
+        return 2
+    changes = merge.diff_keymaps(old, new, options.aspect)
+
+    if options.json:
+        summaries = [merge.change_summary(change) for change in changes]
+        print(json.dumps(summaries, indent=2, default=str))
+    else:
+        for change in changes:
+            print(merge.format_change(change))
+        print(f"{len(changes)} changes")
+    # Like diff(1): 1 when the keymaps differ
+    return 1 if changes else 0
+
+
+def command_merge(options):
+    try:
+        base = keymap.load_keymap(options.base)
+        ours = keymap.load_keymap(options.ours)
+        theirs = keymap.load_keymap(options.theirs)
+    except Exception as e:
+        print(f"FAIL {e}", file=sys.stderr)
+        return 2
+
+    data = model_store.store_keymap(dict(ours))
+    result = merge.merge_keymaps(base, data, theirs, options.aspect)
+    history.apply_deltas(data, result.deltas)
+    for key, value in result.replaced.items():
+        if value is merge.MISSING:
+            data.pop(key, None)
+        else:
+            data[key] = value
+
+    output = options.output or options.ours
+    # git hands merge drivers temp files without an extension, so the format
+    # (and binary plists) follow ours unless the output name says otherwise
+    with open(options.ours, "rb") as f:
+        head = f.read(8)
+    format_name = output
+    if not keymap.is_keymap_file(output):
+        is_json = head.lstrip()[:1] in (b"{", b"[")
+        format_name = "merged.json" if is_json else "merged.playmap"
+    payload = keymap.dump_keymap(
+        model_store.plain_keymap(data),
+        format_name,
+        binary=options.binary or head.startswith(b"bplist"),
+    )
+    keymap.write_atomic(output, payload)
+
+    other = os.path.basename(options.theirs)
+    for conflict in result.conflicts:
+        print(f"CONFLICT {merge.format_conflict(conflict, other)}")
+    print(
+        f"{len(result.deltas) + len(result.replaced)} changes merged, "
+        f"{len(result.conflicts)} conflicts -> {output}"
+    )
+    # Conflicts keep our side; a non-zero exit makes git flag the file
+    return 1 if result.conflicts else 0
+
+
+def command_index(options):
+    def mapper(func, items):
+        return run_parallel(func, items, options.jobs)
+
+    failed = 0
+    with library.Library(options.database) as index:
+        if options.remove:
+            known = index.roots()
+            for root in map(os.path.abspath, options.paths):
+                if root not in known:
+                    print(f"SKIP {root}: not in the library", file=sys.stderr)
+                    failed += 1
+                    continue
+                index.remove_root(root)
+                print(f"{root}: removed")
+            return 1 if failed else 0
+
+        if options.paths:
+            results = {}
+            for root in options.paths:
+                results[root] = (
+                    index.scan(root, mapper) if os.path.isdir(root) else None
+                )
+        else:
+            results = index.rescan(mapper)
+            if not results:
+                print("No folders indexed yet; pass one or more directories")
+                return 1
+        for root, result in results.items():
+            if result is None:
+                print(f"SKIP {root}: not a directory", file=sys.stderr)
+                failed += 1
+                continue
+            failed += result.failed
+            print(
+                f"{os.path.abspath(root)}: {result.added} added, {result.updated} "
+                f"updated, {result.unchanged} unchanged, {result.removed} removed, "
+                f"{result.failed} unreadable"
+            )
+
+        if options.thumbnails:
+            pairs = [
+                (entry.screenshot, entry.path)
+                for entry in index.search(limit=-1)
+                if entry.screenshot and entry.error is None
+            ]
+            rendered = 0
+            for image_path, keymap_path, _, error in thumbnails.render_thumbnails(
+                pairs, jobs=options.jobs
+            ):
+                if error is None:
+                    rendered += 1
+                else:
+                    failed += 1
+                    print(f"FAIL {keymap_path}\n     {error}")
+            print(f"{rendered} thumbnails up to date")
+    return 1 if failed else 0
+
+
+def command_search(options):
+    with library.Library(options.database) as index:
+        entries = index.search(" ".join(options.terms), options.limit)
+    for entry in entries:
+        if entry.error is not None:
+            print(f"{entry.path}  (unreadable: {entry.error})")
+            continue
+        print(f"{entry.path}  {entry.button_count} buttons")
+        if entry.screenshot:
+            print(f"     screenshot: {entry.screenshot}")
+        if options.verbose:
+            print(f"     keys: {', '.join(entry.keys)}")
+    print(f"{len(entries)} keymaps found")
+    return 0 if entries else 1
+
+
+def build_parser():
+    # Options shared by every subcommand
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="number of worker processes (default: all cores)",
+    )
+    common.add_argument(
+        "-v", "--verbose", action="store_true", help="also list files that passed"
+    )
+
+    parser = argparse.ArgumentParser(
+        description="Process PlayCover keymaps in bulk without the editor GUI"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    validate_parser = subparsers.add_parser(
+        "validate", parents=[common], help="check keymaps for structural problems"
+    )
+    validate_parser.add_argument("paths", nargs="+", help="keymap files or directories")
+    validate_parser.set_defaults(func=command_validate)
+
+    lint_parser = subparsers.add_parser(
+        "lint",
+        parents=[common],
+        help="find key conflicts, off-screen, mis-sized and overlapping buttons",
+    )
+    lint_parser.add_argument("paths", nargs="+", help="keymap files or directories")
+    lint_parser.add_argument(
+        "--aspect",
+        type=float,
+        default=lint.DEFAULT_ASPECT,
+        help="screen width / height used for overlap checks (default: 1.6)",
+    )
+    lint_parser.add_argument(
+        "--strict", action="store_true", help="fail on warnings as well as errors"
+    )
+    lint_parser.set_defaults(func=command_lint)
+
+    convert_parser = subparsers.add_parser(
+        "convert",
+        parents=[common],
+        help="convert keymaps between playmap, plist and JSON",
+    )
+    convert_parser.add_argument("paths", nargs="+", help="keymap files or directories")
+    convert_parser.add_argument(
+        "--to", choices=sorted(FORMAT_EXTENSIONS), required=True, help="target format"
+    )
+    convert_parser.add_argument(
+        "-o", "--out-dir", help="write into this directory, mirroring the source tree"
+    )
+    convert_parser.add_argument(
+        "--binary",
+        action="store_true",
+        help="write playmap/plist output as binary plists instead of XML",
+    )
+    convert_parser.set_defaults(func=command_convert)
+
+    rewrite_parser = subparsers.add_parser(
+        "rewrite", parents=[common], help="normalize button transforms in place"
+    )
+    rewrite_parser.add_argument("paths", nargs="+", help="keymap files or directories")
+    rewrite_parser.add_argument(
+        "--clamp",
+        action="store_true",
+        help="clamp coordinates to 0..1 and sizes to the editor's 1-20 range",
+    )
+    rewrite_parser.add_argument(
+        "--precision", type=int, help="round transform values to this many decimals"
+    )
+    rewrite_parser.set_defaults(func=command_rewrite)
+
+    render_parser = subparsers.add_parser(
+        "render",
+        parents=[common],
+        help="draw keymaps over their screenshots and save them as PNG",
+    )
+    render_parser.add_argument("paths", nargs="+", help="keymap files or directories")
+    render_parser.add_argument(
+        "--image",
+        help="screenshot for keymap files given directly (default: the one "
+        "next to each keymap)",
+    )
+    render_parser.add_argument(
+        "-o",
+        "--out-dir",
+        help=f"write into this directory, mirroring the source tree (default: "
+        f"<keymap>{OVERLAY_SUFFIX} next to each keymap)",
+    )
+    render_parser.add_argument(
+        "--scale",
+        type=float,
+        default=1.0,
+        help="size relative to the screenshot (default: 1, full resolution)",
+    )
+    render_parser.add_argument(
+        "--no-labels",
+        dest="labels",
+        action="store_false",
+        help="only draw outlines, not key names",
+    )
+    render_parser.set_defaults(func=command_render)
+
+    diff_parser = subparsers.add_parser(
+        "diff",
+        help="list moved, resized, rebound, added and removed buttons between keymaps",
+    )
+    diff_parser.add_argument("old", help="keymap before the change")
+    diff_parser.add_argument("new", help="keymap after the change")
+    diff_parser.add_argument(
+        "--aspect",
+        type=float,
+        default=lint.DEFAULT_ASPECT,
+        help="screen width / height used to match buttons by position (default: 1.6)",
+    )
+    diff_parser.add_argument(
+        "--json", action="store_true", help="print the changes as JSON"
+    )
+    diff_parser.set_defaults(func=command_diff, jobs=1)
+
+    merge_parser = subparsers.add_parser(
+        "merge",
+        help="three-way merge two keymaps changed from a common base",
+    )
+    merge_parser.add_argument("base", help="the common ancestor")
+    merge_parser.add_argument(
+        "ours", help="our version, overwritten unless -o is given"
+    )
+    merge_parser.add_argument("theirs", help="their version")
+    merge_parser.add_argument("-o", "--output", help="write the merge here instead")
+    merge_parser.add_argument(
+        "--aspect",
+        type=float,
+        default=lint.DEFAULT_ASPECT,
+        help="screen width / height used to match buttons by position (default: 1.6)",
+    )
+    merge_parser.add_argument(
+        "--binary",
+        action="store_true",
+        help="write playmap/plist output as binary plists instead of XML",
+    )
+    merge_parser.set_defaults(func=command_merge, jobs=1)
+
+    # Options of the library cache
+    database = argparse.ArgumentParser(add_help=False)
+    database.add_argument(
+        "--database",
+        default=library.database_path(),
+        help="library cache to use (default: the editor's)",
+    )
+
+    index_parser = subparsers.add_parser(
+        "index",
+        parents=[common, database],
+        help="add folders to the keymap library or rescan it",
+    )
+    index_parser.add_argument(
+        "paths", nargs="*", help="directories to index (default: rescan all)"
+    )
+    index_parser.add_argument(
+        "--remove",
+        action="store_true",
+        help="remove the given directories from the library instead",
+    )
+    index_parser.add_argument(
+        "--thumbnails",
+        action="store_true",
+        help="also render the library's screenshot thumbnails",
+    )
+    index_parser.set_defaults(func=command_index)
+
+    search_parser = subparsers.add_parser(
+        "search",
+        parents=[common, database],
+        help="find indexed keymaps by game name or, with key:NAME, bound key",
+    )
+    search_parser.add_argument("terms", nargs="*", help="search terms (default: all)")
+    search_parser.add_argument(
+        "--limit", type=int, default=1000, help="list at most this many keymaps"
+    )
+    search_parser.set_defaults(func=command_search)
+
+    return parser
+
+
+def main(argv=None):
+    options = build_parser().parse_args(argv)
+    options.jobs = max(1, options.jobs)
+    return options.func(options)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
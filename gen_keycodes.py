@@ -0,0 +1,233 @@
+"""Generate keycodes.py from PlayTools' KeyCodeNames.swift
+
+Usage:
+    python gen_keycodes.py           rewrite keycodes.py
+    python gen_keycodes.py --check   exit 1 if keycodes.py is out of date
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SWIFT_SOURCE = os.path.join(HERE, "KeyCodeNames.swift")
+OUTPUT = os.path.join(HERE, "keycodes.py")
+
+# Entries of the keyCodes dictionary; commented-out lines are skipped
+ENTRY_PATTERN = re.compile(r'^\s*(-?\d+)\s*:\s*"((?:[^"\\]|\\.)*)"\s*,?\s*$')
+DEFAULT_PATTERN = re.compile(r"\bdefaultCode\s*=\s*(-?\d+)")
+
+# Tk keysyms that produce each PlayCover key name, with the unshifted one
+# first. Letters and function keys are derived in keysyms_for().
+KEYSYMS = {
+    "Esc": ("Escape",),
+    "Spc": ("space",),
+    "Lshft": ("Shift_L",),
+    "Caps": ("Caps_Lock",),
+    "Tab": ("Tab", "ISO_Left_Tab"),
+    "LCmd": ("Super_L", "Meta_L"),
+    "LOpt": ("Alt_L", "Option_L"),
+    "RCmd": ("Super_R", "Meta_R"),
+    "ROpt": ("Alt_R", "Option_R"),
+    "Enter": ("Return",),
+    "Del": ("BackSpace",),
+    "Rshft": ("Shift_R",),
+    "Left": ("Left",),
+    "Right": ("Right",),
+    "Up": ("Up",),
+    "Down": ("Down",),
+    "§": ("section", "plusminus"),
+    "1": ("1", "exclam"),
+    "2": ("2", "at"),
+    "3": ("3", "numbersign"),
+    "4": ("4", "dollar"),
+    "5": ("5", "percent"),
+    "6": ("6", "asciicircum"),
+    "7": ("7", "ampersand"),
+    "8": ("8", "asterisk"),
+    "9": ("9", "parenleft"),
+    "0": ("0", "parenright"),
+    "-": ("minus", "underscore"),
+    "=": ("equal", "plus"),
+    "[": ("bracketleft", "braceleft"),
+    "]": ("bracketright", "braceright"),
+    ";": ("semicolon", "colon"),
+    "'": ("apostrophe", "quotedbl"),
+    "\\": ("backslash", "bar"),
+    "`": ("grave", "asciitilde"),
+    ",": ("comma", "less"),
+    ".": ("period", "greater"),
+    "/": ("slash", "question"),
+}
+
+TEMPLATE = '''\
+"""PlayCover key code tables shared by the editor and the headless tools
+
+Generated from KeyCodeNames.swift by gen_keycodes.py; do not edit by hand.
+"""
+
+# sha256 of the KeyCodeNames.swift this module was generated from
+SOURCE_DIGEST = "{digest}"
+
+DEFAULT_CODE = {default_code}
+
+# PlayCover code -> key name, in KeyCodeNames.swift order
+CodeToKeys = {{
+{code_to_keys}
+}}
+
+# Key name -> PlayCover code
+KeyToCode = {{v: k for k, v in CodeToKeys.items()}}
+
+# Dense code -> key name table indexed by code - MIN_CODE; None for gaps
+MIN_CODE = {min_code}
+MAX_CODE = {max_code}
+KEY_NAMES = (
+{key_names}
+)
+
+# Tk keysym -> PlayCover code (keyboard keys only)
+KEYSYM_CODES = {{
+{keysym_codes}
+}}
+
+
+def key_name(code):
+    """Return the PlayCover name of a code, or None if it is unknown"""
+    if isinstance(code, int) and MIN_CODE <= code <= MAX_CODE:
+        return KEY_NAMES[code - MIN_CODE]
+    return None
+
+
+def key_code(name):
+    """Return the PlayCover code of a key name, or None if it is unknown"""
+    return KeyToCode.get(name)
+
+
+def keysym_code(keysym):
+    """Return the PlayCover code for a Tk keysym, or None if it can't be bound"""
+    return KEYSYM_CODES.get(keysym)
+'''
+
+
+def quote(value):
+    """Python literal for a name, double-quoted like the rest of the code base"""
+    if value is None:
+        return "None"
+    return json.dumps(value, ensure_ascii=False)
+
+
+def parse_swift(text):
+    """Return (default_code, [(code, name), ...]) from KeyCodeNames.swift"""
+    match = DEFAULT_PATTERN.search(text)
+    if match is None:
+        raise Exception("defaultCode not found in KeyCodeNames.swift")
+    default_code = int(match.group(1))
+
+    entries = []
+    seen = set()
+    for line in text.splitlines():
+        if line.lstrip().startswith("//"):
+            continue
+        match = ENTRY_PATTERN.match(line)
+        if match is None:
+            continue
+        code = int(match.group(1))
+        # Swift string escapes used here are only \\ and \"
+        name = re.sub(r"\\(.)", r"\1", match.group(2))
+        if code in seen:
+            raise Exception(f"Duplicate key code {code} in KeyCodeNames.swift")
+        seen.add(code)
+        entries.append((code, name))
+
+    if not entries:
+        raise Exception("No key codes found in KeyCodeNames.swift")
+    return default_code, entries
+
+
+def keysyms_for(name):
+    """Tk keysyms for a PlayCover key name"""
+    if name in KEYSYMS:
+        return KEYSYMS[name]
+    if len(name) == 1 and name.isalpha():
+        return (name.lower(), name.upper())
+    if re.fullmatch(r"F\d+", name):
+        return (name,)
+    return ()
+
+
+def generate(text):
+    """Return the source of keycodes.py for the given Swift source"""
+    default_code, entries = parse_swift(text)
+    names = dict(entries)
+
+    unknown = sorted(set(KEYSYMS) - set(names.values()))
+    if unknown:
+        raise Exception(f"KEYSYMS names not in KeyCodeNames.swift: {unknown}")
+
+    keysym_codes = {}
+    for code, name in entries:
+        if code < 0:
+            # Mouse and controller inputs can't come from a key press
+            continue
+        for keysym in keysyms_for(name):
+            keysym_codes.setdefault(keysym, code)
+
+    min_code = min(names)
+    max_code = max(names)
+    return TEMPLATE.format(
+        digest=hashlib.sha256(text.encode("utf-8")).hexdigest(),
+        default_code=default_code,
+        code_to_keys="\n".join(
+            f"    {code}: {quote(name)}," for code, name in entries
+        ),
+        min_code=min_code,
+        max_code=max_code,
+        key_names="\n".join(
+            f"    {quote(names.get(code))},  # {code}"
+            for code in range(min_code, max_code + 1)
+        ),
+        keysym_codes="\n".join(
+            f"    {quote(keysym)}: {code}," for keysym, code in keysym_codes.items()
+        ),
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--swift", default=SWIFT_SOURCE, help="KeyCodeNames.swift")
+    parser.add_argument("--output", default=OUTPUT, help="module to write")
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="fail if the module differs from what would be generated",
+    )
+    args = parser.parse_args(argv)
+
+    with open(args.swift, "r", encoding="utf-8") as f:
+        source = generate(f.read())
+
+    if args.check:
+        try:
+            with open(args.output, "r", encoding="utf-8") as f:
+                current = f.read()
+        except OSError:
+            current = None
+        if current != source:
+            print(
+                f"{os.path.basename(args.output)} is out of date with "
+                f"{os.path.basename(args.swift)}; run gen_keycodes.py",
+                file=sys.stderr,
+            )
+            return 1
+        return 0
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        f.write(source)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""Undo/redo of keymap edits stored as compact per-field deltas
+
+A delta's index is a row of buttonModels, or a (model key, row) pair for
+the other model arrays such as joystickModel.
+"""
+from collections import deque
+
+# Pseudo-field for adding a whole button: old is None, new is the button
+INSERT = "insert"
+# Pseudo-field for removing a whole button: old is the button, new is None
+REMOVE = "remove"
+
+DEFAULT_LIMIT = 5000
+
+
+def locate(data, index):
+    """Return (store, row, key) for a delta index into keymap data"""
+    if isinstance(index, tuple):
+        key, row = index
+    else:
+        key, row = "buttonModels", index
+    return data[key], row, key
+
+
+def label(key, row):
+    """Delta index for a row of the given model array"""
+    return row if key == "buttonModels" else (key, row)
+
+
+def make_deltas(data, index, changes):
+    """Turn {field: new_value} into (index, field, old, new) deltas, skipping no-ops"""
+    store, row, _ = locate(data, index)
+    deltas = []
+    for field, new_value in changes.items():
+        old_value = store.get(row, field)
+        if old_value != new_value:
+            deltas.append((index, field, old_value, new_value))
+    return deltas
+
+
+def apply_deltas(data, deltas, undo=False):
+    """Apply deltas to the ButtonStores of keymap data (or revert them)
+
+    Returns the set of touched indices.
+    """
+    touched = set()
+    for index, field, old_value, new_value in reversed(deltas) if undo else deltas:
+        value = old_value if undo else new_value
+        store, row, key = locate(data, index)
+
+        if field == INSERT:
+            if undo:
+                store.pop(row)
+            else:
+                store.insert(row, new_value)
+            # Everything after the insertion point moved
+            touched.update(label(key, i) for i in range(row, len(store) + 1))
+            continue
+
+        if field == REMOVE:
+            if undo:
+                store.insert(row, old_value)
+            else:
+                store.pop(row)
+            touched.update(label(key, i) for i in range(row, len(store) + 1))
+            continue
+
+        store.set(row, field, value)
+        touched.add(index)
+    return touched
+
+
+class EditHistory:
+    """Undo and redo stacks of edits
+
+    Each entry is a tuple of (index, field, old, new) deltas, so memory grows
+    with the number of changed fields rather than with the size of the
+    keymap. Only the most recent ``limit`` entries are kept.
+    """
+
+    def __init__(self, limit=DEFAULT_LIMIT):
+        self.undo_stack = deque(maxlen=limit)
+        self.redo_stack = []
+        self.last_group = None
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack = []
+        self.last_group = None
+
+    def record(self, deltas, group=None):
+        """Push an applied edit
+
+        Consecutive edits recorded with the same non-None group that touch
+        the same fields are coalesced into one entry that spans from the
+        first old value to the latest new value.
+        """
+        if not deltas:
+            return
+        deltas = tuple(deltas)
+
+        if group is not None and group == self.last_group and self.undo_stack:
+            previous = self.undo_stack[-1]
+            if [d[:2] for d in previous] == [d[:2] for d in deltas]:
+                deltas = tuple(
+                    (index, field, old[2], new_value)
+                    for old, (index, field, _, new_value) in zip(previous, deltas)
+                )
+                self.undo_stack.pop()
+
+        self.undo_stack.append(deltas)
+        self.redo_stack = []
+        self.last_group = group
+
+    def undo(self):
+        """Pop the latest entry; the caller reverts it with apply_deltas(undo=True)"""
+        if not self.undo_stack:
+            return None
+        deltas = self.undo_stack.pop()
+        self.redo_stack.append(deltas)
+        self.last_group = None
+        return deltas
+
+    def redo(self):
+        """Pop the latest undone entry; the caller re-applies it with apply_deltas"""
+        if not self.redo_stack:
+            return None
+        deltas = self.redo_stack.pop()
+        self.undo_stack.append(deltas)
+        self.last_group = None
+        return deltas
\ No newline at end of file
@@ -0,0 +1,128 @@
+"""On-disk LRU cache of screenshots already scaled to their display size"""
+import hashlib
+import os
+import tempfile
+
+from PIL import Image
+
+import paths
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class ScaledImageCache:
+    """Content-addressed store of display bitmaps
+
+    Entries are keyed by source path, modification time, file size and
+    target dimensions, so editing or replacing a screenshot never serves a
+    stale bitmap. A hit refreshes the entry's mtime; when the directory grows
+    past max_bytes the least recently used entries are evicted.
+    """
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory or os.path.join(paths.user_cache_dir(), "scaled")
+        self.max_bytes = max_bytes
+
+    def key(self, filename, display_size):
+        stat = os.stat(filename)
+        identity = "\0".join(
+            [
+                os.path.abspath(filename),
+                str(stat.st_mtime_ns),
+                str(stat.st_size),
+                f"{display_size[0]}x{display_size[1]}",
+            ]
+        )
+        return hashlib.sha256(identity.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".png")
+
+    def get(self, filename, display_size):
+        """Return the cached display image, or None on a miss"""
+        try:
+            key = self.key(filename, display_size)
+        except OSError:
+            return None
+        return self.load(key)
+
+    def load(self, key):
+        """Return the image stored under key, or None"""
+        try:
+            path = self._path(key)
+            image = Image.open(path)
+            image.load()
+        except OSError:
+            return None
+
+        # Mark as recently used for LRU eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return image
+
+    def put(self, filename, display_size, image):
+        """Store a display image; failures are ignored since the cache is optional"""
+        try:
+            key = self.key(filename, display_size)
+        except OSError:
+            return
+        self.store(key, image)
+
+    def store(self, key, image, evict=True):
+        """Store an image under key, evicting old entries past the budget
+
+        Batch writers pass evict=False and call evict() once at the end.
+        """
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(key)
+
+            # Write to a temp file first so readers never see a partial entry
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as temp_file:
+                    image.save(temp_file, "PNG", compress_level=1)
+                os.replace(temp_path, path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+
+            if evict:
+                self.evict()
+        except (OSError, ValueError):
+            pass
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits its budget"""
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if not entry.name.endswith(".png"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+                total -= size
+            except OSError:
+                pass
+
+    def clear(self):
+        if not os.path.isdir(self.directory):
+            return
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if entry.name.endswith((".png", ".tmp")):
+                    os.unlink(entry.path)
@@ -0,0 +1,91 @@
+"""Screenshot decoding and scaling, kept free of Tk so it can run on worker threads"""
+from PIL import Image
+
+# Modes Image.reduce and ImageTk.PhotoImage both handle directly
+DIRECT_MODES = ("L", "RGB", "RGBA")
+
+
+def fit_size(img_width, img_height, max_width, max_height):
+    """Return the size an image is displayed at: shrunk to fit, never enlarged"""
+    if img_width <= max_width and img_height <= max_height:
+        return img_width, img_height
+
+    # Calculate scaling factor to fit within screen while maintaining aspect ratio
+    width_ratio = max_width / img_width
+    height_ratio = max_height / img_height
+    scale_factor = min(width_ratio, height_ratio)
+
+    return int(img_width * scale_factor), int(img_height * scale_factor)
+
+
+def read_size(filename):
+    """Return an image's pixel size; only the header is read"""
+    with Image.open(filename) as image:
+        return image.size
+
+
+def reduce_preview(image, display_size):
+    """Shrink a decoded image to display_size quickly, at low quality
+
+    The integer box filter of Image.reduce does most of the work before a
+    cheap final resize.
+    """
+    display_width, display_height = display_size
+    if image.mode not in DIRECT_MODES:
+        image = image.convert("RGBA")
+
+    factor = min(image.width // display_width, image.height // display_height)
+    if factor > 1:
+        image = image.reduce(factor)
+    if image.size != display_size:
+        image = image.resize(display_size, Image.Resampling.BILINEAR)
+    return image
+
+
+def decode_preview(filename, display_size):
+    """Decode a quick, low-quality version of an image at display_size
+
+    JPEGs are decoded straight at a reduced scale with draft mode; other
+    formats are decoded in full and shrunk with reduce_preview.
+    """
+    image = Image.open(filename)
+    if image.format == "JPEG":
+        image.draft("RGB", display_size)
+    return reduce_preview(image, display_size)
+
+
+def decode_display_image(filename, display_size, on_preview=None, cache=None):
+    """Decode an image and resize it to display_size with high quality
+
+    Returns (source_image, display_image). If on_preview is given and the
+    image needs scaling, it is first called with a fast preview so the caller
+    can show something while the LANCZOS resample runs. With a cache, a
+    previously scaled bitmap is returned without decoding the source; the
+    source image is then opened lazily and only decoded if it is used.
+    """
+    image = Image.open(filename)
+
+    if image.size == display_size:
+        # Use original image if it fits on screen
+        image.load()
+        return image, image
+
+    if cache is not None:
+        cached = cache.get(filename, display_size)
+        if cached is not None:
+            return image, cached
+
+    if on_preview is not None:
+        if image.format == "JPEG":
+            # Draft mode decodes a reduced JPEG far faster than a full decode
+            on_preview(decode_preview(filename, display_size))
+        else:
+            # Other formats are decoded once; the preview and the final
+            # resample both start from those pixels
+            image.load()
+            on_preview(reduce_preview(image, display_size))
+
+    display_image = image.resize(display_size, Image.Resampling.LANCZOS)
+    if cache is not None:
+        cache.put(filename, display_size, display_image)
+    return image, display_image
@@ -0,0 +1,175 @@
+"""Append-only journal of unsaved edits, kept next to the keymap for crash recovery"""
+import base64
+import datetime
+import glob
+import json
+import os
+
+import history
+import keymap
+from model_store import plain_keymap, store_keymap
+
+# Fold the journal into a fresh snapshot after this many entries
+COMPACT_EVERY = 200
+
+# Plist values JSON can't hold are written as {tag: text} and restored on replay
+BYTES_TAG = "__bytes__"
+DATETIME_TAG = "__datetime__"
+
+
+def encode_value(value):
+    """json.dumps default for plist data and dates"""
+    if isinstance(value, (bytes, bytearray)):
+        return {BYTES_TAG: base64.b64encode(value).decode("ascii")}
+    if isinstance(value, datetime.datetime):
+        return {DATETIME_TAG: value.isoformat()}
+    raise TypeError(f"{type(value).__name__} values can't be journaled")
+
+
+def decode_value(obj):
+    """json.loads object_hook undoing encode_value"""
+    if len(obj) == 1:
+        if BYTES_TAG in obj:
+            return base64.b64decode(obj[BYTES_TAG])
+        if DATETIME_TAG in obj:
+            return datetime.datetime.fromisoformat(obj[DATETIME_TAG])
+    return obj
+
+
+class EditJournal:
+    """Crash-safe record of the edits made since the keymap was last saved
+
+    The journal is a snapshot of the keymap plus a JSON-lines file of the
+    deltas applied on top of it. Each edit appends and flushes one short line;
+    only every COMPACT_EVERY entries is the snapshot rewritten. The first
+    line of the journal names its snapshot, and an old snapshot is deleted
+    only once a journal pointing at the new one is in place, so a crash at
+    any point leaves a consistent pair.
+    """
+
+    def __init__(self, keymap_path, compact_every=COMPACT_EVERY):
+        directory, name = os.path.split(os.path.abspath(keymap_path))
+        self.directory = directory
+        self.name = name
+        self.extension = os.path.splitext(name)[1] or ".json"
+        self.journal_path = os.path.join(directory, f".{name}.journal")
+        self.compact_every = compact_every
+        self.file = None
+        self.entries = 0
+        self.generation = 0
+        self.disabled = False
+
+    def snapshot_path(self, generation):
+        return os.path.join(
+            self.directory, f".{self.name}.snapshot.{generation}{self.extension}"
+        )
+
+    def has_recovery(self):
+        """True if a previous session left unsaved edits behind"""
+        return os.path.exists(self.journal_path)
+
+    def recover(self):
+        """Rebuild the keymap from the snapshot and journal and keep journaling
+
+        The recovered model arrays are returned as ButtonStores.
+        """
+        with open(self.journal_path, "r", encoding="utf-8") as journal_file:
+            header = json.loads(journal_file.readline())
+            self.generation = header["generation"]
+            data = keymap.load_keymap(self.snapshot_path(self.generation))
+            if not isinstance(data.get("buttonModels"), list):
+                data["buttonModels"] = []
+            store_keymap(data)
+
+            self.entries = 0
+            for line in journal_file:
+                try:
+                    entry = json.loads(line, object_hook=decode_value)
+                except ValueError:
+                    # The last line may be torn if the editor died mid-write
+                    break
+                # JSON turns (model key, row) indices into lists
+                deltas = [
+                    (tuple(index) if isinstance(index, list) else index, *rest)
+                    for index, *rest in entry["deltas"]
+                ]
+                history.apply_deltas(data, deltas, undo=entry["undo"])
+                self.entries += 1
+
+        self.file = open(self.journal_path, "a", encoding="utf-8")
+        return data
+
+    def has_edits(self):
+        """True while there are journaled edits that haven't been saved"""
+        return self.file is not None
+
+    def append(self, data, deltas, undo=False):
+        """Log an edit that has just been applied to data"""
+        if self.disabled:
+            return
+        try:
+            if self.file is None or self.entries >= self.compact_every:
+                # Starting (or compacting) folds the edit into a snapshot
+                self._compact(data)
+                return
+
+            entry = {"undo": undo, "deltas": [list(delta) for delta in deltas]}
+            try:
+                line = json.dumps(entry, default=encode_value)
+            except TypeError:
+                # A value with no JSON form; the snapshot keeps it instead
+                self._compact(data)
+                return
+            self.file.write(line + "\n")
+            self.file.flush()
+            self.entries += 1
+        except OSError:
+            # A read-only folder shouldn't stop editing; just stop journaling
+            self.disabled = True
+
+    def compact(self, data):
+        """Replace the journal with a snapshot of data and an empty log"""
+        if self.disabled:
+            return
+        try:
+            self._compact(data)
+        except OSError:
+            self.disabled = True
+
+    def _compact(self, data):
+        generation = self.generation + 1
+        snapshot_path = self.snapshot_path(generation)
+        keymap.save_keymap(plain_keymap(data), snapshot_path)
+
+        header = json.dumps({"keymap": self.name, "generation": generation}) + "\n"
+        keymap.write_atomic(self.journal_path, header.encode("utf-8"))
+
+        if self.file is not None:
+            self.file.close()
+        old_snapshot = self.snapshot_path(self.generation)
+        if os.path.exists(old_snapshot):
+            os.unlink(old_snapshot)
+
+        self.generation = generation
+        self.entries = 0
+        self.file = open(self.journal_path, "a", encoding="utf-8")
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def discard(self):
+        """Forget all journaled edits, e.g. after they were saved"""
+        self.close()
+        self.entries = 0
+        self.generation = 0
+        pattern = os.path.join(
+            glob.escape(self.directory), f".{glob.escape(self.name)}.snapshot.*"
+        )
+        paths = [self.journal_path] + glob.glob(pattern)
+        for path in paths:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
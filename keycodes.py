@@ -0,0 +1,510 @@
+"""PlayCover key code tables shared by the editor and the headless tools
+
+Generated from KeyCodeNames.swift by gen_keycodes.py; do not edit by hand.
+"""
+
+# sha256 of the KeyCodeNames.swift this module was generated from
+SOURCE_DIGEST = "935443f89fba976e4c690e786ea915ac5e399d8807b7c0f3a91f239adff2b0ca"
+
+DEFAULT_CODE = -10
+
+# PlayCover code -> key name, in KeyCodeNames.swift order
+CodeToKeys = {
+    -4: "cA",
+    -5: "cX",
+    -6: "cB",
+    -7: "cY",
+    -8: "dU",
+    -9: "dD",
+    -10: "Controller",
+    -11: "dL",
+    -12: "L1",
+    -13: "L2",
+    -14: "R1",
+    -15: "R2",
+    -1: "LMB",
+    -2: "RMB",
+    -3: "MMB",
+    41: "Esc",
+    44: "Spc",
+    225: "Lshft",
+    57: "Caps",
+    43: "Tab",
+    227: "LCmd",
+    226: "LOpt",
+    231: "RCmd",
+    230: "ROpt",
+    40: "Enter",
+    42: "Del",
+    229: "Rshft",
+    80: "Left",
+    79: "Right",
+    82: "Up",
+    81: "Down",
+    58: "F1",
+    59: "F2",
+    60: "F3",
+    61: "F4",
+    62: "F5",
+    63: "F6",
+    64: "F7",
+    65: "F8",
+    66: "F9",
+    67: "F10",
+    68: "F11",
+    69: "F12",
+    100: "§",
+    30: "1",
+    31: "2",
+    32: "3",
+    33: "4",
+    34: "5",
+    35: "6",
+    36: "7",
+    37: "8",
+    38: "9",
+    39: "0",
+    45: "-",
+    46: "=",
+    20: "Q",
+    26: "W",
+    8: "E",
+    21: "R",
+    23: "T",
+    28: "Y",
+    24: "U",
+    12: "I",
+    18: "O",
+    19: "P",
+    47: "[",
+    48: "]",
+    4: "A",
+    22: "S",
+    7: "D",
+    9: "F",
+    10: "G",
+    11: "H",
+    13: "J",
+    14: "K",
+    15: "L",
+    51: ";",
+    52: "'",
+    49: "\\",
+    29: "Z",
+    53: "`",
+    27: "X",
+    6: "C",
+    25: "V",
+    5: "B",
+    17: "N",
+    16: "M",
+    54: ",",
+    55: ".",
+    56: "/",
+}
+
+# Key name -> PlayCover code
+KeyToCode = {v: k for k, v in CodeToKeys.items()}
+
+# Dense code -> key name table indexed by code - MIN_CODE; None for gaps
+MIN_CODE = -15
+MAX_CODE = 231
+KEY_NAMES = (
+    "R2",  # -15
+    "R1",  # -14
+    "L2",  # -13
+    "L1",  # -12
+    "dL",  # -11
+    "Controller",  # -10
+    "dD",  # -9
+    "dU",  # -8
+    "cY",  # -7
+    "cB",  # -6
+    "cX",  # -5
+    "cA",  # -4
+    "MMB",  # -3
+    "RMB",  # -2
+    "LMB",  # -1
+    None,  # 0
+    None,  # 1
+    None,  # 2
+    None,  # 3
+    "A",  # 4
+    "B",  # 5
+    "C",  # 6
+    "D",  # 7
+    "E",  # 8
+    "F",  # 9
+    "G",  # 10
+    "H",  # 11
+    "I",  # 12
+    "J",  # 13
+    "K",  # 14
+    "L",  # 15
+    "M",  # 16
+    "N",  # 17
+    "O",  # 18
+    "P",  # 19
+    "Q",  # 20
+    "R",  # 21
+    "S",  # 22
+    "T",  # 23
+    "U",  # 24
+    "V",  # 25
+    "W",  # 26
+    "X",  # 27
+    "Y",  # 28
+    "Z",  # 29
+    "1",  # 30
+    "2",  # 31
+    "3",  # 32
+    "4",  # 33
+    "5",  # 34
+    "6",  # 35
+    "7",  # 36
+    "8",  # 37
+    "9",  # 38
+    "0",  # 39
+    "Enter",  # 40
+    "Esc",  # 41
+    "Del",  # 42
+    "Tab",  # 43
+    "Spc",  # 44
+    "-",  # 45
+    "=",  # 46
+    "[",  # 47
+    "]",  # 48
+    "\\",  # 49
+    None,  # 50
+    ";",  # 51
+    "'",  # 52
+    "`",  # 53
+    ",",  # 54
+    ".",  # 55
+    "/",  # 56
+    "Caps",  # 57
+    "F1",  # 58
+    "F2",  # 59
+    "F3",  # 60
+    "F4",  # 61
+    "F5",  # 62
+    "F6",  # 63
+    "F7",  # 64
+    "F8",  # 65
+    "F9",  # 66
+    "F10",  # 67
+    "F11",  # 68
+    "F12",  # 69
+    None,  # 70
+    None,  # 71
+    None,  # 72
+    None,  # 73
+    None,  # 74
+    None,  # 75
+    None,  # 76
+    None,  # 77
+    None,  # 78
+    "Right",  # 79
+    "Left",  # 80
+    "Down",  # 81
+    "Up",  # 82
+    None,  # 83
+    None,  # 84
+    None,  # 85
+    None,  # 86
+    None,  # 87
+    None,  # 88
+    None,  # 89
+    None,  # 90
+    None,  # 91
+    None,  # 92
+    None,  # 93
+    None,  # 94
+    None,  # 95
+    None,  # 96
+    None,  # 97
+    None,  # 98
+    None,  # 99
+    "§",  # 100
+    None,  # 101
+    None,  # 102
+    None,  # 103
+    None,  # 104
+    None,  # 105
+    None,  # 106
+    None,  # 107
+    None,  # 108
+    None,  # 109
+    None,  # 110
+    None,  # 111
+    None,  # 112
+    None,  # 113
+    None,  # 114
+    None,  # 115
+    None,  # 116
+    None,  # 117
+    None,  # 118
+    None,  # 119
+    None,  # 120
+    None,  # 121
+    None,  # 122
+    None,  # 123
+    None,  # 124
+    None,  # 125
+    None,  # 126
+    None,  # 127
+    None,  # 128
+    None,  # 129
+    None,  # 130
+    None,  # 131
+    None,  # 132
+    None,  # 133
+    None,  # 134
+    None,  # 135
+    None,  # 136
+    None,  # 137
+    None,  # 138
+    None,  # 139
+    None,  # 140
+    None,  # 141
+    None,  # 142
+    None,  # 143
+    None,  # 144
+    None,  # 145
+    None,  # 146
+    None,  # 147
+    None,  # 148
+    None,  # 149
+    None,  # 150
+    None,  # 151
+    None,  # 152
+    None,  # 153
+    None,  # 154
+    None,  # 155
+    None,  # 156
+    None,  # 157
+    None,  # 158
+    None,  # 159
+    None,  # 160
+    None,  # 161
+    None,  # 162
+    None,  # 163
+    None,  # 164
+    None,  # 165
+    None,  # 166
+    None,  # 167
+    None,  # 168
+    None,  # 169
+    None,  # 170
+    None,  # 171
+    None,  # 172
+    None,  # 173
+    None,  # 174
+    None,  # 175
+    None,  # 176
+    None,  # 177
+    None,  # 178
+    None,  # 179
+    None,  # 180
+    None,  # 181
+    None,  # 182
+    None,  # 183
+    None,  # 184
+    None,  # 185
+    None,  # 186
+    None,  # 187
+    None,  # 188
+    None,  # 189
+    None,  # 190
+    None,  # 191
+    None,  # 192
+    None,  # 193
+    None,  # 194
+    None,  # 195
+    None,  # 196
+    None,  # 197
+    None,  # 198
+    None,  # 199
+    None,  # 200
+    None,  # 201
+    None,  # 202
+    None,  # 203
+    None,  # 204
+    None,  # 205
+    None,  # 206
+    None,  # 207
+    None,  # 208
+    None,  # 209
+    None,  # 210
+    None,  # 211
+    None,  # 212
+    None,  # 213
+    None,  # 214
+    None,  # 215
+    None,  # 216
+    None,  # 217
+    None,  # 218
+    None,  # 219
+    None,  # 220
+    None,  # 221
+    None,  # 222
+    None,  # 223
+    None,  # 224
+    "Lshft",  # 225
+    "LOpt",  # 226
+    "LCmd",  # 227
+    None,  # 228
+    "Rshft",  # 229
+    "ROpt",  # 230
+    "RCmd",  # 231
+)
+
+# Tk keysym -> PlayCover code (keyboard keys only)
+KEYSYM_CODES = {
+    "Escape": 41,
+    "space": 44,
+    "Shift_L": 225,
+    "Caps_Lock": 57,
+    "Tab": 43,
+    "ISO_Left_Tab": 43,
+    "Super_L": 227,
+    "Meta_L": 227,
+    "Alt_L": 226,
+    "Option_L": 226,
+    "Super_R": 231,
+    "Meta_R": 231,
+    "Alt_R": 230,
+    "Option_R": 230,
+    "Return": 40,
+    "BackSpace": 42,
+    "Shift_R": 229,
+    "Left": 80,
+    "Right": 79,
+    "Up": 82,
+    "Down": 81,
+    "F1": 58,
+    "F2": 59,
+    "F3": 60,
+    "F4": 61,
+    "F5": 62,
+    "F6": 63,
+    "F7": 64,
+    "F8": 65,
+    "F9": 66,
+    "F10": 67,
+    "F11": 68,
+    "F12": 69,
+    "section": 100,
+    "plusminus": 100,
+    "1": 30,
+    "exclam": 30,
+    "2": 31,
+    "at": 31,
+    "3": 32,
+    "numbersign": 32,
+    "4": 33,
+    "dollar": 33,
+    "5": 34,
+    "percent": 34,
+    "6": 35,
+    "asciicircum": 35,
+    "7": 36,
+    "ampersand": 36,
+    "8": 37,
+    "asterisk": 37,
+    "9": 38,
+    "parenleft": 38,
+    "0": 39,
+    "parenright": 39,
+    "minus": 45,
+    "underscore": 45,
+    "equal": 46,
+    "plus": 46,
+    "q": 20,
+    "Q": 20,
+    "w": 26,
+    "W": 26,
+    "e": 8,
+    "E": 8,
+    "r": 21,
+    "R": 21,
+    "t": 23,
+    "T": 23,
+    "y": 28,
+    "Y": 28,
+    "u": 24,
+    "U": 24,
+    "i": 12,
+    "I": 12,
+    "o": 18,
+    "O": 18,
+    "p": 19,
+    "P": 19,
+    "bracketleft": 47,
+    "braceleft": 47,
+    "bracketright": 48,
+    "braceright": 48,
+    "a": 4,
+    "A": 4,
+    "s": 22,
+    "S": 22,
+    "d": 7,
+    "D": 7,
+    "f": 9,
+    "F": 9,
+    "g": 10,
+    "G": 10,
+    "h": 11,
+    "H": 11,
+    "j": 13,
+    "J": 13,
+    "k": 14,
+    "K": 14,
+    "l": 15,
+    "L": 15,
+    "semicolon": 51,
+    "colon": 51,
+    "apostrophe": 52,
+    "quotedbl": 52,
+    "backslash": 49,
+    "bar": 49,
+    "z": 29,
+    "Z": 29,
+    "grave": 53,
+    "asciitilde": 53,
+    "x": 27,
+    "X": 27,
+    "c": 6,
+    "C": 6,
+    "v": 25,
+    "V": 25,
+    "b": 5,
+    "B": 5,
+    "n": 17,
+    "N": 17,
+    "m": 16,
+    "M": 16,
+    "comma": 54,
+    "less": 54,
+    "period": 55,
+    "greater": 55,
+    "slash": 56,
+    "question": 56,
+}
+
+
+def key_name(code):
+    """Return the PlayCover name of a code, or None if it is unknown"""
+    if isinstance(code, int) and MIN_CODE <= code <= MAX_CODE:
+        return KEY_NAMES[code - MIN_CODE]
+    return None
+
+
+def key_code(name):
+    """Return the PlayCover code of a key name, or None if it is unknown"""
+    return KeyToCode.get(name)
+
+
+def keysym_code(keysym):
+    """Return the PlayCover code for a Tk keysym, or None if it can't be bound"""
+    return KEYSYM_CODES.get(keysym)
@@ -0,0 +1,226 @@
+"""Headless keymap engine: load, validate, convert and save playmaps without Tk"""
+import os
+import plistlib
+import json
+import tempfile
+
+import keycodes
+
+PLIST_EXTENSIONS = [".plist", ".playmap"]
+JSON_EXTENSIONS = [".json"]
+KEYMAP_EXTENSIONS = PLIST_EXTENSIONS + JSON_EXTENSIONS
+IMAGE_EXTENSIONS = [".png", ".jpg", ".jpeg", ".gif", ".bmp", ".tiff", ".tif"]
+
+# Size range accepted by the "Change Size" dialog
+MIN_BUTTON_SIZE = 1
+MAX_BUTTON_SIZE = 20
+
+
+def is_image_file(filename):
+    ext = os.path.splitext(filename)[1].lower()
+    return ext in IMAGE_EXTENSIONS
+
+
+def is_plist_file(filename):
+    ext = os.path.splitext(filename)[1].lower()
+    return ext in PLIST_EXTENSIONS
+
+
+def is_keymap_file(filename):
+    ext = os.path.splitext(filename)[1].lower()
+    return ext in KEYMAP_EXTENSIONS
+
+
+def load_plist(filename):
+    """Load and parse a plist or playmap file"""
+    try:
+        with open(filename, "rb") as plist_file:
+            return plistlib.load(plist_file)
+    except Exception as e:
+        raise Exception(f"Failed to parse plist file: {str(e)}")
+
+
+def load_json(filename):
+    """Load and parse a JSON file"""
+    try:
+        with open(filename, "r", encoding="utf-8") as json_file:
+            return json.load(json_file)
+    except Exception as e:
+        raise Exception(f"Failed to parse JSON file: {str(e)}")
+
+
+def load_keymap(filename):
+    """Load a keymap, picking the parser from the file extension"""
+    file_ext = os.path.splitext(filename)[1].lower()
+
+    if file_ext in PLIST_EXTENSIONS:
+        return load_plist(filename)
+    if file_ext in JSON_EXTENSIONS:
+        return load_json(filename)
+
+    # Try to load as JSON first, then plist if that fails
+    try:
+        return load_json(filename)
+    except Exception:
+        return load_plist(filename)
+
+
+def dump_keymap(data, filename, binary=False):
+    """Serialize keymap data to bytes in the format implied by filename
+
+    With binary=True plists are written in the compact binary format, which
+    PlayCover parses much faster than XML. JSON output ignores the flag.
+    """
+    file_ext = os.path.splitext(filename)[1].lower()
+
+    if file_ext in PLIST_EXTENSIONS:
+        fmt = plistlib.FMT_BINARY if binary else plistlib.FMT_XML
+        return plistlib.dumps(data, fmt=fmt)
+    return json.dumps(data, indent=2, default=str).encode("utf-8")
+
+
+def save_keymap(data, filename, binary=False):
+    """Save keymap data atomically, picking plist or JSON from the file extension"""
+    write_atomic(filename, dump_keymap(data, filename, binary))
+
+
+def write_atomic(path, payload):
+    """Write bytes to path so that readers see either the old or the new file
+
+    The data goes to a temp file in the same directory, is fsynced and then
+    renamed over the target, so a crash mid-write can't corrupt it.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(
+        dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as temp_file:
+            temp_file.write(payload)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+
+        # mkstemp creates private files; keep the target's permissions instead
+        try:
+            os.chmod(temp_path, os.stat(path).st_mode & 0o7777)
+        except FileNotFoundError:
+            os.chmod(temp_path, 0o644)
+
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+    # Make the rename itself durable where the platform allows it
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
+def iter_button_models(data):
+    """Yield (index, button, transform) for every well-formed button model"""
+    if not isinstance(data, dict):
+        return
+    button_models = data.get("buttonModels")
+    if not isinstance(button_models, list):
+        return
+
+    for i, button in enumerate(button_models):
+        if not isinstance(button, dict) or "transform" not in button:
+            continue
+        transform = button["transform"]
+        if not isinstance(transform, dict):
+            continue
+        yield i, button, transform
+
+
+def validate_keymap(data):
+    """Return a list of human readable problems found in keymap data"""
+    problems = []
+
+    if not isinstance(data, dict):
+        return ["Top level object is not a dictionary"]
+
+    button_models = data.get("buttonModels")
+    if button_models is None:
+        return problems
+    if not isinstance(button_models, list):
+        return ["buttonModels is not a list"]
+
+    for i, button in enumerate(button_models):
+        if not isinstance(button, dict):
+            problems.append(f"buttonModels[{i}]: not a dictionary")
+            continue
+
+        key_code = button.get("keyCode")
+        if not isinstance(key_code, int) or isinstance(key_code, bool):
+            problems.append(f"buttonModels[{i}]: keyCode is missing or not an integer")
+        elif keycodes.key_name(key_code) is None:
+            problems.append(f"buttonModels[{i}]: unknown keyCode {key_code}")
+
+        transform = button.get("transform")
+        if not isinstance(transform, dict):
+            problems.append(f"buttonModels[{i}]: transform is missing")
+            continue
+
+        for field in ("size", "xCoord", "yCoord"):
+            value = transform.get(field)
+            if not isinstance(value, (int, float)) or isinstance(value, bool):
+                problems.append(f"buttonModels[{i}]: transform.{field} is not a number")
+
+    return problems
+
+
+def rewrite_keymap(data, clamp=False, precision=None):
+    """Normalize button transforms in place and return the number of changed values"""
+    changed = 0
+
+    for _, _, transform in iter_button_models(data):
+        for field in ("size", "xCoord", "yCoord"):
+            value = transform.get(field)
+            if not isinstance(value, (int, float)) or isinstance(value, bool):
+                continue
+
+            new_value = float(value)
+            if clamp:
+                if field == "size":
+                    new_value = min(max(new_value, MIN_BUTTON_SIZE), MAX_BUTTON_SIZE)
+                else:
+                    new_value = min(max(new_value, 0.0), 1.0)
+            if precision is not None:
+                new_value = round(new_value, precision)
+
+            if new_value != value:
+                transform[field] = new_value
+                changed += 1
+
+    return changed
+
+
+def button_geometry(transform, width, height):
+    """Return (center_x, center_y, radius) of a button drawn on a width x height image"""
+    # Get transform values with defaults
+    return circle_geometry(
+        transform.get("xCoord", 0.0),
+        transform.get("yCoord", 0.0),
+        transform.get("size", 5.0),
+        width,
+        height,
+    )
+
+
+def circle_geometry(x_coord, y_coord, size, width, height):
+    """Return (center_x, center_y, radius) from normalized coordinates and a size"""
+    # Size is a percentage of the image width
+    diameter = (size / 100) * width
+    return x_coord * width, y_coord * height, diameter / 2
@@ -0,0 +1,354 @@
+"""Index of keymap folders in a local SQLite cache, searchable by game or bound key
+
+Each indexed keymap records its content hash, mtime, button count, the keys
+it binds and a screenshot found next to it. Rescans only re-read files
+whose mtime or size changed, so reopening a large library costs one stat
+per file.
+"""
+import hashlib
+import os
+import sqlite3
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import keycodes
+import keymap
+import paths
+
+DATABASE_FILE = "library.sqlite"
+
+# Bump when the schema changes; the cache is then rebuilt from scratch
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS roots (
+    path TEXT PRIMARY KEY,
+    scanned_at REAL
+);
+CREATE TABLE IF NOT EXISTS keymaps (
+    path TEXT PRIMARY KEY,
+    root TEXT NOT NULL,
+    name TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    hash TEXT,
+    button_count INTEGER,
+    screenshot TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS keymaps_root ON keymaps (root);
+CREATE TABLE IF NOT EXISTS keys (
+    path TEXT NOT NULL,
+    code INTEGER NOT NULL,
+    name TEXT NOT NULL COLLATE NOCASE,
+    PRIMARY KEY (path, code)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS keys_name ON keys (name);
+"""
+
+# Search terms with this prefix match a bound key instead of the game name
+KEY_PREFIX = "key:"
+
+# Changed files below this count are parsed in-process
+PARALLEL_THRESHOLD = 64
+
+# Fields holding key codes besides buttonModels' keyCode
+JOYSTICK_CODE_FIELDS = ("upKeyCode", "rightKeyCode", "downKeyCode", "leftKeyCode")
+
+Entry = namedtuple("Entry", "path name button_count keys screenshot hash error")
+ScanResult = namedtuple("ScanResult", "added updated unchanged removed failed")
+
+
+def database_path():
+    return os.path.join(paths.user_cache_dir(), DATABASE_FILE)
+
+
+def game_name(path):
+    """Name shown for a keymap: its file name without the extension"""
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def bound_keys(data):
+    """{code: name} of every key a keymap binds"""
+    codes = {}
+
+    def add(code, fallback=None):
+        if isinstance(code, int) and not isinstance(code, bool):
+            codes[code] = keycodes.key_name(code) or fallback or str(code)
+
+    for key in ("buttonModels", "draggableButtonModels"):
+        models = data.get(key)
+        if isinstance(models, list):
+            for model in models:
+                if isinstance(model, dict):
+                    add(model.get("keyCode"), model.get("keyName"))
+    joysticks = data.get("joystickModel")
+    if isinstance(joysticks, list):
+        for joystick in joysticks:
+            if isinstance(joystick, dict):
+                for field in JOYSTICK_CODE_FIELDS:
+                    add(joystick.get(field))
+    return codes
+
+
+def index_task(path):
+    """Read one keymap; returns (path, hash, button_count, keys, error)
+
+    Runs in worker processes, so it only takes and returns plain values.
+    """
+    try:
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+    except OSError as e:
+        return path, None, None, {}, str(e)
+    try:
+        data = keymap.load_keymap(path)
+        if not isinstance(data, dict):
+            raise Exception("Top level object is not a dictionary")
+    except Exception as e:
+        return path, digest, None, {}, str(e)
+
+    button_models = data.get("buttonModels")
+    count = len(button_models) if isinstance(button_models, list) else 0
+    return path, digest, count, bound_keys(data), None
+
+
+def process_map(jobs=None):
+    """A mapper for Library.scan that parses on a process pool"""
+
+    def mapper(func, items):
+        if len(items) < PARALLEL_THRESHOLD or jobs == 1:
+            return map(func, items)
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            chunksize = max(1, len(items) // ((jobs or os.cpu_count() or 1) * 8))
+            return list(executor.map(func, items, chunksize=chunksize))
+
+    return mapper
+
+
+def pair_screenshot(keymap_name, image_names):
+    """The screenshot for a keymap among the images in its folder, or None
+
+    An image with the keymap's name wins; otherwise a folder holding a
+    single image pairs it with every keymap there.
+    """
+    stem = os.path.splitext(keymap_name)[0].lower()
+    for image_name in image_names:
+        if os.path.splitext(image_name)[0].lower() == stem:
+            return image_name
+    if len(image_names) == 1:
+        return image_names[0]
+    return None
+
+
+def iter_folder(root, skip=()):
+    """Yield (keymap DirEntry, screenshot path or None) for a directory tree
+
+    Directories in skip (absolute paths) are not entered.
+    """
+    pending = [root]
+    while pending:
+        directory = pending.pop()
+        try:
+            entries = sorted(os.scandir(directory), key=lambda entry: entry.name)
+        except OSError:
+            continue
+        images = []
+        keymaps = []
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.path not in skip:
+                    pending.append(entry.path)
+            elif keymap.is_keymap_file(entry.name):
+                keymaps.append(entry)
+            elif keymap.is_image_file(entry.name):
+                images.append(entry.name)
+        for entry in keymaps:
+            image_name = pair_screenshot(entry.name, images)
+            screenshot = os.path.join(directory, image_name) if image_name else None
+            yield entry, screenshot
+
+
+class Library:
+    """Connection to the library cache; use one per thread"""
+
+    def __init__(self, path=None):
+        self.path = path or database_path()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.connection = sqlite3.connect(self.path)
+        # Readers (the GUI) aren't blocked while a rescan writes
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if version != SCHEMA_VERSION:
+            with self.connection:
+                for table in ("roots", "keymaps", "keys"):
+                    self.connection.execute(f"DROP TABLE IF EXISTS {table}")
+                self.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def roots(self):
+        return [
+            row[0]
+            for row in self.connection.execute("SELECT path FROM roots ORDER BY path")
+        ]
+
+    def remove_root(self, root):
+        """Forget a folder and its keymaps"""
+        root = os.path.abspath(root)
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM keys WHERE path IN (SELECT path FROM keymaps WHERE root = ?)",
+                (root,),
+            )
+            self.connection.execute("DELETE FROM keymaps WHERE root = ?", (root,))
+            self.connection.execute("DELETE FROM roots WHERE path = ?", (root,))
+
+    def scan(self, root, mapper=map):
+        """Bring the index of a folder up to date and return a ScanResult
+
+        Files whose mtime and size are unchanged are not opened again.
+        mapper(func, items) runs index_task over the changed files; pass a
+        process-pool map to parse them in parallel.
+
+        Each keymap belongs to the deepest indexed folder holding it: folders
+        indexed inside this one are left to their own scans, and keymaps a
+        parent folder indexed before this one was added are taken over.
+        """
+        root = os.path.abspath(root)
+        prefix = os.path.join(root, "")
+        deeper = {other for other in self.roots() if other.startswith(prefix)}
+        known = {}
+        for path, owner, mtime_ns, size, screenshot in self.connection.execute(
+            "SELECT path, root, mtime_ns, size, screenshot FROM keymaps "
+            "WHERE root = ? OR substr(path, 1, ?) = ?",
+            (root, len(prefix), prefix),
+        ):
+            if owner == root or prefix.startswith(os.path.join(owner, "")):
+                known[path] = (mtime_ns, size, screenshot, owner)
+
+        seen = set()
+        changed = {}
+        moved = []
+        unchanged = 0
+        for entry, screenshot in iter_folder(root, deeper):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            seen.add(entry.path)
+            previous = known.get(entry.path)
+            if previous is not None and previous[:2] == (stat.st_mtime_ns, stat.st_size):
+                unchanged += 1
+                if previous[2:] != (screenshot, root):
+                    moved.append((root, screenshot, entry.path))
+            else:
+                changed[entry.path] = (stat.st_mtime_ns, stat.st_size, screenshot)
+
+        added = updated = failed = 0
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO roots (path, scanned_at) VALUES (?, ?)",
+                (root, time.time()),
+            )
+            self.connection.executemany(
+                "UPDATE keymaps SET root = ?, screenshot = ? WHERE path = ?", moved
+            )
+
+            for path, digest, count, keys, error in mapper(index_task, list(changed)):
+                mtime_ns, size, screenshot = changed[path]
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO keymaps (path, root, name, mtime_ns, size, "
+                    "hash, button_count, screenshot, error) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        path,
+                        root,
+                        game_name(path),
+                        mtime_ns,
+                        size,
+                        digest,
+                        count,
+                        screenshot,
+                        error,
+                    ),
+                )
+                self.connection.execute("DELETE FROM keys WHERE path = ?", (path,))
+                self.connection.executemany(
+                    "INSERT INTO keys (path, code, name) VALUES (?, ?, ?)",
+                    [(path, code, name) for code, name in keys.items()],
+                )
+                if error is not None:
+                    failed += 1
+                elif path in known:
+                    updated += 1
+                else:
+                    added += 1
+
+            removed = [(path,) for path in known if path not in seen]
+            self.connection.executemany("DELETE FROM keys WHERE path = ?", removed)
+            self.connection.executemany("DELETE FROM keymaps WHERE path = ?", removed)
+
+        return ScanResult(added, updated, unchanged, len(removed), failed)
+
+    def rescan(self, mapper=map):
+        """Rescan every known folder; returns {root: ScanResult or None}
+
+        Missing folders (e.g. on an unplugged drive) are skipped rather than
+        emptied, and map to None.
+        """
+        return {
+            root: self.scan(root, mapper) if os.path.isdir(root) else None
+            for root in self.roots()
+        }
+
+    def search(self, text="", limit=1000):
+        """Entries matching every term of text, by game name
+
+        Terms match the game name or path; terms written key:NAME match
+        keymaps binding that key instead.
+        """
+        clauses = []
+        params = []
+        for term in text.split():
+            if term.lower().startswith(KEY_PREFIX) and len(term) > len(KEY_PREFIX):
+                clauses.append(
+                    "path IN (SELECT path FROM keys WHERE name = ? COLLATE NOCASE)"
+                )
+                params.append(term[len(KEY_PREFIX) :])
+            else:
+                clauses.append("(name LIKE ? ESCAPE '\\' OR path LIKE ? ESCAPE '\\')")
+                pattern = "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace(
+                    "_", "\\_"
+                ) + "%"
+                params.extend((pattern, pattern))
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self.connection.execute(
+            "SELECT path, name, button_count, screenshot, hash, error FROM keymaps "
+            f"{where} ORDER BY name COLLATE NOCASE, path LIMIT ?",
+            params + [limit],
+        ).fetchall()
+
+        keys = {}
+        for path, name in self.connection.execute(
+            "SELECT path, name FROM keys WHERE path IN "
+            f"(SELECT path FROM keymaps {where} ORDER BY name COLLATE NOCASE, path "
+            "LIMIT ?) ORDER BY path, code",
+            params + [limit],
+        ):
+            keys.setdefault(path, []).append(name)
+
+        return [
+            Entry(path, name, count, tuple(keys.get(path, ())), screenshot, digest, error)
+            for path, name, count, screenshot, digest, error in rows
+        ]
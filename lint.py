@@ -0,0 +1,360 @@
+"""Lint rules for keymaps: structure, key conflicts, off-screen and overlapping buttons
+
+Checks run over whole NumPy columns, and overlapping circles are found with a
+uniform grid, so a 10k-button layout lints in milliseconds instead of the
+seconds an all-pairs comparison would take.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+import keycodes
+from keymap import MAX_BUTTON_SIZE, MIN_BUTTON_SIZE
+from model_store import KEY_CODE_LIMITS, TRANSFORM_FIELDS, ButtonStore
+
+ERROR = "error"
+WARNING = "warning"
+
+# Screen shape assumed when there is no screenshot to take it from
+DEFAULT_ASPECT = 16 / 10
+
+# Candidate pairs examined per batch, bounding temporary arrays
+PAIR_BATCH = 1_000_000
+
+# Circles this many times the median radius skip the grid
+LARGE_RADIUS_FACTOR = 4
+
+# Stop listing overlapping pairs after this many and summarize the rest
+MAX_OVERLAPS = 500
+
+Diagnostic = namedtuple("Diagnostic", "severity rule indices message")
+
+# Lookup table of valid codes, indexed by code - keycodes.MIN_CODE
+KNOWN_CODES = np.array([name is not None for name in keycodes.KEY_NAMES])
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _check_button(i, button, diagnostics):
+    """Structural checks for one button; returns (geometry_ok, key_ok)"""
+    if not isinstance(button, dict):
+        diagnostics.append(
+            Diagnostic(ERROR, "malformed", (i,), f"buttonModels[{i}]: not a dictionary")
+        )
+        return False, False
+
+    key_ok = _is_number(button.get("keyCode")) and isinstance(button["keyCode"], int)
+    if not key_ok:
+        diagnostics.append(
+            Diagnostic(
+                ERROR,
+                "malformed",
+                (i,),
+                f"buttonModels[{i}]: keyCode is missing or not an integer",
+            )
+        )
+    elif not KEY_CODE_LIMITS.min <= button["keyCode"] <= KEY_CODE_LIMITS.max:
+        key_ok = False
+        diagnostics.append(
+            Diagnostic(
+                ERROR,
+                "unknown-key",
+                (i,),
+                f"buttonModels[{i}]: keyCode {button['keyCode']} is out of range",
+            )
+        )
+
+    transform = button.get("transform")
+    if not isinstance(transform, dict):
+        diagnostics.append(
+            Diagnostic(ERROR, "malformed", (i,), f"buttonModels[{i}]: transform is missing")
+        )
+        return False, key_ok
+
+    geometry_ok = True
+    for field in TRANSFORM_FIELDS:
+        if not _is_number(transform.get(field)):
+            diagnostics.append(
+                Diagnostic(
+                    ERROR,
+                    "malformed",
+                    (i,),
+                    f"buttonModels[{i}]: transform.{field} is not a number",
+                )
+            )
+            geometry_ok = False
+    return geometry_ok, key_ok
+
+
+def lint_keymap(data, aspect=DEFAULT_ASPECT):
+    """Return a list of Diagnostics for keymap data
+
+    buttonModels may be a plain list or a ButtonStore. aspect is the screen
+    width / height, used to turn sizes into circles for the overlap check.
+    """
+    if not isinstance(data, dict):
+        return [Diagnostic(ERROR, "malformed", (), "Top level object is not a dictionary")]
+
+    button_models = data.get("buttonModels")
+    if button_models is None:
+        return []
+    if isinstance(button_models, ButtonStore):
+        return lint_store(button_models, aspect)
+    if not isinstance(button_models, list):
+        return [Diagnostic(ERROR, "malformed", (), "buttonModels is not a list")]
+
+    count = len(button_models)
+    x = np.zeros(count)
+    y = np.zeros(count)
+    size = np.zeros(count)
+    key_code = np.zeros(count, dtype=np.int64)
+    geometry = np.zeros(count, dtype=bool)
+    keyed = np.zeros(count, dtype=bool)
+
+    diagnostics = []
+    for i, button in enumerate(button_models):
+        geometry[i], keyed[i] = _check_button(i, button, diagnostics)
+        if geometry[i]:
+            transform = button["transform"]
+            x[i] = transform["xCoord"]
+            y[i] = transform["yCoord"]
+            size[i] = transform["size"]
+        if keyed[i]:
+            key_code[i] = button["keyCode"]
+
+    diagnostics.extend(lint_columns(x, y, size, key_code, geometry, keyed, aspect))
+    return diagnostics
+
+
+def lint_store(store, aspect=DEFAULT_ASPECT):
+    """Lint a ButtonStore straight from its columns
+
+    Only rows with extra or missing fields are rebuilt as dictionaries for
+    the structural checks; every other row is known to be well-formed.
+    """
+    count = len(store)
+    complete = np.array(
+        [
+            "keyCode" in top
+            and "transform" in top
+            and all(field in transform for field in TRANSFORM_FIELDS)
+            for top, transform in store.layouts
+        ]
+    )
+    suspicious = ~complete[store.layout_id[:count]]
+    for i, extras in enumerate(store.extras[:count]):
+        if extras is not None:
+            suspicious[i] = True
+
+    geometry = np.ones(count, dtype=bool)
+    keyed = np.ones(count, dtype=bool)
+    diagnostics = []
+    for i in np.flatnonzero(suspicious):
+        i = int(i)
+        geometry[i], keyed[i] = _check_button(i, store.button(i), diagnostics)
+
+    diagnostics.extend(
+        lint_columns(
+            store.x[:count],
+            store.y[:count],
+            store.size[:count],
+            store.key_code[:count],
+            geometry,
+            keyed,
+            aspect,
+        )
+    )
+    return diagnostics
+
+
+def lint_columns(x, y, size, key_code, geometry, keyed, aspect=DEFAULT_ASPECT):
+    """Value checks over whole columns
+
+    geometry and keyed are masks of the rows whose transform and keyCode
+    are usable; the other rows were already reported as malformed.
+    """
+    diagnostics = []
+
+    # Key codes PlayCover doesn't know
+    codes = key_code[keyed]
+    rows = np.flatnonzero(keyed)
+    offset = codes - keycodes.MIN_CODE
+    in_range = (offset >= 0) & (offset < len(KNOWN_CODES))
+    known = np.zeros(len(codes), dtype=bool)
+    known[in_range] = KNOWN_CODES[offset[in_range]]
+    for i in rows[~known]:
+        diagnostics.append(
+            Diagnostic(
+                ERROR,
+                "unknown-key",
+                (int(i),),
+                f"buttonModels[{i}]: unknown keyCode {key_code[i]}",
+            )
+        )
+
+    # Several buttons bound to the same key
+    if len(codes):
+        unique, inverse, counts = np.unique(
+            codes, return_inverse=True, return_counts=True
+        )
+        # Rows grouped by code, in row order within each group
+        groups = np.split(rows[np.argsort(inverse, kind="stable")], np.cumsum(counts))
+        for group in np.flatnonzero(counts > 1):
+            indices = tuple(int(i) for i in groups[group])
+            code = int(unique[group])
+            name = keycodes.key_name(code) or code
+            listed = ", ".join(str(i) for i in indices)
+            diagnostics.append(
+                Diagnostic(
+                    WARNING,
+                    "duplicate-key",
+                    indices,
+                    f"buttonModels[{listed}]: all bound to {name}",
+                )
+            )
+
+    # Centres outside the screen
+    outside = geometry & ((x < 0) | (x > 1) | (y < 0) | (y > 1))
+    for i in np.flatnonzero(outside):
+        diagnostics.append(
+            Diagnostic(
+                ERROR,
+                "off-screen",
+                (int(i),),
+                f"buttonModels[{i}]: centre ({x[i]:.3f}, {y[i]:.3f}) is off-screen",
+            )
+        )
+
+    # Sizes the editor itself would refuse
+    bad_size = geometry & ((size < MIN_BUTTON_SIZE) | (size > MAX_BUTTON_SIZE))
+    for i in np.flatnonzero(bad_size):
+        diagnostics.append(
+            Diagnostic(
+                WARNING,
+                "size-range",
+                (int(i),),
+                f"buttonModels[{i}]: size {size[i]:g} is outside "
+                f"{MIN_BUTTON_SIZE}-{MAX_BUTTON_SIZE}",
+            )
+        )
+
+    diagnostics.extend(_overlaps(x, y, size, geometry, aspect))
+    return diagnostics
+
+
+def _expand(first, counts):
+    """Yield (a, b) index arrays pairing each first[k] with counts[k] successors
+
+    Pairs are produced in batches of at most PAIR_BATCH.
+    """
+    count = len(first)
+    start = 0
+    while start < count:
+        totals = np.cumsum(counts[start:])
+        stop = start + max(1, int(np.searchsorted(totals, PAIR_BATCH, side="right")))
+        batch = counts[start:stop]
+        total = int(batch.sum())
+        if total:
+            a = np.repeat(np.arange(start, stop), batch)
+            skip = np.repeat(np.cumsum(batch) - batch, batch)
+            yield a, np.repeat(first[start:stop], batch) + (np.arange(total) - skip)
+        start = stop
+
+
+def overlapping_pairs(x, y, size, aspect=DEFAULT_ASPECT):
+    """Yield arrays (first, second) of row indices whose circles intersect
+
+    Circles are bucketed into a uniform grid with cells as wide as the
+    largest ordinary circle, so intersecting circles always sit in the same
+    or adjacent cells and each bucket is only compared with half of its
+    neighbours. The few circles much larger than the rest are compared with
+    everything directly.
+    """
+    # Work in image widths: sizes are percentages of the width
+    center_x = np.asarray(x, dtype=np.float64)
+    center_y = np.asarray(y, dtype=np.float64) / aspect
+    radius = np.maximum(np.asarray(size, dtype=np.float64), 0) / 200
+    count = len(radius)
+    if count < 2:
+        return
+
+    def hits(a, b):
+        reach = radius[a] + radius[b]
+        hit = (center_x[a] - center_x[b]) ** 2 + (
+            center_y[a] - center_y[b]
+        ) ** 2 < reach**2
+        return np.minimum(a[hit], b[hit]), np.maximum(a[hit], b[hit])
+
+    typical = np.median(radius)
+    ordinary = radius <= max(typical * LARGE_RADIUS_FACTOR, 1e-9)
+    cell = max(2 * float(radius[ordinary].max()), 1e-9)
+
+    # Ordinary circles: grid cells keyed column-major, with a spare row so
+    # neighbour keys never wrap into the next column
+    rows = np.flatnonzero(ordinary)
+    grid_x = np.floor(center_x[rows] / cell).astype(np.int64)
+    grid_y = np.floor(center_y[rows] / cell).astype(np.int64)
+    grid_x -= grid_x.min()
+    grid_y -= grid_y.min()
+    height = int(grid_y.max()) + 2
+    keys = grid_x * height + grid_y
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    rows = rows[order]
+    positions = np.arange(len(keys))
+
+    for offset_x, offset_y in ((0, 0), (0, 1), (1, -1), (1, 0), (1, 1)):
+        target = keys + offset_x * height + offset_y
+        low = np.searchsorted(keys, target, side="left")
+        high = np.searchsorted(keys, target, side="right")
+        if offset_x == 0 and offset_y == 0:
+            # Within a cell, only pair each circle with the ones after it
+            low = positions + 1
+        counts = np.maximum(high - low, 0)
+        for a, b in _expand(low, counts):
+            first, second = hits(rows[a], rows[b])
+            if len(first):
+                yield first, second
+
+    # Large circles against everything; pairs of large circles only once
+    large = np.flatnonzero(~ordinary)
+    everything = np.arange(count)
+    for row in large:
+        others = everything[ordinary | (everything > row)]
+        first, second = hits(np.full(len(others), row), others)
+        if len(first):
+            yield first, second
+
+
+def _overlaps(x, y, size, geometry, aspect):
+    rows = np.flatnonzero(geometry)
+    found = []
+    listed = 0
+    extra = 0
+    for first, second in overlapping_pairs(x[rows], y[rows], size[rows], aspect):
+        room = max(0, MAX_OVERLAPS - listed)
+        found.append((rows[first[:room]], rows[second[:room]]))
+        listed += min(room, len(first))
+        extra += len(first) - min(room, len(first))
+
+    diagnostics = [
+        Diagnostic(
+            WARNING,
+            "overlap",
+            (int(a), int(b)),
+            f"buttonModels[{a}] and buttonModels[{b}] overlap",
+        )
+        for first, second in found
+        for a, b in zip(first, second)
+    ]
+    diagnostics.sort(key=lambda diagnostic: diagnostic.indices)
+    if extra:
+        diagnostics.append(
+            Diagnostic(WARNING, "overlap", (), f"... and {extra} more overlapping pairs")
+        )
+    return diagnostics
+
+
+def format_diagnostic(diagnostic):
+    return f"{diagnostic.severity}: {diagnostic.message} [{diagnostic.rule}]"
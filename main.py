@@ -1,188 +1,173 @@
 import tkinter as tk
-from tkinter import filedialog, messagebox
-from tkinterdnd2 import DND_FILES, TkinterDnD
-from PIL import Image, ImageTk
+from tkinter import filedialog, messagebox, simpledialog
+import argparse
+import functools
+import importlib.util
 import os
-import plistlib
-import json
-
-CodeToKeys = {
-    -4: "cA",
-    -5: "cX",
-    -6: "cB",
-    -7: "cY",
-    -8: "dU",
-    -9: "dD",
-    -10: "Controller",
-    -11: "dL",
-    -12: "L1",
-    -13: "L2",
-    -14: "R1",
-    -15: "R2",
-    -1: "LMB",
-    -2: "RMB",
-    -3: "MMB",
-    41: "Escape",
-    44: "space",
-    225: "Shift_L",
-    57: "Caps_Lock",
-    43: "Tab",
-    227: "Super_L",
-    226: "Alt_L",
-    231: "Super_R",
-    230: "Alt_R",
-    40: "Return",
-    42: "BackSpace",
-    229: "Shift_R",
-    80: "Left",
-    79: "Right",
-    82: "Up",
-    81: "Down",
-    58: "F1",
-    59: "F2",
-    60: "F3",
-    61: "F4",
-    62: "F5",
-    63: "F6",
-    64: "F7",
-    65: "F8",
-    66: "F9",
-    67: "F10",
-    68: "F11",
-    69: "F12",
-    100: "section",
-    30: "1",
-    31: "2",
-    32: "3",
-    33: "4",
-    34: "5",
-    35: "6",
-    36: "7",
-    37: "8",
-    38: "9",
-    39: "0",
-    45: "minus",
-    46: "equal",
-    20: "q",
-    26: "w",
-    8: "e",
-    21: "r",
-    23: "t",
-    28: "y",
-    24: "u",
-    12: "i",
-    18: "o",
-    19: "p",
-    47: "bracketleft",
-    48: "bracketright",
-    4: "a",
-    22: "s",
-    7: "d",
-    9: "f",
-    10: "g",
-    11: "h",
-    13: "j",
-    14: "k",
-    15: "l",
-    51: "semicolon",
-    52: "apostrophe",
-    49: "backslash",
-    29: "z",
-    53: "grave",
-    27: "x",
-    6: "c",
-    25: "v",
-    5: "b",
-    17: "n",
-    16: "m",
-    54: "comma",
-    55: "period",
-    56: "slash",
-}
-
-KeyToCode = {v: k for k, v in CodeToKeys.items()}
-
-KeyNameDifferences = {
-    "Escape": "Esc",
-    "space": "Spc",
-    "Shift_L": "Lshft",
-    "Caps_Lock": "Caps",
-    "Super_L": "LCmd",
-    "Alt_L": "LOpt",
-    "Super_R": "RCmd",
-    "Alt_R": "ROpt",
-    "Return": "Enter",
-    "BackSpace": "Del",
-    "Shift_R": "Rshft",
-    "section": "§",
-    "minus": "-",
-    "equal": "=",
-    "q": "Q",
-    "w": "W",
-    "e": "E",
-    "r": "R",
-    "t": "T",
-    "y": "Y",
-    "u": "U",
-    "i": "I",
-    "o": "O",
-    "p": "P",
-    "bracketleft": "[",
-    "bracketright": "]",
-    "a": "A",
-    "s": "S",
-    "d": "D",
-    "f": "F",
-    "g": "G",
-    "h": "H",
-    "j": "J",
-    "k": "K",
-    "l": "L",
-    "semicolon": ";",
-    "apostrophe": "'",
-    "backslash": "\\",
-    "z": "Z",
-    "grave": "`",
-    "x": "X",
-    "c": "C",
-    "v": "V",
-    "b": "B",
-    "n": "N",
-    "m": "M",
-    "comma": ",",
-    "period": ".",
-    "slash": "/",
-}
-
-
-def is_image_file(filename):
-    ext = os.path.splitext(filename)[1].lower()
-    return ext in [
-        ".png", ".jpg", ".jpeg", ".gif", ".bmp", ".tiff", ".tif"
-    ]
-
-
-def is_plist_file(filename):
-    ext = os.path.splitext(filename)[1].lower()
-    return ext in [".plist", ".playmap"]
+import sys
+
+import history
+import profiling
+import session
+from history import EditHistory
+import keycodes
+
+
+def lazy_import(name):
+    """Return a module that is only executed when one of its attributes is used"""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+# NumPy and Pillow take most of the start-up time, so they (and the modules
+# built on them) are loaded once the files are chosen, not before the first
+# file dialog; so are the plist parser and the thread pool
+np = lazy_import("numpy")
+ImageTk = lazy_import("PIL.ImageTk")
+background = lazy_import("background")
+canvas_layers = lazy_import("canvas_layers")
+image_cache = lazy_import("image_cache")
+imaging = lazy_import("imaging")
+journal = lazy_import("journal")
+keymap = lazy_import("keymap")
+library = lazy_import("library")
+lint = lazy_import("lint")
+merge = lazy_import("merge")
+model_store = lazy_import("model_store")
+pyramid = lazy_import("pyramid")
+thumbnails = lazy_import("thumbnails")
+transforms = lazy_import("transforms")
+watcher = lazy_import("watcher")
+
+# Zoom is relative to the screen-fit size; the upper bound is in screen
+# pixels per source pixel so small screenshots can't be blown up forever
+ZOOM_STEP = 1.25
+MAX_SOURCE_SCALE = 4.0
+
+# Arrow keys nudge the selection by 0.5% of the image
+NUDGE_STEP = 0.005
+SHIFT_MASK = 0x0001
+
+# Drag motion is applied at most once per frame (~60 Hz)
+FRAME_INTERVAL = 16
+
+# Snap choices for dragging, as steps in normalized image units
+SNAP_STEPS = {"Off": None, "0.5%": 0.005, "5% grid": 0.05}
+
+# Model arrays drawn besides buttonModels, bottom to top:
+# (key, label, color, shape, dash)
+MODEL_LAYERS = (
+    ("mouseAreaModel", "Mouse areas", "#9C27B0", "rectangle", (4, 2)),
+    ("joystickModel", "Joysticks", "#4CAF50", "oval", None),
+    ("draggableButtonModels", "Draggable", "#E91E63", "oval", (6, 3)),
+)
+# Hit-testing goes from the top layer down
+MODEL_HIT_ORDER = tuple(key for key, *_ in reversed(MODEL_LAYERS))
+
+# Hot paths timed when profiling is on
+PROFILED_METHODS = (
+    "load_image",
+    "show_display_image",
+    "draw_button_models",
+    "on_click",
+    "on_drag",
+    "flush_drag",
+    "on_release",
+    "load_plist",
+    "load_json",
+    "save_data",
+    "merge_disk_changes",
+)
+# Thumbnails rendered ahead of time when the library is listed
+PREFETCH_THUMBNAILS = 200
+
+# Refresh period of the profile window in ms
+PROFILE_REFRESH = 500
+
+# Conflicts listed after merging a keymap changed by another program
+MAX_SHOWN_CONFLICTS = 10
 
 
 class ImageViewer:
-    def __init__(self, root):
+    def __init__(self, root, profiler=None):
         self.root = root
+        # Latency histograms of the hot paths, or None when profiling is off
+        self.profiler = profiler
+        self.profile_window = None
+        # Keymap library cache, opened with the Library window
+        self.library = None
+        self.library_window = None
+        # Running library scan and thumbnail prefetch, or None
+        self.library_scan = None
+        self.thumbnail_prefetch = None
+        # (on_scanned, on_failed) of the latest Library window; a scan
+        # reports to whichever window is open when it ends
+        self.library_scan_callbacks = None
         self.root.title("Image Viewer")
 
         # Variables
         self.current_image = None
         self.photo = None
+        self.image_item = None
+        self.image_generation = 0
         self.plist_data = None
         self.canvas_width = 0
         self.canvas_height = 0
+        self.zoom = 1.0
+        self.pyramid = None
         self.dragging_item = None
         self.drag_start_x = 0
         self.drag_start_y = 0
-        self.button_circles = {}  # Store circle IDs and their corresponding button data
+        # (model key, row) of a joystick, mouse area... being dragged
+        self.dragging_model = None
+        # Model position of the grabbed button and the offset drawn so far
+        self.drag_anchor = (0.0, 0.0)
+        self.drag_offset = (0.0, 0.0)
+        # Latest pointer position and the frame that will apply it
+        self.drag_pointer = None
+        self.drag_frame = None
+        self.rubber_band = None
+        self.rubber_band_start = (0, 0)
         self.save_window = None  # Store reference to save window
+        # Files being edited, remembered in the session on exit
+        self.image_filename = None
+        self.keymap_filename = None
+        # Saved zoom and scroll position, applied once the pyramid is ready
+        self.pending_view = None
+        # The keymap file as last read or written, the base for merging in
+        # changes other programs make to it while it is open
+        self.disk_data = None
+        self.watcher = None
+        self.keymap_stale = False
+        self.reloading = False
+
+        # Undo/redo of edits to buttonModels
+        self.history = EditHistory()
+        # Crash-recovery log of unsaved edits, next to the keymap
+        self.journal = None
+        # Counts edits so a finished background save knows if it is current
+        self.edit_serial = 0
+        # Write plists in the binary format instead of XML
+        self.binary_plist = tk.BooleanVar(master=root, value=False)
+        # Snap dragged buttons to one of SNAP_STEPS
+        self.snap_choice = tk.StringVar(master=root, value="Off")
+        # Notices that shouldn't interrupt editing, shown in the Controls window
+        self.status = tk.StringVar(master=root, value="")
+
+        # Worker threads for decoding; results come back on the Tk thread
+        self.background = background.BackgroundTasks(root)
+        # Library scans and thumbnail batches can't be cancelled, so they get
+        # their own workers and never hold up image loading or saving
+        self.library_tasks = background.BackgroundTasks(root)
+        # Screenshots already scaled to their display size
+        self.image_cache = image_cache.ScaledImageCache()
 
         # Make window unresizable
         self.root.resizable(False, False)
@@ -194,27 +179,98 @@ class ImageViewer:
         self.canvas = tk.Canvas(root, highlightthickness=0)
         self.canvas.pack(fill=tk.BOTH, expand=True)
 
+        # Retained-mode layer owning the circle/text items of each button
+        self.button_layer = canvas_layers.ButtonLayer(self.canvas)
+        # One layer per model array; each is redrawn only when dirty
+        self.layers = canvas_layers.LayerStack()
+        self.layer_visible = {}
+        for key, _, color, shape, dash in MODEL_LAYERS:
+            self.layers.add(
+                key,
+                canvas_layers.ModelLayer(
+                    self.canvas, f"{key}_layer", color, shape, dash
+                ),
+            )
+            self.layer_visible[key] = tk.BooleanVar(master=root, value=True)
+        self.layers.add("buttonModels", self.button_layer)
+        self.layer_visible["buttonModels"] = tk.BooleanVar(master=root, value=True)
+        # Store circle IDs and their corresponding button data
+        self.button_circles = self.button_layer.button_circles
+        # Visible tiles of the zoomed screenshot
+        self.tile_layer = canvas_layers.TileLayer(self.canvas)
+        # Changes against another keymap, shown while the Compare window is open
+        self.diff_layer = canvas_layers.DiffLayer(self.canvas)
+        self.diff_changes = None
+        self.compare_window = None
+
         # Bind mouse events for dragging
         self.canvas.bind("<Button-1>", self.on_click)
         self.canvas.bind("<B1-Motion>", self.on_drag)
         self.canvas.bind("<ButtonRelease-1>", self.on_release)
         self.canvas.bind("<Double-Button-1>", self.on_double_click)
+        self.canvas.bind("<Motion>", self.on_motion)
+
+        # Zoom with Ctrl/Cmd + wheel or +/-/0, pan with wheel or right/middle drag
+        self.canvas.bind("<MouseWheel>", self.on_mouse_wheel)
+        self.canvas.bind("<Shift-MouseWheel>", self.on_mouse_wheel)
+        self.canvas.bind("<Button-4>", self.on_mouse_wheel)
+        self.canvas.bind("<Button-5>", self.on_mouse_wheel)
+        for button in ("2", "3"):
+            self.canvas.bind(f"<Button-{button}>", self.on_pan_start)
+            self.canvas.bind(f"<B{button}-Motion>", self.on_pan_drag)
+        self.root.bind("<plus>", lambda e: self.zoom_by(ZOOM_STEP))
+        self.root.bind("<equal>", lambda e: self.zoom_by(ZOOM_STEP))
+        self.root.bind("<minus>", lambda e: self.zoom_by(1 / ZOOM_STEP))
+        self.root.bind("<Key-0>", lambda e: self.set_zoom(1.0))
+
+        self.bind_undo_keys(self.root)
+
+        # Keyboard nudging of the selection; repeated nudges undo as one step
+        for key, dx, dy in (
+            ("Left", -NUDGE_STEP, 0),
+            ("Right", NUDGE_STEP, 0),
+            ("Up", 0, -NUDGE_STEP),
+            ("Down", 0, NUDGE_STEP),
+        ):
+            self.root.bind(
+                f"<{key}>",
+                lambda e, dx=dx, dy=dy: self.move_selection(dx, dy, group="nudge"),
+            )
+        self.root.bind("<Escape>", lambda e: self.button_layer.set_selection(()))
+
+        if self.profiler is not None:
+            self.root.bind("<F12>", lambda e: self.open_profile_window())
 
     def on_main_window_close(self):
         """Handle main window close event"""
-        self.root.quit()
+        self.shutdown()
 
     def on_save_window_close(self):
         """Handle save window close event"""
+        self.shutdown()
+
+    def shutdown(self):
+        """Remember the session, release workers, watches and the journal, and quit"""
+        self.save_session()
+        self.background.shutdown()
+        self.library_tasks.shutdown()
+        if self.watcher is not None:
+            self.watcher.close()
+        if self.journal is not None:
+            self.journal.close()
         self.root.quit()
 
     def load_image(self, filename):
-        """Load and display the image, scaling down if larger than screen"""
-        # Open image with PIL
-        self.current_image = Image.open(filename)
+        """Load and display the image, scaling down if larger than screen
 
-        # Get image dimensions
-        img_width, img_height = self.current_image.size
+        Only the image header is read here. Decoding and resizing run on a
+        worker thread: a quick preview is shown first and swapped for the
+        full-quality image when it is ready, so buttons can be drawn and
+        dragged straight away.
+        """
+        # Get image dimensions without decoding the pixels
+        img_width, img_height = imaging.read_size(filename)
+        self.image_filename = filename
 
         # Get screen dimensions
         screen_width = self.root.winfo_screenwidth()
@@ -224,26 +280,9 @@ class ImageViewer:
         max_width = screen_width - 100
         max_height = screen_height - 100
 
-        # Check if image needs to be scaled down
-        if img_width > max_width or img_height > max_height:
-            # Calculate scaling factor to fit within screen while maintaining aspect ratio
-            width_ratio = max_width / img_width
-            height_ratio = max_height / img_height
-            scale_factor = min(width_ratio, height_ratio)
-
-            # Calculate new dimensions
-            display_width = int(img_width * scale_factor)
-            display_height = int(img_height * scale_factor)
-
-            # Resize image
-            display_image = self.current_image.resize(
-                (display_width, display_height), Image.Resampling.LANCZOS
-            )
-        else:
-            # Use original image if it fits on screen
-            display_image = self.current_image
-            display_width = img_width
-            display_height = img_height
+        display_width, display_height = imaging.fit_size(
+            img_width, img_height, max_width, max_height
+        )
 
         # Set window size to match display size
         self.root.geometry(f"{display_width}x{display_height}")
@@ -253,12 +292,18 @@ class ImageViewer:
         self.canvas_width = display_width
         self.canvas_height = display_height
 
-        # Convert to PhotoImage
-        self.photo = ImageTk.PhotoImage(display_image)
-
-        # Clear canvas and display image
+        # Clear canvas; the image item is filled in once decoding finishes
         self.canvas.delete("all")
-        self.canvas.create_image(0, 0, anchor=tk.NW, image=self.photo)
+        self.layers.forget()
+        self.tile_layer.forget()
+        self.pyramid = None
+        self.zoom = 1.0
+        self.canvas.config(scrollregion=(0, 0, display_width, display_height))
+        self.canvas.xview_moveto(0)
+        self.canvas.yview_moveto(0)
+        self.photo = None
+        self.image_item = self.canvas.create_image(0, 0, anchor=tk.NW)
+        self.draw_diff()
 
         # Update window title to include filename and scaling info
         filename_only = os.path.basename(filename)
@@ -267,151 +312,506 @@ class ImageViewer:
         else:
             self.root.title(f"Image Viewer - {filename_only} (native size)")
 
-    def draw_button_models(self):
-        """Draw circles on the canvas based on buttonModels data"""
-        if not self.plist_data or "buttonModels" not in self.plist_data:
+        # Results of an older load that finish late are ignored
+        self.image_generation += 1
+        generation = self.image_generation
+
+        def on_preview(preview_image):
+            # Called on the worker thread
+            self.background.post(self.show_display_image, generation, preview_image)
+
+        def on_decoded(result):
+            source_image, display_image = result
+            if generation == self.image_generation:
+                self.current_image = source_image
+                self.show_display_image(generation, display_image)
+                # Build the zoom pyramid from the full-resolution source
+                self.background.run(
+                    pyramid.TilePyramid(source_image).build,
+                    on_success=lambda pyramid: self.on_pyramid_ready(
+                        generation, pyramid
+                    ),
+                )
+
+        def on_failed(error):
+            if generation == self.image_generation:
+                messagebox.showerror("Error", f"Failed to load image:\n{str(error)}")
+
+        self.background.run(
+            imaging.decode_display_image,
+            filename,
+            (display_width, display_height),
+            on_preview,
+            self.image_cache,
+            on_success=on_decoded,
+            on_error=on_failed,
+        )
+
+    def show_display_image(self, generation, display_image):
+        """Show a decoded image on the canvas if it belongs to the current load"""
+        if generation != self.image_generation:
+            return
+
+        # Convert to PhotoImage; the reference must be kept alive
+        self.photo = ImageTk.PhotoImage(display_image)
+        self.canvas.itemconfigure(self.image_item, image=self.photo)
+
+    def on_pyramid_ready(self, generation, pyramid):
+        if generation == self.image_generation:
+            self.pyramid = pyramid
+            if self.pending_view is not None:
+                view, self.pending_view = self.pending_view, None
+                self.set_zoom(view["zoom"])
+                self.canvas.xview_moveto(view["x"])
+                self.canvas.yview_moveto(view["y"])
+                self.update_view()
+
+    @property
+    def content_width(self):
+        """Width of the zoomed image in canvas coordinates"""
+        return self.canvas_width * self.zoom
+
+    @property
+    def content_height(self):
+        """Height of the zoomed image in canvas coordinates"""
+        return self.canvas_height * self.zoom
+
+    def event_position(self, event):
+        """Convert window coordinates of an event to canvas coordinates"""
+        return self.canvas.canvasx(event.x), self.canvas.canvasy(event.y)
+
+    def zoom_by(self, factor, anchor_x=None, anchor_y=None):
+        self.set_zoom(self.zoom * factor, anchor_x, anchor_y)
+
+    def set_zoom(self, zoom, anchor_x=None, anchor_y=None):
+        """Zoom about a window position, keeping the point under it fixed"""
+        if self.pyramid is None:
+            # Still decoding the full-resolution source
+            return
+
+        max_zoom = MAX_SOURCE_SCALE * self.pyramid.size[0] / self.canvas_width
+        zoom = min(max(zoom, 1.0), max(max_zoom, 1.0))
+        if zoom == self.zoom:
+            return
+
+        if anchor_x is None:
+            anchor_x = self.canvas_width / 2
+            anchor_y = self.canvas_height / 2
+        point_x = self.canvas.canvasx(anchor_x) / self.content_width
+        point_y = self.canvas.canvasy(anchor_y) / self.content_height
+
+        self.zoom = zoom
+        self.canvas.config(
+            scrollregion=(0, 0, self.content_width, self.content_height)
+        )
+        self.canvas.xview_moveto(
+            (point_x * self.content_width - anchor_x) / self.content_width
+        )
+        self.canvas.yview_moveto(
+            (point_y * self.content_height - anchor_y) / self.content_height
+        )
+
+        # Every layer's geometry depends on the zoom
+        self.layers.mark_dirty()
+        self.draw_button_models()
+        self.draw_diff()
+        self.update_view()
+
+    def update_view(self):
+        """Show the fit-to-screen image at zoom 1, otherwise the visible tiles"""
+        if self.zoom == 1.0 or self.pyramid is None:
+            self.tile_layer.hide()
+            self.canvas.itemconfigure(self.image_item, state="normal")
             return
 
-        button_models = self.plist_data["buttonModels"]
-        if not isinstance(button_models, list):
+        self.canvas.itemconfigure(self.image_item, state="hidden")
+        x1 = self.canvas.canvasx(0)
+        y1 = self.canvas.canvasy(0)
+        self.tile_layer.show(
+            self.pyramid,
+            self.content_width / self.pyramid.size[0],
+            x1,
+            y1,
+            x1 + self.canvas_width,
+            y1 + self.canvas_height,
+        )
+
+    def on_mouse_wheel(self, event):
+        """Zoom with Ctrl/Cmd + wheel, otherwise scroll the zoomed view"""
+        if event.num == 4 or event.delta > 0:
+            direction = 1
+        else:
+            direction = -1
+
+        zoom_modifier = 0x0008 if sys.platform == "darwin" else 0x0004
+        if event.state & zoom_modifier:
+            factor = ZOOM_STEP if direction > 0 else 1 / ZOOM_STEP
+            self.zoom_by(factor, event.x, event.y)
             return
 
-        # Clear existing button circles and text, but preserve the background image
-        self.canvas.delete("button_circle")
-        self.canvas.delete("button_text")
-        self.button_circles = {}  # Clear existing mappings
-
-        for i, button in enumerate(button_models):
-            if not isinstance(button, dict) or "transform" not in button:
-                continue
-
-            transform = button["transform"]
-            if not isinstance(transform, dict):
-                continue
-
-            # Get transform values with defaults
-            size = transform.get("size", 5.0)
-            x_coord = transform.get("xCoord", 0.0)
-            y_coord = transform.get("yCoord", 0.0)
-
-            # Calculate circle properties
-            diameter = (size / 100) * self.canvas_width
-            radius = diameter / 2
-            center_x = x_coord * self.canvas_width
-            center_y = y_coord * self.canvas_height
-
-            # Calculate circle bounds
-            x1 = center_x - radius
-            y1 = center_y - radius
-            x2 = center_x + radius
-            y2 = center_y + radius
-
-            # Draw circle (outline only for visibility)
-            circle_id = self.canvas.create_oval(
-                x1, y1, x2, y2, outline="red", width=2, fill="", tags="button_circle"
+        if event.state & 0x0001:
+            self.canvas.xview_scroll(-direction, "units")
+        else:
+            self.canvas.yview_scroll(-direction, "units")
+        self.update_view()
+
+    def on_pan_start(self, event):
+        self.canvas.scan_mark(event.x, event.y)
+
+    def on_pan_drag(self, event):
+        self.canvas.scan_dragto(event.x, event.y, gain=1)
+        self.update_view()
+
+    @property
+    def buttons(self):
+        """The ButtonStore holding the loaded buttonModels"""
+        return self.plist_data["buttonModels"]
+
+    def draw_button_models(self):
+        """Draw the buttons and the other model arrays, one layer each"""
+        if not self.plist_data:
+            return
+
+        # Only dirty, visible layers are synced, and within a layer only
+        # items whose model changed since the last pass are touched
+        self.layers.render(self.plist_data, self.content_width, self.content_height)
+
+    def draw_diff(self):
+        """Redraw the Compare window's changes, if it is open"""
+        if self.diff_changes is not None:
+            self.diff_layer.show(
+                self.diff_changes, self.content_width, self.content_height
             )
 
-            # Draw key name if available - use original keyName from the file
-            key_name = button.get("keyName", "")
-
-            text_id = None
-            if key_name:
-                text_id = self.canvas.create_text(
-                    center_x,
-                    center_y,
-                    text=key_name,
-                    fill="red",
-                    font=("Arial", 14, "bold"),
-                    tags="button_text",
-                )
+    def refresh_button(self, index):
+        """Redraw a single button (or other model row) after its model changed"""
+        store, row, key = history.locate(self.plist_data, index)
+        layer = self.layers.layers[key]
+        if row >= len(store) or not store.is_drawable(row):
+            # The row was removed, e.g. by undoing its creation
+            if row in layer.items:
+                layer.remove(row)
+            return
 
-            # Store the mapping between circle ID and button data
-            self.button_circles[circle_id] = {
-                "button_index": i,
-                "text_id": text_id,
-                "button_data": button,
-            }
+        layer.update(
+            row,
+            store.key_name(row),
+            float(store.x[row]),
+            float(store.y[row]),
+            float(store.size[row]),
+            self.content_width,
+            self.content_height,
+        )
+
+    def edit_button(self, index, changes):
+        """Change fields of one button (or other model row), record it and redraw it"""
+        deltas = history.make_deltas(self.plist_data, index, changes)
+        if not deltas:
+            return
+
+        history.apply_deltas(self.plist_data, deltas)
+        self.record_edit(deltas)
+        self.refresh_button(index)
+
+    def add_button(self, button):
+        """Append a new button model, record it for undo and draw it"""
+        if not isinstance(self.plist_data.get("buttonModels"), model_store.ButtonStore):
+            self.plist_data["buttonModels"] = model_store.ButtonStore()
+
+        deltas = [(len(self.buttons), history.INSERT, None, button)]
+
+        history.apply_deltas(self.plist_data, deltas)
+        self.record_edit(deltas)
+        self.refresh_button(len(self.buttons) - 1)
+
+    def record_edit(self, deltas, group=None):
+        """Remember an applied edit for undo and crash recovery"""
+        self.edit_serial += 1
+        self.history.record(deltas, group)
+        if self.journal is not None:
+            self.journal.append(self.plist_data, deltas)
+
+    def bind_undo_keys(self, window):
+        modifier = "Command" if sys.platform == "darwin" else "Control"
+        window.bind(f"<{modifier}-z>", lambda e: self.undo())
+        window.bind(f"<{modifier}-Z>", lambda e: self.redo())
+        window.bind(f"<{modifier}-y>", lambda e: self.redo())
+
+    def undo(self):
+        """Revert the latest edit"""
+        deltas = self.history.undo()
+        if deltas:
+            self.apply_history_entry(deltas, undo=True)
+
+    def redo(self):
+        """Re-apply the latest undone edit"""
+        deltas = self.history.redo()
+        if deltas:
+            self.apply_history_entry(deltas, undo=False)
+
+    def apply_history_entry(self, deltas, undo):
+        # Only the rows named in the entry are redrawn
+        touched = history.apply_deltas(self.plist_data, deltas, undo)
+        self.edit_serial += 1
+        if self.journal is not None:
+            self.journal.append(self.plist_data, deltas, undo)
+        for index in touched:
+            self.refresh_button(index)
+
+    def toggle_layer(self, key):
+        """Apply a layer's visibility checkbox, catching the layer up if it was dirty"""
+        self.layers.set_visible(
+            key,
+            self.layer_visible[key].get(),
+            self.plist_data,
+            self.content_width,
+            self.content_height,
+        )
+
+    def find_button_at(self, x, y):
+        """Return the circle ID of the button at (x, y), or None"""
+        return self.button_layer.hit(x, y)
 
     def on_click(self, event):
         """Handle mouse click events"""
-        # Find the closest item to the click
-        item = self.canvas.find_closest(event.x, event.y)[0]
+        x, y = self.event_position(event)
+        item = self.find_button_at(x, y)
+        additive = bool(event.state & SHIFT_MASK)
+
+        if item is None:
+            model = self.layers.hit(x, y, MODEL_HIT_ORDER)
+            if model is not None:
+                # Joysticks, mouse areas and draggable buttons move one at a time
+                key, row = model
+                store = self.plist_data[key]
+                self.dragging_model = model
+                self.drag_start_x = x
+                self.drag_start_y = y
+                self.drag_anchor = (float(store.x[row]), float(store.y[row]))
+                self.drag_offset = (0.0, 0.0)
+                return
+
+            # Start a rubber-band selection on empty canvas
+            if not additive:
+                self.button_layer.set_selection(())
+            self.rubber_band_start = (x, y)
+            self.rubber_band = self.canvas.create_rectangle(
+                x, y, x, y, outline=canvas_layers.SELECTED_COLOR, dash=(4, 2)
+            )
+            return
 
-        # Get tags safely
-        tags = self.canvas.gettags(item)
+        button_index = self.button_circles[item]["button_index"]
+        selection = self.button_layer.selected
+        if additive:
+            # Shift-click toggles a button in or out of the selection
+            selection = selection ^ {button_index}
+            self.button_layer.set_selection(selection)
+            if button_index not in selection:
+                return
+        elif button_index not in selection:
+            self.button_layer.set_selection({button_index})
+
+        # Dragging any selected button moves the whole selection
+        self.dragging_item = item
+        self.drag_start_x = x
+        self.drag_start_y = y
+        self.drag_anchor = (
+            float(self.buttons.x[button_index]),
+            float(self.buttons.y[button_index]),
+        )
+        self.drag_offset = (0.0, 0.0)
 
-        # Check if it's a button circle or text
-        if item in self.button_circles or (
-            tags and tags[0] in ["button_circle", "button_text"]
-        ):
-            # If it's text, find the corresponding circle
-            if tags and tags[0] == "button_text":
-                # Find the circle that corresponds to this text
-                for circle_id, data in self.button_circles.items():
-                    if data["text_id"] == item:
-                        item = circle_id
-                        break
-
-            if item in self.button_circles:
-                self.dragging_item = item
-                self.drag_start_x = event.x
-                self.drag_start_y = event.y
+    def on_motion(self, event):
+        """Highlight the button under the pointer"""
+        self.button_layer.set_hover(self.find_button_at(*self.event_position(event)))
 
     def on_drag(self, event):
         """Handle mouse drag events"""
-        if self.dragging_item:
-            # Calculate the offset
-            dx = event.x - self.drag_start_x
-            dy = event.y - self.drag_start_y
+        # Motion can arrive far faster than the screen refreshes; keep only
+        # the latest position and apply it once per frame
+        self.drag_pointer = self.event_position(event)
+        if self.drag_frame is None:
+            self.drag_frame = self.root.after(FRAME_INTERVAL, self.flush_drag)
+
+    def flush_drag(self):
+        """Apply the latest pointer position to the rubber band or the selection"""
+        self.drag_frame = None
+        if self.drag_pointer is None:
+            return
+        x, y = self.drag_pointer
+        self.drag_pointer = None
+
+        if self.rubber_band is not None:
+            self.canvas.coords(self.rubber_band, *self.rubber_band_start, x, y)
+        elif self.dragging_item or self.dragging_model:
+            # The offset is measured from the press in model space, so
+            # snapping never accumulates rounding from earlier frames
+            dx = (x - self.drag_start_x) / self.content_width
+            dy = (y - self.drag_start_y) / self.content_height
+            step = SNAP_STEPS[self.snap_choice.get()]
+            if step:
+                anchor_x, anchor_y = self.drag_anchor
+                dx = transforms.snap(anchor_x + dx, step) - anchor_x
+                dy = transforms.snap(anchor_y + dy, step) - anchor_y
+
+            drawn_x, drawn_y = self.drag_offset
+            if self.dragging_model is not None:
+                key, row = self.dragging_model
+                self.layers.layers[key].shift(
+                    row,
+                    (dx - drawn_x) * self.content_width,
+                    (dy - drawn_y) * self.content_height,
+                )
+                self.drag_offset = (dx, dy)
+            elif dx != drawn_x or dy != drawn_y:
+                # Move every selected circle and label with one canvas call
+                self.button_layer.shift_selection(
+                    (dx - drawn_x) * self.content_width,
+                    (dy - drawn_y) * self.content_height,
+                )
+                self.drag_offset = (dx, dy)
+                # Highlight buttons the selection now overlaps
+                self.button_layer.drag_selection(
+                    dx * self.content_width, dy * self.content_height
+                )
 
-            # Move the circle
-            self.canvas.move(self.dragging_item, dx, dy)
+    def on_release(self, event):
+        """Handle mouse release events"""
+        # Apply the final position even if its frame hasn't fired yet
+        if self.drag_frame is not None:
+            self.root.after_cancel(self.drag_frame)
+        self.drag_pointer = self.event_position(event)
+        self.flush_drag()
+
+        if self.rubber_band is not None:
+            x, y = self.event_position(event)
+            self.canvas.delete(self.rubber_band)
+            self.rubber_band = None
+
+            selection = set(self.button_layer.in_rect(*self.rubber_band_start, x, y))
+            if event.state & SHIFT_MASK:
+                selection |= self.button_layer.selected
+            self.button_layer.set_selection(selection)
+        elif self.dragging_item:
+            dx, dy = self.drag_offset
+            if dx or dy:
+                # The items are already in place; update the model in one
+                # batch, recorded as a single undo step
+                snapped = SNAP_STEPS[self.snap_choice.get()] is not None
+                self.move_selection(
+                    dx,
+                    dy,
+                    drawn=True,
+                    decimals=transforms.SNAP_DECIMALS if snapped else None,
+                )
+            self.button_layer.clear_conflicts()
+            self.dragging_item = None
+        elif self.dragging_model is not None:
+            dx, dy = self.drag_offset
+            if dx or dy:
+                anchor_x, anchor_y = self.drag_anchor
+                x_coord = anchor_x + dx
+                y_coord = anchor_y + dy
+                if SNAP_STEPS[self.snap_choice.get()] is not None:
+                    x_coord = round(x_coord, transforms.SNAP_DECIMALS)
+                    y_coord = round(y_coord, transforms.SNAP_DECIMALS)
+                self.edit_button(
+                    history.label(*self.dragging_model),
+                    {"xCoord": x_coord, "yCoord": y_coord},
+                )
+            self.dragging_model = None
+
+    def selected_indices(self):
+        return sorted(self.button_layer.selected)
+
+    def edit_buttons(self, indices, columns, group=None, redraw=True):
+        """Write transform columns back to several buttons as one undo step"""
+        deltas = []
+        for k, button_index in enumerate(indices):
+            changes = {field: float(values[k]) for field, values in columns.items()}
+            deltas.extend(history.make_deltas(self.plist_data, button_index, changes))
+        if not deltas:
+            return
 
-            # Move the corresponding text if it exists
-            circle_data = self.button_circles[self.dragging_item]
-            if circle_data["text_id"]:
-                self.canvas.move(circle_data["text_id"], dx, dy)
+        history.apply_deltas(self.plist_data, deltas)
+        self.record_edit(deltas, group)
+        if redraw:
+            for button_index in indices:
+                self.refresh_button(button_index)
+
+    def adopt_selection(self, indices):
+        """Sync layer bookkeeping after the selection was changed by a tag operation"""
+        buttons = self.buttons
+        for button_index in indices:
+            self.button_layer.adopt(
+                button_index,
+                buttons.key_name(button_index),
+                float(buttons.x[button_index]),
+                float(buttons.y[button_index]),
+                float(buttons.size[button_index]),
+                self.content_width,
+                self.content_height,
+            )
 
-            # Update the drag start position
-            self.drag_start_x = event.x
-            self.drag_start_y = event.y
+    def move_selection(self, dx, dy, drawn=False, group=None, decimals=None):
+        """Move the selected buttons by (dx, dy) in normalized units"""
+        indices = self.selected_indices()
+        if not indices:
+            return
 
-    def on_release(self, event):
-        """Handle mouse release events"""
-        if self.dragging_item:
-            # Update the button data with new coordinates
-            circle_data = self.button_circles[self.dragging_item]
-
-            # Get the current position of the circle
-            coords = self.canvas.coords(self.dragging_item)
-            center_x = (coords[0] + coords[2]) / 2
-            center_y = (coords[1] + coords[3]) / 2
-
-            # Convert back to normalized coordinates
-            new_x_coord = center_x / self.canvas_width
-            new_y_coord = center_y / self.canvas_height
-
-            # Update the button data
-            button_index = circle_data["button_index"]
-            self.plist_data["buttonModels"][button_index]["transform"][
-                "xCoord"
-            ] = new_x_coord
-            self.plist_data["buttonModels"][button_index]["transform"][
-                "yCoord"
-            ] = new_y_coord
+        columns = self.buttons.gather(indices)
+        moved = transforms.move(columns, dx, dy, decimals)
+        self.edit_buttons(indices, moved, group, redraw=False)
+        if not drawn:
+            self.button_layer.shift_selection(
+                dx * self.content_width, dy * self.content_height
+            )
+        self.adopt_selection(indices)
 
-            self.dragging_item = None
+    def scale_selection(self, factor):
+        """Scale the selected buttons' positions and sizes about their centre"""
+        indices = self.selected_indices()
+        if not indices:
+            return
+
+        columns = self.buttons.gather(indices)
+        scaled = transforms.scale(columns, factor)
+
+        # One canvas.scale call suffices unless sizes hit the 1-20 limits
+        clamped = not np.allclose(scaled["size"], columns["size"] * factor)
+        self.edit_buttons(indices, scaled, redraw=clamped)
+        if not clamped:
+            self.button_layer.scale_selection(
+                float(columns["xCoord"].mean()) * self.content_width,
+                float(columns["yCoord"].mean()) * self.content_height,
+                factor,
+            )
+            self.adopt_selection(indices)
+
+    def arrange_selection(self, operation, *args):
+        """Apply one of the transforms module operations to the selection"""
+        indices = self.selected_indices()
+        if not indices:
+            return
+
+        columns = self.buttons.gather(indices)
+        self.edit_buttons(indices, operation(columns, *args))
 
     def create_save_window(self, filename):
         """Create a simple save window with save and add button"""
+        # Replace the controls of a previously opened keymap
+        if self.save_window is not None and self.save_window.winfo_exists():
+            self.save_window.destroy()
+
         # Create a new window for the controls
         self.save_window = tk.Toplevel(self.root)
         self.save_window.title("Controls")
-        self.save_window.geometry("150x200")
+        self.save_window.geometry("150x610")
         self.save_window.resizable(False, False)
 
         # Bind close event to exit program
         self.save_window.protocol("WM_DELETE_WINDOW", self.on_save_window_close)
+        self.bind_undo_keys(self.save_window)
 
         # Create a frame for the content
         content_frame = tk.Frame(self.save_window)
@@ -443,6 +843,58 @@ class ImageViewer:
         )
         add_button.pack(pady=(0, 10))
 
+        # Add "Arrange" button for bulk operations on the selection
+        arrange_button = tk.Button(
+            content_frame,
+            text="Arrange",
+            font=("Arial", 10, "bold"),
+            bg="#607D8B",
+            fg="white",
+            padx=20,
+            pady=8,
+            command=self.open_arrange_window,
+        )
+        arrange_button.pack(pady=(0, 10))
+
+        # Add "Lint" button to check the keymap for problems
+        lint_button = tk.Button(
+            content_frame,
+            text="Lint",
+            font=("Arial", 10, "bold"),
+            bg="#9C27B0",
+            fg="white",
+            padx=20,
+            pady=8,
+            command=self.open_lint_window,
+        )
+        lint_button.pack(pady=(0, 10))
+
+        # Add "Library" button to browse indexed keymap folders
+        library_button = tk.Button(
+            content_frame,
+            text="Library",
+            font=("Arial", 10, "bold"),
+            bg="#795548",
+            fg="white",
+            padx=20,
+            pady=8,
+            command=self.open_library_window,
+        )
+        library_button.pack(pady=(0, 10))
+
+        # Add "Compare" button to show changes against another keymap
+        compare_button = tk.Button(
+            content_frame,
+            text="Compare",
+            font=("Arial", 10, "bold"),
+            bg="#009688",
+            fg="white",
+            padx=20,
+            pady=8,
+            command=self.open_compare_window,
+        )
+        compare_button.pack(pady=(0, 10))
+
         # Add save button
         save_button = tk.Button(
             content_frame,
@@ -456,6 +908,47 @@ class ImageViewer:
         )
         save_button.pack()
 
+        # Opt-in binary plist output
+        binary_check = tk.Checkbutton(
+            content_frame,
+            text="Binary plist",
+            font=("Arial", 10),
+            variable=self.binary_plist,
+        )
+        binary_check.pack(pady=(5, 0))
+
+        # Snapping for dragged buttons
+        snap_frame = tk.Frame(content_frame)
+        snap_frame.pack(pady=(5, 0))
+        tk.Label(snap_frame, text="Snap:", font=("Arial", 10)).pack(side=tk.LEFT)
+        snap_menu = tk.OptionMenu(snap_frame, self.snap_choice, *SNAP_STEPS)
+        snap_menu.config(font=("Arial", 10))
+        snap_menu.pack(side=tk.LEFT)
+
+        # Show or hide each model layer
+        layers_frame = tk.Frame(content_frame)
+        layers_frame.pack(pady=(5, 0), anchor="w")
+        labels = [("buttonModels", "Buttons")]
+        labels += [(key, label) for key, label, *_ in reversed(MODEL_LAYERS)]
+        for key, label in labels:
+            tk.Checkbutton(
+                layers_frame,
+                text=label,
+                font=("Arial", 9),
+                variable=self.layer_visible[key],
+                command=functools.partial(self.toggle_layer, key),
+            ).pack(anchor="w")
+
+        # Latest notice, e.g. a keymap reloaded from disk
+        tk.Label(
+            content_frame,
+            textvariable=self.status,
+            font=("Arial", 9),
+            fg="#616161",
+            wraplength=120,
+            justify=tk.LEFT,
+        ).pack(pady=(5, 0), anchor="w")
+
         # Update window title
         filename_only = os.path.basename(filename)
         file_ext = os.path.splitext(filename)[1].lower()
@@ -466,6 +959,508 @@ class ImageViewer:
         else:
             self.save_window.title(f"Controls - {filename_only}")
 
+    def open_arrange_window(self):
+        """Open a window with align, distribute and size operations"""
+        arrange_window = tk.Toplevel(self.root)
+        arrange_window.title("Arrange Selection")
+        arrange_window.resizable(False, False)
+        arrange_window.transient(self.root)
+
+        frame = tk.Frame(arrange_window)
+        frame.pack(fill=tk.BOTH, expand=True, padx=15, pady=15)
+
+        tk.Label(
+            frame,
+            text="Shift-click or drag a rectangle to select buttons",
+            font=("Arial", 10),
+        ).grid(row=0, column=0, columnspan=3, pady=(0, 10))
+
+        aspect = self.canvas_width / self.canvas_height
+        operations = [
+            ("Align Left", transforms.align, "left", aspect),
+            ("Align Center", transforms.align, "center", aspect),
+            ("Align Right", transforms.align, "right", aspect),
+            ("Align Top", transforms.align, "top", aspect),
+            ("Align Middle", transforms.align, "middle", aspect),
+            ("Align Bottom", transforms.align, "bottom", aspect),
+            ("Distribute H", transforms.distribute, "x"),
+            ("Distribute V", transforms.distribute, "y"),
+        ]
+        for position, (label, operation, *args) in enumerate(operations):
+            tk.Button(
+                frame,
+                text=label,
+                font=("Arial", 10),
+                width=12,
+                command=functools.partial(self.arrange_selection, operation, *args),
+            ).grid(row=1 + position // 3, column=position % 3, padx=2, pady=2)
+
+        def ask_size():
+            size = simpledialog.askfloat(
+                "Set Size",
+                "Enter button size (1-20):",
+                parent=arrange_window,
+                minvalue=keymap.MIN_BUTTON_SIZE,
+                maxvalue=keymap.MAX_BUTTON_SIZE,
+            )
+            if size is not None:
+                self.arrange_selection(transforms.set_size, size)
+
+        def ask_scale():
+            factor = simpledialog.askfloat(
+                "Scale",
+                "Scale factor (e.g. 1.1):",
+                parent=arrange_window,
+                minvalue=0.01,
+            )
+            if factor is not None:
+                self.scale_selection(factor)
+
+        tk.Button(
+            frame, text="Set Size...", font=("Arial", 10), width=12, command=ask_size
+        ).grid(row=3, column=2, padx=2, pady=2)
+        tk.Button(
+            frame, text="Scale...", font=("Arial", 10), width=12, command=ask_scale
+        ).grid(row=4, column=0, padx=2, pady=2)
+
+    def open_lint_window(self):
+        """List lint diagnostics; selecting one selects the buttons involved"""
+        lint_window = tk.Toplevel(self.root)
+        lint_window.title("Lint")
+        lint_window.geometry("520x300")
+        lint_window.transient(self.root)
+
+        frame = tk.Frame(lint_window)
+        frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+        summary_label = tk.Label(frame, font=("Arial", 10, "bold"), anchor="w")
+        summary_label.pack(fill=tk.X, pady=(0, 5))
+
+        list_frame = tk.Frame(frame)
+        list_frame.pack(fill=tk.BOTH, expand=True)
+        scrollbar = tk.Scrollbar(list_frame)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        listbox = tk.Listbox(
+            list_frame, font=("Arial", 10), yscrollcommand=scrollbar.set
+        )
+        listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.config(command=listbox.yview)
+
+        diagnostics = []
+
+        def refresh():
+            diagnostics[:] = lint.lint_keymap(
+                self.plist_data, self.canvas_width / self.canvas_height
+            )
+            listbox.delete(0, tk.END)
+            for diagnostic in diagnostics:
+                listbox.insert(tk.END, lint.format_diagnostic(diagnostic))
+                if diagnostic.severity == lint.ERROR:
+                    listbox.itemconfigure(tk.END, fg="red")
+
+            errors = sum(d.severity == lint.ERROR for d in diagnostics)
+            warnings = len(diagnostics) - errors
+            if diagnostics:
+                summary_label.config(text=f"{errors} errors, {warnings} warnings")
+            else:
+                summary_label.config(text="No problems found")
+
+        def on_select(event):
+            selection = listbox.curselection()
+            if not selection:
+                return
+            indices = diagnostics[selection[0]].indices
+            self.button_layer.set_selection(
+                i for i in indices if i in self.button_layer.items
+            )
+
+        listbox.bind("<<ListboxSelect>>", on_select)
+        tk.Button(frame, text="Refresh", font=("Arial", 10), command=refresh).pack(
+            pady=(5, 0)
+        )
+        refresh()
+
+    def open_compare_window(self):
+        """Diff another keymap against the open one, listing and drawing the changes"""
+        other_filename = filedialog.askopenfilename(
+            title="Compare with keymap",
+            filetypes=[
+                ("Keymap files", "*.playmap *.plist *.json"),
+                ("All files", "*.*"),
+            ],
+        )
+        if not other_filename:
+            return
+        try:
+            other = keymap.load_keymap(other_filename)
+            if not isinstance(other, dict):
+                raise Exception("Top level object is not a dictionary")
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to load keymap:\n{str(e)}")
+            return
+
+        if self.compare_window is not None and self.compare_window.winfo_exists():
+            self.compare_window.destroy()
+        compare_window = tk.Toplevel(self.root)
+        compare_window.title(f"Compare - {os.path.basename(other_filename)}")
+        compare_window.geometry("520x300")
+        compare_window.transient(self.root)
+        self.compare_window = compare_window
+
+        frame = tk.Frame(compare_window)
+        frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+        summary_label = tk.Label(frame, font=("Arial", 10, "bold"), anchor="w")
+        summary_label.pack(fill=tk.X, pady=(0, 5))
+
+        list_frame = tk.Frame(frame)
+        list_frame.pack(fill=tk.BOTH, expand=True)
+        scrollbar = tk.Scrollbar(list_frame)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        listbox = tk.Listbox(
+            list_frame, font=("Arial", 10), yscrollcommand=scrollbar.set
+        )
+        listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.config(command=listbox.yview)
+
+        changes = []
+
+        def refresh():
+            # The other keymap is the old side, so changes read as edits made here
+            changes[:] = merge.diff_keymaps(
+                other, self.plist_data, self.canvas_width / self.canvas_height
+            )
+            listbox.delete(0, tk.END)
+            for change in changes:
+                listbox.insert(tk.END, merge.format_change(change))
+                if change.kind == "added":
+                    listbox.itemconfigure(tk.END, fg="#2E7D32")
+                elif change.kind == "removed":
+                    listbox.itemconfigure(tk.END, fg="#757575")
+            self.diff_changes = changes
+            self.draw_diff()
+
+            if changes:
+                summary_label.config(
+                    text=f"{len(changes)} changes since "
+                    f"{os.path.basename(other_filename)}"
+                )
+            else:
+                summary_label.config(text="No differences")
+
+        def on_select(event):
+            selection = listbox.curselection()
+            if not selection:
+                return
+            change = changes[selection[0]]
+            if change.key == "buttonModels" and change.new_row is not None:
+                self.button_layer.set_selection(
+                    i for i in (change.new_row,) if i in self.button_layer.items
+                )
+
+        def on_close():
+            self.diff_changes = None
+            self.diff_layer.clear()
+            compare_window.destroy()
+
+        compare_window.protocol("WM_DELETE_WINDOW", on_close)
+        listbox.bind("<<ListboxSelect>>", on_select)
+        tk.Button(frame, text="Refresh", font=("Arial", 10), command=refresh).pack(
+            pady=(5, 0)
+        )
+        refresh()
+
+    def open_library_window(self):
+        """Search indexed keymap folders; double-click opens a keymap and its screenshot
+
+        The cached index is listed straight away while the folders are
+        rescanned in the background. The selected keymap is previewed over
+        its screenshot from the thumbnail cache.
+        """
+        if self.library_window is not None and self.library_window.winfo_exists():
+            self.library_window.lift()
+            return
+        if self.library is None:
+            self.library = library.Library()
+
+        library_window = self.library_window = tk.Toplevel(self.root)
+        library_window.title("Library")
+        library_window.geometry("820x420")
+
+        frame = tk.Frame(library_window)
+        frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+        search_frame = tk.Frame(frame)
+        search_frame.pack(fill=tk.X, pady=(0, 5))
+        tk.Label(search_frame, text="Search:", font=("Arial", 10)).pack(side=tk.LEFT)
+        query = tk.StringVar(master=library_window)
+        search_entry = tk.Entry(search_frame, textvariable=query, font=("Arial", 10))
+        search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+
+        status_label = tk.Label(
+            frame,
+            font=("Arial", 9),
+            anchor="w",
+            text=f"Game name, or {library.KEY_PREFIX}NAME for a bound key",
+        )
+        status_label.pack(fill=tk.X)
+
+        body = tk.Frame(frame)
+        body.pack(fill=tk.BOTH, expand=True)
+
+        # Screenshot of the selected keymap with its buttons drawn over it
+        thumbnail_width, thumbnail_height = thumbnails.THUMBNAIL_SIZE
+        preview_frame = tk.Frame(
+            body, width=thumbnail_width, height=thumbnail_height
+        )
+        preview_frame.pack(side=tk.RIGHT, anchor="n", padx=(10, 0))
+        preview_frame.pack_propagate(False)
+        preview_label = tk.Label(
+            preview_frame, font=("Arial", 9), wraplength=thumbnail_width
+        )
+        preview_label.pack(fill=tk.BOTH, expand=True)
+
+        list_frame = tk.Frame(body)
+        list_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar = tk.Scrollbar(list_frame)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        listbox = tk.Listbox(
+            list_frame, font=("Arial", 10), yscrollcommand=scrollbar.set
+        )
+        listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.config(command=listbox.yview)
+
+        entries = []
+        # Resolved here so lazily imported modules load on the Tk thread
+        render_thumbnails = thumbnails.render_thumbnails
+        previewed = [None]
+
+        def prefetch_thumbnails():
+            running = self.thumbnail_prefetch
+            if running is not None and not running.done():
+                return
+            pairs = [
+                (entry.screenshot, entry.path)
+                for entry in entries[:PREFETCH_THUMBNAILS]
+                if entry.screenshot and entry.error is None
+            ]
+            if pairs:
+                # Renders on a process pool; the results only fill the cache
+                self.thumbnail_prefetch = self.library_tasks.run(
+                    lambda: list(render_thumbnails(pairs))
+                )
+
+        def show_preview(event=None):
+            selection = listbox.curselection()
+            if not selection:
+                return
+            entry = entries[selection[0]]
+            if not entry.screenshot or entry.error is not None:
+                previewed[0] = None
+                preview_label.config(image="", text="No screenshot")
+                return
+
+            pair = previewed[0] = (entry.screenshot, entry.path)
+
+            def on_rendered(result):
+                _, _, path, error = result
+                if previewed[0] != pair or not library_window.winfo_exists():
+                    return
+                if error is not None:
+                    preview_label.config(image="", text=f"No preview:\n{error}")
+                    return
+                # The reference must be kept alive
+                preview_label.photo = ImageTk.PhotoImage(file=path)
+                preview_label.config(image=preview_label.photo, text="")
+
+            self.background.run(
+                lambda: next(render_thumbnails([pair], jobs=1)), on_success=on_rendered
+            )
+
+        def refresh(*_):
+            entries[:] = self.library.search(query.get())
+            listbox.delete(0, tk.END)
+            for entry in entries:
+                if entry.error is not None:
+                    listbox.insert(tk.END, f"{entry.name}  (unreadable: {entry.error})")
+                    listbox.itemconfigure(tk.END, fg="red")
+                    continue
+                screenshot = "" if entry.screenshot else "  [no screenshot]"
+                listbox.insert(
+                    tk.END, f"{entry.name}  ({entry.button_count} buttons){screenshot}"
+                )
+
+        def on_scanned(results):
+            if not library_window.winfo_exists():
+                return
+            total = sum(result.added + result.updated for result in results)
+            removed = sum(result.removed for result in results)
+            status_label.config(text=f"{total} keymaps indexed, {removed} removed")
+            refresh()
+            prefetch_thumbnails()
+
+        def on_scan_failed(error):
+            if library_window.winfo_exists():
+                status_label.config(text=f"Scan failed: {error}")
+
+        # A scan outlives the window that started it; the one open when it
+        # ends reports it
+        self.library_scan_callbacks = (on_scanned, on_scan_failed)
+
+        def scanning():
+            return self.library_scan is not None and not self.library_scan.done()
+
+        def scan(folder=None):
+            """Index a new folder, or rescan every folder if None"""
+            if scanning():
+                status_label.config(text="Already scanning...")
+                return
+            status_label.config(text="Scanning...")
+            database = self.library.path
+
+            def rescan():
+                # Runs on a worker thread, which needs its own connection
+                with library.Library(database) as worker_library:
+                    mapper = library.process_map()
+                    if folder is not None:
+                        return [worker_library.scan(folder, mapper)]
+                    results = worker_library.rescan(mapper).values()
+                    return [result for result in results if result is not None]
+
+            self.library_scan = self.library_tasks.run(
+                rescan,
+                on_success=lambda results: self.library_scan_callbacks[0](results),
+                on_error=lambda error: self.library_scan_callbacks[1](error),
+            )
+
+        def add_folder():
+            folder = filedialog.askdirectory(
+                parent=library_window, title="Add a folder of keymaps"
+            )
+            if folder:
+                scan(os.path.abspath(folder))
+
+        def remove_folder():
+            """Drop the indexed folder holding the selected keymap"""
+            selection = listbox.curselection()
+            if not selection:
+                messagebox.showinfo(
+                    "Remove Folder",
+                    "Select a keymap from the folder to remove.",
+                    parent=library_window,
+                )
+                return
+            path = entries[selection[0]].path
+            # The deepest folder holding it is the one it's indexed under
+            roots = [
+                root
+                for root in self.library.roots()
+                if path.startswith(os.path.join(root, ""))
+            ]
+            if not roots:
+                return
+            root = max(roots, key=len)
+            if not messagebox.askyesno(
+                "Remove Folder",
+                f"Remove {root} and its keymaps from the library?\n"
+                "The files themselves are not deleted.",
+                parent=library_window,
+            ):
+                return
+            self.library.remove_root(root)
+            status_label.config(text=f"Removed {root}")
+            refresh()
+
+        def open_selected(event=None):
+            selection = listbox.curselection()
+            if not selection:
+                return
+            entry = entries[selection[0]]
+            if entry.error is not None:
+                messagebox.showerror(
+                    "Error", f"Failed to load keymap:\n{entry.error}", parent=library_window
+                )
+                return
+            # Without a screenshot of its own the keymap opens over the current one
+            image_filename = entry.screenshot or self.image_filename
+            try:
+                self.load_files(image_filename, entry.path)
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to load files:\n{str(e)}")
+
+        query.trace_add("write", refresh)
+        listbox.bind("<<ListboxSelect>>", show_preview)
+        listbox.bind("<Double-Button-1>", open_selected)
+        listbox.bind("<Return>", open_selected)
+
+        buttons_frame = tk.Frame(frame)
+        buttons_frame.pack(pady=(5, 0))
+        tk.Button(
+            buttons_frame, text="Add Folder...", font=("Arial", 10), command=add_folder
+        ).pack(side=tk.LEFT, padx=2)
+        tk.Button(
+            buttons_frame,
+            text="Remove Folder",
+            font=("Arial", 10),
+            command=remove_folder,
+        ).pack(side=tk.LEFT, padx=2)
+        tk.Button(
+            buttons_frame, text="Rescan", font=("Arial", 10), command=scan
+        ).pack(side=tk.LEFT, padx=2)
+        tk.Button(
+            buttons_frame, text="Open", font=("Arial", 10), command=open_selected
+        ).pack(side=tk.LEFT, padx=2)
+
+        refresh()
+        search_entry.focus_set()
+        if scanning():
+            status_label.config(text="Scanning...")
+        elif self.library.roots():
+            scan()
+        else:
+            prefetch_thumbnails()
+
+    def open_profile_window(self):
+        """Live table of hot-path latencies, refreshed while the window is open"""
+        if self.profile_window is not None and self.profile_window.winfo_exists():
+            self.profile_window.lift()
+            return
+
+        profile_window = self.profile_window = tk.Toplevel(self.root)
+        profile_window.title("Profile")
+        profile_window.geometry("640x300")
+
+        text = tk.Text(profile_window, font=("Courier", 10), wrap=tk.NONE)
+        text.pack(fill=tk.BOTH, expand=True, padx=10, pady=(10, 5))
+
+        def save_report():
+            filename = filedialog.asksaveasfilename(
+                parent=profile_window,
+                title="Save profile",
+                defaultextension=".json",
+                filetypes=[("JSON files", "*.json"), ("All files", "*.*")],
+            )
+            if filename:
+                try:
+                    self.profiler.dump(filename)
+                except OSError as e:
+                    messagebox.showerror("Error", f"Failed to save profile:\n{str(e)}")
+
+        tk.Button(
+            profile_window, text="Save JSON...", font=("Arial", 10), command=save_report
+        ).pack(pady=(0, 10))
+
+        def refresh():
+            if not profile_window.winfo_exists():
+                return
+            text.config(state=tk.NORMAL)
+            text.delete("1.0", tk.END)
+            text.insert("1.0", self.profiler.format_table())
+            text.config(state=tk.DISABLED)
+            profile_window.after(PROFILE_REFRESH, refresh)
+
+        refresh()
+
     def change_image(self):
         """Allow user to select and load a new image"""
         # Define image file types
@@ -580,11 +1575,18 @@ class ImageViewer:
         """Capture the pressed key"""
         self.captured_key = event.keysym
 
-        # Convert to PlayCover keycode using our mapping
-        key_name = self.captured_key
-        self.captured_key_code = KeyToCode.get(key_name, event.keycode)
+        # Convert the Tk keysym to a PlayCover (HID usage) keycode
+        self.captured_key_code = keycodes.keysym_code(event.keysym)
+        if self.captured_key_code is None:
+            # X11 keycodes aren't HID usages, so unknown keys can't be bound
+            self.key_display_label.config(
+                text=f"{event.keysym} is not supported by PlayCover", fg="red"
+            )
+            self.ok_button.config(state="disabled")
+            return
 
         # Update display
+        key_name = keycodes.key_name(self.captured_key_code)
         self.key_display_label.config(
             text=f"Captured: {key_name} (Code: {self.captured_key_code})", fg="green"
         )
@@ -597,16 +1599,8 @@ class ImageViewer:
         if not self.captured_key or self.captured_key_code is None:
             return
 
-        # Convert keysym to original PlayCover key name using KeyNameDiffrences
-        if self.captured_key in KeyNameDifferences:
-            key_name = KeyNameDifferences[self.captured_key]
-        else:
-            # Fallback to captured key name
-            key_name = (
-                self.captured_key.upper()
-                if len(self.captured_key) == 1
-                else self.captured_key
-            )
+        # PlayCover names keys by code, as in KeyCodeNames.swift
+        key_name = keycodes.key_name(self.captured_key_code)
 
         # Create new button data with PlayCover-compatible keycode
         new_button = {
@@ -615,14 +1609,8 @@ class ImageViewer:
             "transform": {"size": 5.0, "xCoord": 0.5, "yCoord": 0.5},
         }
 
-        # Add to buttonModels
-        if "buttonModels" not in self.plist_data:
-            self.plist_data["buttonModels"] = []
-
-        self.plist_data["buttonModels"].append(new_button)
-
-        # Redraw all circles to include the new one
-        self.draw_button_models()
+        # Add to buttonModels and draw only the new circle
+        self.add_button(new_button)
 
         # Close dialog
         dialog.destroy()
@@ -658,82 +1646,346 @@ class ImageViewer:
             initialfile=os.path.basename(original_filename),
         )
 
-        if save_filename:
-            try:
-                save_ext = os.path.splitext(save_filename)[1].lower()
+        if not save_filename:
+            return
 
-                if save_ext in [".plist", ".playmap"]:
-                    # Save as plist
-                    with open(save_filename, "wb") as plist_file:
-                        plistlib.dump(self.plist_data, plist_file)
+        # Serialize a snapshot on a worker thread so editing can continue
+        snapshot = model_store.plain_keymap(self.plist_data)
+        serial = self.edit_serial
+        keymap_filename = self.keymap_filename
+
+        def on_saved(_):
+            # Our own write is the new base, not a change to merge
+            if keymap_filename is not None and os.path.abspath(
+                save_filename
+            ) == os.path.abspath(keymap_filename):
+                self.disk_data = dict(snapshot)
+                if self.watcher is not None:
+                    self.watcher.acknowledge(save_filename)
+
+            # Everything journaled up to the snapshot is now on disk
+            if self.journal is not None:
+                if serial == self.edit_serial:
+                    self.journal.discard()
                 else:
-                    # Save as JSON
-                    with open(save_filename, "w", encoding="utf-8") as json_file:
-                        json.dump(self.plist_data, json_file, indent=2, default=str)
+                    self.journal.compact(self.plist_data)
 
-                messagebox.showinfo(
-                    "Success", f"File saved successfully to:\n{save_filename}"
-                )
+            messagebox.showinfo(
+                "Success", f"File saved successfully to:\n{save_filename}"
+            )
 
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to save file:\n{str(e)}")
+        def on_failed(error):
+            messagebox.showerror("Error", f"Failed to save file:\n{str(error)}")
+
+        # Plist or JSON is picked from the chosen extension
+        self.background.run(
+            keymap.save_keymap,
+            snapshot,
+            save_filename,
+            self.binary_plist.get(),
+            on_success=on_saved,
+            on_error=on_failed,
+        )
 
     def load_plist(self, filename):
         """Load and parse a plist file"""
-        try:
-            with open(filename, "rb") as plist_file:
-                self.plist_data = plistlib.load(plist_file)
-
-            # Create save window instead of data viewer
-            self.create_save_window(filename)
-            self.plist_name = filename
-            return self.plist_data
-
-        except Exception as e:
-            raise Exception(f"Failed to parse plist file: {str(e)}")
+        disk_data = keymap.load_plist(filename)
+        data = model_store.store_keymap(dict(disk_data))
+        return self.open_keymap(filename, data, disk_data)
 
     def load_json(self, filename):
         """Load and parse a JSON file"""
+        disk_data = keymap.load_json(filename)
+        data = model_store.store_keymap(dict(disk_data))
+        return self.open_keymap(filename, data, disk_data)
+
+    def open_keymap(self, filename, data, disk_data=None):
+        """Start editing keymap data already parsed from filename
+
+        disk_data is the file's content with plain lists, kept as the base
+        for merging in changes made to the file by other programs.
+        """
+        if disk_data is None:
+            disk_data = dict(model_store.plain_keymap(data))
+        self.disk_data = disk_data
+        self.watch_keymap(filename)
+        self.plist_data = data
+        self.layers.mark_dirty()
+        self.history.clear()
+        self.button_layer.set_selection(())
+        self.open_journal(filename)
+
+        # Create save window instead of data viewer
+        self.create_save_window(filename)
+        self.plist_name = filename
+        self.keymap_filename = filename
+        return self.plist_data
+
+    def load_files(self, image_filename, keymap_filename, view=None):
+        """Open an image and a keymap, decoding and parsing them in parallel
+
+        The image decodes on one worker while the keymap is parsed on the
+        other; buttons are drawn as soon as the keymap is ready. view is a
+        saved view_state() to restore.
+        """
+        self.load_image(image_filename)
+
+        # Resolved here so lazily imported modules load on the Tk thread
+        load_keymap = keymap.load_keymap
+        store_keymap = model_store.store_keymap
+
+        def parse():
+            disk_data = load_keymap(keymap_filename)
+            return store_keymap(dict(disk_data)), disk_data
+
+        def on_parsed(result):
+            data, disk_data = result
+            self.open_keymap(keymap_filename, data, disk_data)
+            self.draw_button_models()
+            if view is not None:
+                self.restore_view(view)
+            if self.profiler is not None:
+                self.open_profile_window()
+            # A crash from here on still reopens this pair next time
+            self.save_session()
+
+        def on_failed(error):
+            messagebox.showerror("Error", f"Failed to load files:\n{str(error)}")
+            if self.plist_data is None:
+                self.root.quit()
+
+        self.background.run(
+            parse,
+            on_success=on_parsed,
+            on_error=on_failed,
+        )
+
+    def watch_keymap(self, filename):
+        """Follow changes other programs make to the keymap file being opened"""
+        if self.watcher is None:
+            self.watcher = watcher.FileWatcher()
+            self.root.after(self.watcher.interval, self.check_keymap_file)
+        if self.keymap_filename is not None:
+            self.watcher.unwatch(self.keymap_filename)
+        self.watcher.watch(filename)
+        self.keymap_stale = False
+
+    def check_keymap_file(self):
+        """Reload the keymap if it changed on disk, then check again later"""
+        if self.keymap_filename is not None and os.path.abspath(
+            self.keymap_filename
+        ) in self.watcher.changes():
+            self.keymap_stale = True
+        # A drag finishes first so buttons don't jump under the pointer
+        if (
+            self.keymap_stale
+            and not self.reloading
+            and self.dragging_item is None
+            and self.dragging_model is None
+        ):
+            self.reload_keymap()
+        self.root.after(self.watcher.interval, self.check_keymap_file)
+
+    def reload_keymap(self):
+        """Parse the keymap file again on a worker and merge it into the edits"""
+        filename = self.keymap_filename
+        self.keymap_stale = False
+        self.reloading = True
+
+        def on_loaded(disk_data):
+            self.reloading = False
+            if filename != self.keymap_filename or self.plist_data is None:
+                return
+            if not isinstance(disk_data, dict):
+                self.status.set(
+                    f"Not reloading {os.path.basename(filename)}: not a keymap"
+                )
+                return
+            self.merge_disk_changes(disk_data)
+
+        def on_failed(error):
+            # Most likely read mid-write by a program that doesn't write
+            # atomically; the end of its write is noticed as another change
+            self.reloading = False
+            self.status.set(f"Failed to reload {os.path.basename(filename)}: {error}")
+
+        self.background.run(
+            keymap.load_keymap, filename, on_success=on_loaded, on_error=on_failed
+        )
+
+    def merge_disk_changes(self, disk_data):
+        """Three-way merge a new version of the keymap file into the open keymap
+
+        Only rows and fields changed in the file are applied and redrawn;
+        where the same field was also edited here, the local edit is kept.
+        The merge is one undoable edit.
+        """
+        result = merge.merge_keymaps(
+            self.disk_data,
+            self.plist_data,
+            disk_data,
+            self.canvas_width / self.canvas_height,
+        )
+        self.disk_data = disk_data
+        unsaved = self.journal is not None and self.journal.has_edits()
+
+        for key, value in result.replaced.items():
+            if value is merge.MISSING:
+                self.plist_data.pop(key, None)
+            elif key in model_store.MODEL_KEYS and isinstance(value, list):
+                self.plist_data[key] = model_store.ButtonStore.from_list(value)
+            else:
+                self.plist_data[key] = value
+            if key in model_store.MODEL_KEYS:
+                # Rows of a swapped array don't match the undo history anymore
+                self.history.clear()
+                self.button_layer.set_selection(())
+                self.layers.mark_dirty(key)
+        if result.replaced:
+            self.draw_button_models()
+            # Top-level keys aren't deltas, so they go into a fresh snapshot
+            if unsaved:
+                self.journal.compact(self.plist_data)
+
+        if result.deltas:
+            touched = history.apply_deltas(self.plist_data, result.deltas)
+            self.edit_serial += 1
+            self.history.record(result.deltas)
+            # Without local edits the merged keymap is just the file again,
+            # so there is nothing to recover
+            if unsaved:
+                self.journal.append(self.plist_data, result.deltas)
+            if any(
+                field in (history.INSERT, history.REMOVE)
+                for _, field, _, _ in result.deltas
+            ):
+                # Rows moved, so selected indices would point at other buttons
+                self.button_layer.set_selection(())
+            for index in touched:
+                self.refresh_button(index)
+
+        if result.deltas or result.replaced:
+            self.status.set(
+                f"Merged changes made to {os.path.basename(self.keymap_filename)} "
+                "on disk"
+            )
+        if result.conflicts:
+            lines = [
+                merge.format_conflict(conflict)
+                for conflict in result.conflicts[:MAX_SHOWN_CONFLICTS]
+            ]
+            if len(result.conflicts) > MAX_SHOWN_CONFLICTS:
+                lines.append(
+                    f"...and {len(result.conflicts) - MAX_SHOWN_CONFLICTS} more"
+                )
+            messagebox.showwarning(
+                "Keymap Changed on Disk",
+                f"{os.path.basename(self.keymap_filename)} was changed by another "
+                "program. Its changes were merged, keeping your edits where both "
+                "changed the same thing:\n\n" + "\n".join(lines),
+            )
+
+    def view_state(self):
+        """Zoom, scroll position, selection and view options, for the session"""
+        return {
+            "zoom": self.zoom,
+            "x": self.canvas.xview()[0],
+            "y": self.canvas.yview()[0],
+            "selection": [int(i) for i in self.selected_indices()],
+            "layers": {key: var.get() for key, var in self.layer_visible.items()},
+            "snap": self.snap_choice.get(),
+            "binary_plist": self.binary_plist.get(),
+        }
+
+    def restore_view(self, view):
+        """Apply a saved view_state(); zoom waits for the image pyramid"""
+        for key, visible in view.get("layers", {}).items():
+            if key in self.layer_visible and visible != self.layer_visible[key].get():
+                self.layer_visible[key].set(bool(visible))
+                self.toggle_layer(key)
+        if view.get("snap") in SNAP_STEPS:
+            self.snap_choice.set(view["snap"])
+        self.binary_plist.set(bool(view.get("binary_plist", False)))
+        self.button_layer.set_selection(
+            i for i in view.get("selection", ()) if isinstance(i, int)
+        )
+
+        zoom = view.get("zoom", 1.0)
+        if isinstance(zoom, (int, float)) and zoom > 1.0:
+            self.pending_view = {
+                "zoom": zoom,
+                "x": view.get("x", 0.0),
+                "y": view.get("y", 0.0),
+            }
+            if self.pyramid is not None:
+                self.on_pyramid_ready(self.image_generation, self.pyramid)
+
+    def save_session(self):
+        """Remember the open files and view so the next launch reopens them"""
+        if self.image_filename is None or self.keymap_filename is None:
+            return
         try:
-            with open(filename, "r", encoding="utf-8") as json_file:
-                self.plist_data = json.load(json_file)
+            session.save_session(
+                self.image_filename, self.keymap_filename, self.view_state()
+            )
+        except OSError as e:
+            messagebox.showwarning(
+                "Session Not Saved",
+                f"Failed to remember the open files for next time:\n{str(e)}",
+            )
 
-            # Create save window instead of data viewer
-            self.create_save_window(filename)
+    def open_journal(self, filename):
+        """Journal edits to filename, offering to restore an interrupted session"""
+        if self.journal is not None:
+            self.journal.close()
+        self.journal = journal.EditJournal(filename)
 
-            return self.plist_data
+        if not self.journal.has_recovery():
+            return
 
-        except Exception as e:
-            raise Exception(f"Failed to parse JSON file: {str(e)}")
+        restore = messagebox.askyesno(
+            "Recover Unsaved Edits",
+            f"{os.path.basename(filename)} has unsaved edits from a previous "
+            "session.\nRestore them?",
+        )
+        if restore:
+            try:
+                self.plist_data = self.journal.recover()
+                return
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to recover edits:\n{str(e)}")
+        self.journal.discard()
 
     def on_double_click(self, event):
         """Handle double-click events to open button edit popup"""
-        # Find the closest item to the click
-        item = self.canvas.find_closest(event.x, event.y)[0]
+        x, y = self.event_position(event)
+        item = self.find_button_at(x, y)
 
-        # Get tags safely
-        tags = self.canvas.gettags(item)
-
-        # Check if it's a button circle or text
-        if item in self.button_circles or (
-            tags and tags[0] in ["button_circle", "button_text"]
-        ):
-            # If it's text, find the corresponding circle
-            if tags and tags[0] == "button_text":
-                # Find the circle that corresponds to this text
-                for circle_id, data in self.button_circles.items():
-                    if data["text_id"] == item:
-                        item = circle_id
-                        break
+        if item is not None:
+            self.open_button_edit_popup(item)
+            return
 
-            if item in self.button_circles:
-                self.open_button_edit_popup(item)
+        model = self.layers.hit(x, y, MODEL_HIT_ORDER)
+        if model is not None:
+            self.change_model_size(*model)
+
+    def change_model_size(self, key, row):
+        """Ask for a new size for a joystick, mouse area or draggable button"""
+        size = simpledialog.askfloat(
+            "Change Size",
+            "Enter new size (1-20):",
+            parent=self.root,
+            initialvalue=float(self.plist_data[key].size[row]),
+            minvalue=keymap.MIN_BUTTON_SIZE,
+            maxvalue=keymap.MAX_BUTTON_SIZE,
+        )
+        if size is not None:
+            self.edit_button(history.label(key, row), {"size": size})
 
     def open_button_edit_popup(self, circle_id):
         """Open a popup with options to edit the button"""
         circle_data = self.button_circles[circle_id]
         button_index = circle_data["button_index"]
-        button_data = circle_data["button_data"]
 
         # Create popup window
         popup = tk.Toplevel(self.root)
@@ -753,7 +2005,7 @@ class ImageViewer:
         # Current button info
         info_label = tk.Label(
             main_frame,
-            text=f"Editing: {button_data.get('keyName', 'Unknown')}",
+            text=f"Editing: {self.buttons.get(button_index, 'keyName') or 'Unknown'}",
             font=("Arial", 12, "bold"),
             fg="blue",
         )
@@ -817,7 +2069,7 @@ class ImageViewer:
 
         circle_data = self.button_circles[circle_id]
         button_index = circle_data["button_index"]
-        current_key_name = circle_data["button_data"].get("keyName", "")
+        current_key_name = self.buttons.key_name(button_index)
 
         # Create input dialog
         input_dialog = tk.Toplevel(self.root)
@@ -852,10 +2104,8 @@ class ImageViewer:
         def save_manual_key():
             new_key_name = key_entry.get().strip()
             if new_key_name:
-                # Update the button data
-                self.plist_data["buttonModels"][button_index]["keyName"] = new_key_name
-                # Redraw to show the change
-                self.draw_button_models()
+                # Update the button data and redraw to show the change
+                self.edit_button(button_index, {"keyName": new_key_name})
                 input_dialog.destroy()
 
         # Save button
@@ -933,24 +2183,14 @@ class ImageViewer:
 
         def update_button_key():
             if self.captured_key and self.captured_key_code is not None:
-                # Convert keysym to PlayCover key name
-                if self.captured_key in KeyNameDifferences:
-                    key_name = KeyNameDifferences[self.captured_key]
-                else:
-                    key_name = (
-                        self.captured_key.upper()
-                        if len(self.captured_key) == 1
-                        else self.captured_key
-                    )
-
-                # Update the button data
-                self.plist_data["buttonModels"][button_index][
-                    "keyCode"
-                ] = self.captured_key_code
-                self.plist_data["buttonModels"][button_index]["keyName"] = key_name
+                # PlayCover names keys by code, as in KeyCodeNames.swift
+                key_name = keycodes.key_name(self.captured_key_code)
 
-                # Redraw to show the change
-                self.draw_button_models()
+                # Update the button data and redraw to show the change
+                self.edit_button(
+                    button_index,
+                    {"keyCode": self.captured_key_code, "keyName": key_name},
+                )
                 key_dialog.destroy()
 
         # OK button (initially disabled)
@@ -988,7 +2228,7 @@ class ImageViewer:
 
         circle_data = self.button_circles[circle_id]
         button_index = circle_data["button_index"]
-        current_size = circle_data["button_data"]["transform"].get("size", 5.0)
+        current_size = float(self.buttons.size[button_index])
 
         # Create size input dialog
         size_dialog = tk.Toplevel(self.root)
@@ -1024,12 +2264,8 @@ class ImageViewer:
             try:
                 new_size = float(size_entry.get().strip())
                 if 1 <= new_size <= 20:
-                    # Update the button data
-                    self.plist_data["buttonModels"][button_index]["transform"][
-                        "size"
-                    ] = new_size
-                    # Redraw to show the change
-                    self.draw_button_models()
+                    # Update the button data and redraw to show the change
+                    self.edit_button(button_index, {"size": new_size})
                     size_dialog.destroy()
                 else:
                     messagebox.showwarning(
@@ -1066,14 +2302,93 @@ class ImageViewer:
         size_entry.bind("<Return>", lambda e: save_size())
 
 
-def main():
-    # Use TkinterDnD for drag-and-drop support
-    root = TkinterDnD.Tk()
-    app = ImageViewer(root)
+def instrument_hot_paths(profiler):
+    """Time the editor's event handlers and the slow work they start"""
+    profiler.instrument(ImageViewer, PROFILED_METHODS)
+    profiler.instrument(
+        keymap, ("load_plist", "load_json", "load_keymap", "save_keymap")
+    )
+    profiler.instrument(imaging, ("decode_display_image",))
+    profiler.instrument(pyramid.TilePyramid, ("build",))
+
+
+def enable_file_drop(root, on_drop, on_error=None):
+    """Load the tkdnd extension and pass files dropped on root to on_drop(data)
+
+    Loading tkdnd is slow, so this runs once the editor has been painted.
+    If it can't be loaded, on_error is called with the exception.
+    """
+    try:
+        from tkinterdnd2 import DND_FILES, TkinterDnD
+
+        TkinterDnD._require(root)
+    except (ImportError, RuntimeError) as e:
+        if on_error is not None:
+            on_error(e)
+        return
 
-    # Hide the window initially
+    def on_drop_event(data):
+        on_drop(data)
+        return "copy"
+
+    # What TkinterDnD.Tk does for its own root, on the plain Tk root
+    root.tk.call("tkdnd::drop_target", "register", root._w, DND_FILES)
+    root.tk.call("bind", root._w, "<<Drop>>", f"{root.register(on_drop_event)} %D")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Edit PlayCover keymaps over a screenshot")
+    parser.add_argument("image", nargs="?", help="screenshot to open")
+    parser.add_argument(
+        "keymap", nargs="?", help="keymap to edit (.playmap, .plist or .json)"
+    )
+    parser.add_argument(
+        "--choose",
+        action="store_true",
+        help="ask for the files instead of reopening the last session",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help=f"record hot-path latencies (F12 shows them); also enabled by "
+        f"{profiling.ENV_VAR}",
+    )
+    # A separate option, so an optional value can never swallow the image
+    # argument and have the report overwrite it on exit
+    parser.add_argument(
+        "--profile-out",
+        metavar="FILE",
+        help="profile, and write the latencies to FILE on exit",
+    )
+    args = parser.parse_args(argv)
+    for path in (args.image, args.keymap):
+        if path is not None and not os.path.isfile(path):
+            parser.error(f"{path}: no such file")
+
+    if args.profile_out:
+        profile = args.profile_out
+    elif args.profile:
+        profile = ""
+    else:
+        profile = profiling.setting_from_env()
+    profiler = None
+    if profile is not None:
+        profiler = profiling.start(profile)
+        # Must happen before the handlers are bound to the canvas
+        instrument_hot_paths(profiler)
+
+    # Only a bare, hidden root is needed for the file dialogs; the editor
+    # (and the modules it imports) is built once both files are chosen
+    root = tk.Tk()
     root.withdraw()
 
+    # Files from the command line, else the last session's pair
+    image_filename = args.image
+    data_filename = args.keymap
+    saved = session.load_session()
+    if image_filename is None and data_filename is None and not args.choose:
+        image_filename, data_filename = session.restorable_files(saved) or (None, None)
+
     # First popup: Select an image file
     image_file_types = [
         ("Image files", "*.png *.jpg *.jpeg *.gif *.bmp *.tiff *.tif"),
@@ -1085,9 +2400,10 @@ def main():
         ("All files", "*.*"),
     ]
 
-    image_filename = filedialog.askopenfilename(
-        title="First: Select an image file to view", filetypes=image_file_types
-    )
+    if not image_filename:
+        image_filename = filedialog.askopenfilename(
+            title="First: Select an image file to view", filetypes=image_file_types
+        )
 
     if not image_filename:
         # User cancelled image selection, exit
@@ -1103,19 +2419,22 @@ def main():
         ("All files", "*.*"),
     ]
 
-    data_filename = filedialog.askopenfilename(
-        title="Second: Select a plist, JSON, or playmap file to view",
-        filetypes=data_file_types,
-    )
+    if not data_filename:
+        data_filename = filedialog.askopenfilename(
+            title="Second: Select a plist, JSON, or playmap file to view",
+            filetypes=data_file_types,
+        )
 
     if not data_filename:
         # User cancelled data file selection, exit
         root.quit()
         return
 
+    app = ImageViewer(root, profiler)
+
     # Enable drag-and-drop on the main window
-    def on_drop(event):
-        dropped_file = event.data.strip("{}")  # Remove curly braces if present
+    def on_drop(data):
+        dropped_file = data.strip("{}")  # Remove curly braces if present
         # Close the old controls window if it exists
         if hasattr(app, 'save_window') and app.save_window is not None:
             try:
@@ -1123,7 +2442,7 @@ def main():
             except Exception:
                 pass
             app.save_window = None
-        if is_image_file(dropped_file):
+        if keymap.is_image_file(dropped_file):
             try:
                 app.load_image(dropped_file)
                 app.draw_button_models()
@@ -1131,7 +2450,7 @@ def main():
                 messagebox.showinfo("Image Loaded", f"Loaded image: {os.path.basename(dropped_file)}")
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to load image:\n{str(e)}")
-        elif is_plist_file(dropped_file):
+        elif keymap.is_plist_file(dropped_file):
             try:
                 app.load_plist(dropped_file)
                 app.draw_button_models()
@@ -1141,32 +2460,32 @@ def main():
         else:
             messagebox.showwarning("Unsupported File", "File type not supported for drag-and-drop.")
 
-    root.drop_target_register(DND_FILES)
-    root.dnd_bind('<<Drop>>', on_drop)
-
     # Show the window and load both files
     root.deiconify()
 
     try:
-        # Load and display the image first
-        app.load_image(image_filename)
-
-        # Load and display the data file in a separate window
-        file_ext = os.path.splitext(data_filename)[1].lower()
-
-        if file_ext in [".plist", ".playmap"]:
-            data = app.load_plist(data_filename)
-        elif file_ext == ".json":
-            data = app.load_json(data_filename)
-        else:
-            # Try to load as JSON first, then plist if that fails
-            try:
-                data = app.load_json(data_filename)
-            except:
-                data = app.load_plist(data_filename)
+        # The keymap opens in a separate window and its buttons are drawn
+        # once parsing finishes; the view is restored if this pair was open
+        # last time
+        app.load_files(
+            image_filename,
+            data_filename,
+            session.saved_view(saved, image_filename, data_filename),
+        )
 
-        # Draw button models on the image canvas
-        app.draw_button_models()
+        # Register for drops after the first paint: an idle callback runs
+        # alongside the redraw, the timer it starts only after it
+        def on_drop_unavailable(error):
+            app.status.set(f"Drag and drop is unavailable: {error}")
+
+        root.after_idle(
+            lambda: root.after(
+                0,
+                functools.partial(
+                    enable_file_drop, root, on_drop, on_drop_unavailable
+                ),
+            )
+        )
 
     except Exception as e:
         messagebox.showerror("Error", f"Failed to load files:\n{str(e)}")
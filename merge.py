@@ -0,0 +1,483 @@
+"""Semantic diff and three-way merge of keymap data
+
+Entries of each model array are matched by their binding, (keyCode,
+keyName). A binding used more than once on either side (joysticks and mouse
+areas, which have no binding, share one) pairs its entries by position
+first, then in order. Entries left over, such as rebound buttons, are
+paired with the nearest overlapping entry. Positions are compared through
+a spatial grid, so matching stays close to linear in the number of entries.
+
+Matched entries are compared field by field. A diff reports them as moved,
+resized, rebound or otherwise changed; a merge only touches the rows and
+fields that changed on one side, and its result is a list of history
+deltas that can be applied, undone and journaled like any other edit.
+"""
+from collections import deque, namedtuple
+
+import history
+import keymap
+from lint import DEFAULT_ASPECT
+from model_store import MODEL_KEYS, TRANSFORM_FIELDS, ButtonStore
+from spatial import SpatialGrid
+
+# Stands for a top-level key that is absent from one side
+MISSING = object()
+
+# row is the entry's row in the local data, or None for top-level keys and
+# entries that were removed locally; field is None for whole entries
+Conflict = namedtuple("Conflict", "key row field local disk")
+MergeResult = namedtuple("MergeResult", "deltas replaced conflicts")
+
+# kind is one of CHANGE_KINDS; old and new are the entries (None when added
+# or removed), or the values of a changed top-level key, whose rows are None
+Change = namedtuple("Change", "kind key old_row new_row old new")
+CHANGE_KINDS = ("removed", "added", "moved", "resized", "rebound", "changed")
+
+# Positions are compared on a virtual screen of this height, with the
+# width given by the aspect ratio
+MATCH_HEIGHT = 1000
+
+
+def entries(models):
+    """Model array as a list of dictionaries, or None if it isn't one"""
+    if isinstance(models, ButtonStore):
+        return models.to_list()
+    if isinstance(models, list):
+        return models
+    return None
+
+
+def binding(entry):
+    """(keyCode, keyName) of an entry, with None for either when missing"""
+    if not isinstance(entry, dict):
+        return None, None
+    code = entry.get("keyCode")
+    name = entry.get("keyName")
+    if not isinstance(code, int) or isinstance(code, bool):
+        code = None
+    if not isinstance(name, str):
+        name = None
+    return code, name
+
+
+def position(entry):
+    """(binding, (xCoord, yCoord)) of an entry, with None for a missing position"""
+    transform = entry.get("transform") if isinstance(entry, dict) else None
+    if isinstance(transform, dict):
+        spot = (transform.get("xCoord"), transform.get("yCoord"))
+        if all(isinstance(value, (int, float)) for value in spot):
+            return binding(entry), spot
+    return binding(entry), None
+
+
+def entry_geometry(entry, width, height):
+    """(center_x, center_y, radius) of an entry, or None if it has no position"""
+    transform = entry.get("transform") if isinstance(entry, dict) else None
+    if not isinstance(transform, dict):
+        return None
+    try:
+        return keymap.button_geometry(transform, width, height)
+    except TypeError:
+        return None
+
+
+def match_nearest(
+    base, other, base_rows, other_rows, aspect=DEFAULT_ASPECT, key=None
+):
+    """{base row: other row} pairing each entry with the nearest overlapping one
+
+    Only the given rows take part, and with key only entries whose key(entry)
+    agree. Candidate pairs come from a grid of the other entries' circles, and
+    the closest pairs are taken first; equal distances go in row order.
+    """
+    width = MATCH_HEIGHT * aspect
+    grid = SpatialGrid()
+    for row in other_rows:
+        geometry = entry_geometry(other[row], width, MATCH_HEIGHT)
+        if geometry is not None:
+            grid.insert(row, *geometry)
+
+    pairs = []
+    for base_row in base_rows:
+        geometry = entry_geometry(base[base_row], width, MATCH_HEIGHT)
+        if geometry is None:
+            continue
+        center_x, center_y, radius = geometry
+        for other_row in grid.overlapping(center_x, center_y, radius):
+            if key is not None and key(base[base_row]) != key(other[other_row]):
+                continue
+            other_x, other_y, _, _ = grid.circles[other_row]
+            distance = (center_x - other_x) ** 2 + (center_y - other_y) ** 2
+            pairs.append((distance, base_row, other_row))
+
+    matches = {}
+    taken = set()
+    for _, base_row, other_row in sorted(pairs):
+        if base_row not in matches and other_row not in taken:
+            matches[base_row] = other_row
+            taken.add(other_row)
+    return matches
+
+
+def match_entries(base, other, aspect=DEFAULT_ASPECT):
+    """{base row: other row} pairing entries by binding, then by position
+
+    A binding held by one entry on each side pairs them wherever they are.
+    Bindings held by several entries pair them with the nearest overlapping
+    entry of that binding, then the rest of them in order. Entries still
+    left pair with the nearest entry they overlap.
+    """
+    groups = {}
+    for row, entry in enumerate(base):
+        groups.setdefault(binding(entry), ([], []))[0].append(row)
+    for row, entry in enumerate(other):
+        groups.setdefault(binding(entry), ([], []))[1].append(row)
+
+    matches = {}
+    shared_base = []
+    shared_other = []
+    for base_rows, other_rows in groups.values():
+        if len(base_rows) == 1 and len(other_rows) == 1:
+            matches[base_rows[0]] = other_rows[0]
+        elif base_rows and other_rows:
+            shared_base.extend(base_rows)
+            shared_other.extend(other_rows)
+    if shared_base:
+        # Entries that didn't move are the nearest possible; pair them first
+        spots = {}
+        for row in shared_other:
+            spots.setdefault(position(other[row]), deque()).append(row)
+        moved = []
+        for row in shared_base:
+            spot = position(base[row])
+            queue = spots.get(spot) if spot[1] is not None else None
+            if queue:
+                matches[row] = queue.popleft()
+            else:
+                moved.append(row)
+        taken = set(matches.values())
+        left = [row for row in shared_other if row not in taken]
+        matches.update(match_nearest(base, other, moved, left, aspect, binding))
+        # Duplicates that don't overlap one of their own pair up in order
+        taken = set(matches.values())
+        queues = {}
+        for row in sorted(shared_other):
+            if row not in taken:
+                queues.setdefault(binding(other[row]), deque()).append(row)
+        for row in sorted(shared_base):
+            queue = queues.get(binding(base[row]))
+            if row not in matches and queue:
+                matches[row] = queue.popleft()
+
+    if len(matches) < len(base):
+        taken = set(matches.values())
+        unmatched = [row for row in range(len(base)) if row not in matches]
+        remaining = [row for row in range(len(other)) if row not in taken]
+        matches.update(match_nearest(base, other, unmatched, remaining, aspect))
+    return matches
+
+
+def entry_fields(entry):
+    """An entry as {field: value}, the way deltas address it, or None
+
+    Transform fields are flattened next to keyCode and keyName. Entries the
+    deltas can't address field by field (no transform dictionary, or extra
+    keys inside it) return None and are merged as a whole.
+    """
+    if not isinstance(entry, dict):
+        return None
+    transform = entry.get("transform")
+    if not isinstance(transform, dict) or not set(transform) <= set(TRANSFORM_FIELDS):
+        return None
+    fields = {}
+    for field, value in entry.items():
+        if field in TRANSFORM_FIELDS:
+            return None
+        if field != "transform":
+            fields[field] = value
+    fields.update(transform)
+    return fields
+
+
+def merge_models(key, base, ours, theirs, deltas, conflicts, aspect=DEFAULT_ASPECT):
+    """Append the deltas turning ours into the merge of ours and theirs"""
+    to_ours = match_entries(base, ours, aspect)
+    to_theirs = match_entries(base, theirs, aspect)
+
+    replacements = []
+    field_deltas = []
+    removals = []
+    for base_row, base_entry in enumerate(base):
+        our_row = to_ours.get(base_row)
+        their_row = to_theirs.get(base_row)
+
+        if our_row is None:
+            # Removed here; a change on disk doesn't bring it back
+            if their_row is not None and theirs[their_row] != base_entry:
+                conflicts.append(Conflict(key, None, None, MISSING, theirs[their_row]))
+            continue
+
+        our_entry = ours[our_row]
+        if their_row is None:
+            if our_entry == base_entry:
+                removals.append(our_row)
+            else:
+                conflicts.append(Conflict(key, our_row, None, our_entry, MISSING))
+            continue
+
+        their_entry = theirs[their_row]
+        if their_entry == base_entry or their_entry == our_entry:
+            continue
+
+        fields = [entry_fields(e) for e in (base_entry, our_entry, their_entry)]
+        if None in fields:
+            if our_entry == base_entry:
+                replacements.append((our_row, our_entry, their_entry))
+            else:
+                conflicts.append(Conflict(key, our_row, None, our_entry, their_entry))
+            continue
+
+        base_fields, our_fields, their_fields = fields
+        index = history.label(key, our_row)
+        for field in {**base_fields, **their_fields}:
+            base_value = base_fields.get(field)
+            our_value = our_fields.get(field)
+            their_value = their_fields.get(field)
+            if their_value == base_value or their_value == our_value:
+                continue
+            if our_value == base_value:
+                field_deltas.append((index, field, our_value, their_value))
+            else:
+                conflicts.append(Conflict(key, our_row, field, our_value, their_value))
+
+    # Replacing in place keeps rows where they are, so it goes first, and
+    # removals run bottom-up so earlier rows keep their indices
+    for row, old, new in replacements:
+        index = history.label(key, row)
+        deltas.append((index, history.REMOVE, old, None))
+        deltas.append((index, history.INSERT, None, new))
+    deltas.extend(field_deltas)
+    for row in sorted(removals, reverse=True):
+        deltas.append((history.label(key, row), history.REMOVE, ours[row], None))
+
+    # Entries added on both sides (e.g. our own save read back) only once
+    matched_ours = set(to_ours.values())
+    added_here = {}
+    for row, entry in enumerate(ours):
+        if row not in matched_ours:
+            added_here.setdefault(binding(entry), []).append(entry)
+    matched_theirs = set(to_theirs.values())
+    row = len(ours) - len(removals)
+    for their_row, entry in enumerate(theirs):
+        if their_row in matched_theirs:
+            continue
+        twins = added_here.get(binding(entry), [])
+        if entry in twins:
+            twins.remove(entry)
+            continue
+        deltas.append((history.label(key, row), history.INSERT, None, entry))
+        row += 1
+
+
+def merge_keymaps(base, ours, theirs, aspect=DEFAULT_ASPECT):
+    """Three-way merge of keymap data changed on disk into the data being edited
+
+    base is the file as it was loaded, ours the edited data (model arrays
+    may be ButtonStores) and theirs the file as it is now. Returns a
+    MergeResult: deltas to apply to ours for the model arrays, replaced
+    {top-level key: new value or MISSING} for everything else, and the
+    conflicts, which keep the local value. aspect is the screen's width /
+    height, used to match entries by position: buttons sharing a binding
+    are told apart by where they are, so deleting one of them on disk
+    while another is moved locally merges cleanly.
+    """
+    deltas = []
+    replaced = {}
+    conflicts = []
+
+    keys = list(ours) + [key for key in list(base) + list(theirs) if key not in ours]
+    for key in dict.fromkeys(keys):
+        base_value = base.get(key, MISSING)
+        our_value = ours.get(key, MISSING)
+        their_value = theirs.get(key, MISSING)
+
+        if key in MODEL_KEYS:
+            base_entries = [] if base_value is MISSING else entries(base_value)
+            our_entries = entries(our_value)
+            their_entries = entries(their_value)
+            if None not in (base_entries, our_entries, their_entries):
+                merge_models(
+                    key,
+                    base_entries,
+                    our_entries,
+                    their_entries,
+                    deltas,
+                    conflicts,
+                    aspect,
+                )
+                continue
+            if isinstance(our_value, ButtonStore):
+                our_value = our_value.to_list()
+
+        if their_value == base_value or their_value == our_value:
+            continue
+        if our_value == base_value:
+            replaced[key] = their_value
+        else:
+            conflicts.append(Conflict(key, None, None, our_value, their_value))
+
+    return MergeResult(deltas, replaced, conflicts)
+
+
+def diff_models(key, old, new, changes, aspect=DEFAULT_ASPECT):
+    """Append the Changes between two lists of entries"""
+    matches = match_entries(old, new, aspect)
+    matched = set(matches.values())
+    for old_row, old_entry in enumerate(old):
+        new_row = matches.get(old_row)
+        if new_row is None:
+            changes.append(Change("removed", key, old_row, None, old_entry, None))
+            continue
+        new_entry = new[new_row]
+        if new_entry == old_entry:
+            continue
+
+        old_fields = entry_fields(old_entry)
+        new_fields = entry_fields(new_entry)
+        if old_fields is None or new_fields is None:
+            changes.append(
+                Change("changed", key, old_row, new_row, old_entry, new_entry)
+            )
+            continue
+        kinds = []
+        differing = {
+            field
+            for field in {**old_fields, **new_fields}
+            if old_fields.get(field) != new_fields.get(field)
+        }
+        if differing & {"xCoord", "yCoord"}:
+            kinds.append("moved")
+        if "size" in differing:
+            kinds.append("resized")
+        if differing & {"keyCode", "keyName"}:
+            kinds.append("rebound")
+        if differing - {"xCoord", "yCoord", "size", "keyCode", "keyName"}:
+            kinds.append("changed")
+        for kind in kinds:
+            changes.append(Change(kind, key, old_row, new_row, old_entry, new_entry))
+
+    for new_row, new_entry in enumerate(new):
+        if new_row not in matched:
+            changes.append(Change("added", key, None, new_row, None, new_entry))
+
+
+def diff_keymaps(old, new, aspect=DEFAULT_ASPECT):
+    """Changes turning keymap data old into new, model arrays first
+
+    Model arrays may be lists or ButtonStores. aspect is the screen's width
+    / height, used to match entries by position.
+    """
+    changes = []
+    others = []
+    keys = list(old) + [key for key in new if key not in old]
+    for key in keys:
+        old_value = old.get(key, MISSING)
+        new_value = new.get(key, MISSING)
+        if key in MODEL_KEYS:
+            old_entries = [] if old_value is MISSING else entries(old_value)
+            new_entries = [] if new_value is MISSING else entries(new_value)
+            if old_entries is not None and new_entries is not None:
+                diff_models(key, old_entries, new_entries, changes, aspect)
+                continue
+        if old_value != new_value:
+            others.append(Change("changed", key, None, None, old_value, new_value))
+    return changes + others
+
+
+def change_summary(change):
+    """A Change as a JSON-friendly dictionary of what changed"""
+    summary = {
+        "kind": change.kind,
+        "key": change.key,
+        "old_row": change.old_row,
+        "new_row": change.new_row,
+    }
+    old_fields = entry_fields(change.old) or {}
+    new_fields = entry_fields(change.new) or {}
+    if change.kind == "moved":
+        for axis, field in (("dx", "xCoord"), ("dy", "yCoord")):
+            old_value = old_fields.get(field)
+            new_value = new_fields.get(field)
+            try:
+                summary[axis] = new_value - old_value
+            except TypeError:
+                summary[axis] = None
+    elif change.kind == "resized":
+        summary["old_size"] = old_fields.get("size")
+        summary["new_size"] = new_fields.get("size")
+    elif change.kind == "rebound":
+        summary["old_binding"] = list(binding(change.old))
+        summary["new_binding"] = list(binding(change.new))
+    elif change.kind == "added":
+        summary["entry"] = change.new
+    elif change.kind == "removed":
+        summary["entry"] = change.old
+    elif change.old_row is None:
+        summary["old"] = None if change.old is MISSING else change.old
+        summary["new"] = None if change.new is MISSING else change.new
+    else:
+        summary["fields"] = {
+            field: [old_fields.get(field), new_fields.get(field)]
+            for field in {**old_fields, **new_fields}
+            if field not in ("xCoord", "yCoord", "size", "keyCode", "keyName")
+            and old_fields.get(field) != new_fields.get(field)
+        } or {"entry": [change.old, change.new]}
+    return summary
+
+
+def describe_entry(entry):
+    """Short name of an entry for listings: its key name, or its code"""
+    code, name = binding(entry)
+    if name:
+        return name
+    return "" if code is None else f"#{code}"
+
+
+def format_change(change):
+    """One line describing a Change"""
+    summary = change_summary(change)
+    if change.old_row is None and change.new_row is None:
+        return f"{change.key}: changed"
+    row = change.old_row if change.new_row is None else change.new_row
+    where = f"{change.key}[{row}]"
+    label = describe_entry(change.new if change.new is not None else change.old)
+    if label:
+        where += f" {label}"
+
+    if change.kind == "moved":
+        moves = [
+            f"{axis}={summary[axis]:+.4f}"
+            for axis in ("dx", "dy")
+            if summary[axis]
+        ]
+        return f"{where}: moved {' '.join(moves)}"
+    if change.kind == "resized":
+        return f"{where}: resized {summary['old_size']} -> {summary['new_size']}"
+    if change.kind == "rebound":
+        return f"{where}: rebound from {describe_entry(change.old) or 'nothing'}"
+    if change.kind == "changed":
+        return f"{where}: changed {', '.join(sorted(summary['fields']))}"
+    return f"{where}: {change.kind}"
+
+
+def format_conflict(conflict, other="the file"):
+    key, row, field, local, disk = conflict
+    if field is not None:
+        return f"{key}[{row}] {field}: kept {local!r}, {other} has {disk!r}"
+    if local is MISSING:
+        return f"{key}: an entry deleted here was changed in {other}; kept it deleted"
+    if row is None:
+        return f"{key}: changed here and in {other}; kept the local value"
+    if disk is MISSING:
+        return f"{key}[{row}]: edited here but deleted in {other}; kept it"
+    return f"{key}[{row}]: changed here and in {other}; kept the local version"
@@ -0,0 +1,331 @@
+"""Column store for buttonModels: NumPy arrays for transforms, interned key names"""
+import copy
+
+import numpy as np
+
+# Keymap arrays whose entries are positioned with a transform
+MODEL_KEYS = (
+    "buttonModels",
+    "draggableButtonModels",
+    "joystickModel",
+    "mouseAreaModel",
+)
+
+# Known fields and where they live
+TRANSFORM_FIELDS = ("size", "xCoord", "yCoord")
+DEFAULTS = {"xCoord": 0.0, "yCoord": 0.0, "size": 5.0}
+CANONICAL_LAYOUT = (("keyCode", "keyName", "transform"), TRANSFORM_FIELDS)
+
+# Bits in the flags column: the value was an integer in the source file
+INT_FLAGS = {"xCoord": 1, "yCoord": 2, "size": 4}
+
+INITIAL_CAPACITY = 64
+
+# Range of the keyCode column; other integers are kept in extras
+KEY_CODE_LIMITS = np.iinfo(np.int64)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class ButtonExtras:
+    """Everything about a button the columns can't hold, allocated only when needed"""
+
+    __slots__ = ("fields", "transform_fields", "raw")
+
+    def __init__(self):
+        self.fields = {}  # top-level fields other than typed keyCode/keyName
+        self.transform_fields = {}  # transform fields other than numeric x/y/size
+        self.raw = None  # malformed entries are kept verbatim
+
+
+class ButtonStore:
+    """Typed, array-backed replacement for the list of button dictionaries
+
+    Transforms live in float64 columns, key codes in an int64 column and key
+    names as ids into an interned string table. The original key order (and
+    which keys were present) is interned as a "layout", and integer-typed
+    transform values are flagged, so to_list() reproduces the source
+    losslessly. Rows are addressed by their position in buttonModels, so
+    indices can't drift from the data they describe.
+    """
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        self.count = 0
+        self.x = np.zeros(capacity, dtype=np.float64)
+        self.y = np.zeros(capacity, dtype=np.float64)
+        self.size = np.zeros(capacity, dtype=np.float64)
+        self.key_code = np.zeros(capacity, dtype=np.int64)
+        self.name_id = np.zeros(capacity, dtype=np.int32)
+        self.flags = np.zeros(capacity, dtype=np.uint8)
+        self.layout_id = np.zeros(capacity, dtype=np.int16)
+        self.extras = [None] * capacity
+
+        self.names = [""]
+        self.name_ids = {"": 0}
+        self.layouts = [CANONICAL_LAYOUT]
+        self.layout_ids = {CANONICAL_LAYOUT: 0}
+
+    @classmethod
+    def from_list(cls, button_models):
+        store = cls(max(INITIAL_CAPACITY, len(button_models)))
+        for button in button_models:
+            store.insert(store.count, button)
+        return store
+
+    def __len__(self):
+        return self.count
+
+    def _columns(self):
+        return (
+            self.x,
+            self.y,
+            self.size,
+            self.key_code,
+            self.name_id,
+            self.flags,
+            self.layout_id,
+        )
+
+    def _grow(self, needed):
+        capacity = len(self.x)
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2)
+        for name in ("x", "y", "size", "key_code", "name_id", "flags", "layout_id"):
+            setattr(self, name, np.resize(getattr(self, name), new_capacity))
+        self.extras.extend([None] * (new_capacity - capacity))
+
+    def intern_name(self, name):
+        name_id = self.name_ids.get(name)
+        if name_id is None:
+            name_id = len(self.names)
+            self.names.append(name)
+            self.name_ids[name] = name_id
+        return name_id
+
+    def _intern_layout(self, layout):
+        layout_id = self.layout_ids.get(layout)
+        if layout_id is None:
+            layout_id = len(self.layouts)
+            self.layouts.append(layout)
+            self.layout_ids[layout] = layout_id
+        return layout_id
+
+    def _extras(self, index):
+        extras = self.extras[index]
+        if extras is None:
+            extras = self.extras[index] = ButtonExtras()
+        return extras
+
+    def is_drawable(self, index):
+        """False for malformed entries (no transform dictionary)"""
+        extras = self.extras[index]
+        return extras is None or extras.raw is None
+
+    # Row insertion and removal
+
+    def insert(self, index, button):
+        """Insert a button dictionary at index"""
+        self._grow(self.count + 1)
+        if index < self.count:
+            for column in self._columns():
+                column[index + 1 : self.count + 1] = column[index : self.count]
+            self.extras[index + 1 : self.count + 1] = self.extras[index : self.count]
+        self.count += 1
+        self._write_row(index, button)
+
+    def append(self, button):
+        self.insert(self.count, button)
+
+    def pop(self, index):
+        """Remove the button at index and return it as a dictionary"""
+        button = self.button(index)
+        if index < self.count - 1:
+            for column in self._columns():
+                column[index : self.count - 1] = column[index + 1 : self.count]
+            self.extras[index : self.count - 1] = self.extras[index + 1 : self.count]
+        self.count -= 1
+        self.extras[self.count] = None
+        return button
+
+    def _write_row(self, index, button):
+        self.x[index] = DEFAULTS["xCoord"]
+        self.y[index] = DEFAULTS["yCoord"]
+        self.size[index] = DEFAULTS["size"]
+        self.key_code[index] = 0
+        self.name_id[index] = 0
+        self.flags[index] = 0
+        self.extras[index] = None
+
+        transform = button.get("transform") if isinstance(button, dict) else None
+        if not isinstance(transform, dict):
+            self.layout_id[index] = 0
+            self._extras(index).raw = copy.deepcopy(button)
+            return
+
+        self.layout_id[index] = self._intern_layout((tuple(button), tuple(transform)))
+        for field, value in button.items():
+            if field != "transform":
+                self._store(index, field, value, False)
+        for field, value in transform.items():
+            self._store(index, field, value, True)
+
+    # Field access
+
+    def _store(self, index, field, value, in_transform):
+        """Put a present value into its column, or into extras if it doesn't fit"""
+        if in_transform:
+            if field in TRANSFORM_FIELDS and _is_number(value):
+                self._column(field)[index] = value
+                if isinstance(value, int):
+                    self.flags[index] |= INT_FLAGS[field]
+                else:
+                    self.flags[index] &= ~INT_FLAGS[field] & 0xFF
+                self._drop_extra(index, field, True)
+            else:
+                self._extras(index).transform_fields[field] = copy.deepcopy(value)
+        elif (
+            field == "keyCode"
+            and _is_number(value)
+            and isinstance(value, int)
+            and KEY_CODE_LIMITS.min <= value <= KEY_CODE_LIMITS.max
+        ):
+            self.key_code[index] = value
+            self._drop_extra(index, field, False)
+        elif field == "keyName" and isinstance(value, str):
+            self.name_id[index] = self.intern_name(value)
+            self._drop_extra(index, field, False)
+        else:
+            self._extras(index).fields[field] = copy.deepcopy(value)
+
+    def _drop_extra(self, index, field, in_transform):
+        extras = self.extras[index]
+        if extras is None:
+            return
+        if in_transform:
+            extras.transform_fields.pop(field, None)
+        else:
+            extras.fields.pop(field, None)
+        if not extras.fields and not extras.transform_fields and extras.raw is None:
+            self.extras[index] = None
+
+    def _column(self, field):
+        return {"xCoord": self.x, "yCoord": self.y, "size": self.size}[field]
+
+    def _present(self, index, field):
+        top_keys, transform_keys = self.layouts[self.layout_id[index]]
+        return field in (transform_keys if field in TRANSFORM_FIELDS else top_keys)
+
+    def get(self, index, field):
+        """Read a field as it would be serialized, or None if it is absent"""
+        if not self._present(index, field):
+            return None
+
+        extras = self.extras[index]
+        if field in TRANSFORM_FIELDS:
+            if extras is not None and field in extras.transform_fields:
+                return extras.transform_fields[field]
+            value = float(self._column(field)[index])
+            return int(value) if self.flags[index] & INT_FLAGS[field] else value
+
+        if extras is not None and field in extras.fields:
+            return extras.fields[field]
+        if field == "keyCode":
+            return int(self.key_code[index])
+        if field == "keyName":
+            return self.names[self.name_id[index]]
+        return None
+
+    def set(self, index, field, value):
+        """Write a field; None removes it"""
+        top_keys, transform_keys = self.layouts[self.layout_id[index]]
+        in_transform = field in TRANSFORM_FIELDS
+        keys = transform_keys if in_transform else top_keys
+
+        if value is None:
+            if field in keys:
+                keys = tuple(key for key in keys if key != field)
+            self._drop_extra(index, field, in_transform)
+            if in_transform:
+                self._column(field)[index] = DEFAULTS[field]
+        else:
+            if field not in keys:
+                keys = keys + (field,)
+            self._store(index, field, value, in_transform)
+
+        layout = (top_keys, keys) if in_transform else (keys, transform_keys)
+        self.layout_id[index] = self._intern_layout(layout)
+
+    def key_name(self, index):
+        return self.get(index, "keyName") or ""
+
+    # Bulk access
+
+    def gather(self, indices):
+        """Transform columns of the given rows, for vectorized operations"""
+        indices = np.asarray(indices, dtype=np.intp)
+        return {
+            "xCoord": self.x[indices],
+            "yCoord": self.y[indices],
+            "size": self.size[indices],
+        }
+
+    def iter_drawable(self):
+        """Yield (index, key_name, x_coord, y_coord, size) for every drawable row"""
+        for index in range(self.count):
+            if self.is_drawable(index):
+                yield (
+                    index,
+                    self.key_name(index),
+                    float(self.x[index]),
+                    float(self.y[index]),
+                    float(self.size[index]),
+                )
+
+    # Serialization
+
+    def button(self, index):
+        """Rebuild the original dictionary of one button"""
+        extras = self.extras[index]
+        if extras is not None and extras.raw is not None:
+            return copy.deepcopy(extras.raw)
+
+        top_keys, transform_keys = self.layouts[self.layout_id[index]]
+        button = {}
+        for field in top_keys:
+            if field == "transform":
+                button["transform"] = {
+                    key: self.get(index, key)
+                    if key in TRANSFORM_FIELDS
+                    else extras.transform_fields[key]
+                    for key in transform_keys
+                }
+            else:
+                button[field] = self.get(index, field)
+        return button
+
+    def to_list(self):
+        return [self.button(index) for index in range(self.count)]
+
+
+def store_keymap(data):
+    """Swap every list of models in keymap data for a ButtonStore, in place"""
+    for key in MODEL_KEYS:
+        models = data.get(key)
+        if isinstance(models, list):
+            data[key] = ButtonStore.from_list(models)
+    return data
+
+
+def plain_keymap(data):
+    """Shallow copy of keymap data with ButtonStores turned back into lists"""
+    plain = None
+    for key in MODEL_KEYS:
+        models = data.get(key)
+        if isinstance(models, ButtonStore):
+            if plain is None:
+                plain = dict(data)
+            plain[key] = models.to_list()
+    return data if plain is None else plain
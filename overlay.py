@@ -0,0 +1,111 @@
+"""Draw keymaps over their screenshots with Pillow, the way the editor shows them
+
+Nothing here touches Tk, so overlays can be rendered in batch jobs and
+worker processes at any resolution. Circles use keymap.circle_geometry like
+the canvas layers, and labels are the models' keyName. Dashed outlines of
+the editor are drawn solid.
+"""
+import functools
+
+from PIL import Image, ImageDraw, ImageFont
+
+import keymap
+
+# Outline color and shape of each model array, bottom to top, as in the
+# editor's layers
+MODEL_STYLES = (
+    ("mouseAreaModel", "#9C27B0", "rectangle"),
+    ("joystickModel", "#4CAF50", "oval"),
+    ("draggableButtonModels", "#E91E63", "oval"),
+    ("buttonModels", "red", "oval"),
+)
+
+# The editor draws 2 px outlines and 14 pt (buttons) or 12 pt (other
+# models) bold labels on an image fitted to the screen; renders scale them
+# with the image width relative to this typical fitted width
+REFERENCE_WIDTH = 1820
+OUTLINE_WIDTH = 2
+LABEL_PIXELS = {"buttonModels": 19}  # 14 pt at 96 dpi
+DEFAULT_LABEL_PIXELS = 16  # 12 pt at 96 dpi
+
+# Bold fonts tried in order before Pillow's built-in one
+FONT_NAMES = (
+    "Arial Bold.ttf",
+    "arialbd.ttf",
+    "DejaVuSans-Bold.ttf",
+    "LiberationSans-Bold.ttf",
+)
+
+
+@functools.lru_cache(maxsize=None)
+def label_font(pixels):
+    for name in FONT_NAMES:
+        try:
+            return ImageFont.truetype(name, pixels)
+        except OSError:
+            continue
+    return ImageFont.load_default(pixels)
+
+
+def iter_shapes(data):
+    """Yield (key, model) for every model with a transform, bottom layer first"""
+    for key, _, _ in MODEL_STYLES:
+        models = data.get(key)
+        if not isinstance(models, list):
+            continue
+        for model in models:
+            if isinstance(model, dict) and isinstance(model.get("transform"), dict):
+                yield key, model
+
+
+def draw_overlay(image, data, labels=True, line_width=None):
+    """Draw every model of keymap data on an image, in place
+
+    line_width defaults to the editor's outline scaled to the image width.
+    """
+    draw = ImageDraw.Draw(image)
+    width, height = image.size
+    scale = width / REFERENCE_WIDTH
+    if line_width is None:
+        line_width = max(1, round(OUTLINE_WIDTH * scale))
+    styles = {key: (color, shape) for key, color, shape in MODEL_STYLES}
+
+    for key, model in iter_shapes(data):
+        color, shape = styles[key]
+        try:
+            center_x, center_y, radius = keymap.button_geometry(
+                model["transform"], width, height
+            )
+            bounds = (
+                center_x - radius,
+                center_y - radius,
+                center_x + radius,
+                center_y + radius,
+            )
+        except TypeError:
+            # Non-numeric transform; the lint window reports it
+            continue
+        if radius > 0:
+            if shape == "rectangle":
+                draw.rectangle(bounds, outline=color, width=line_width)
+            else:
+                draw.ellipse(bounds, outline=color, width=line_width)
+
+        key_name = model.get("keyName")
+        if labels and isinstance(key_name, str) and key_name:
+            pixels = LABEL_PIXELS.get(key, DEFAULT_LABEL_PIXELS)
+            font = label_font(max(6, round(pixels * scale)))
+            draw.text((center_x, center_y), key_name, fill=color, font=font, anchor="mm")
+    return image
+
+
+def render_overlay(image_path, data, scale=1.0, labels=True):
+    """Screenshot at scale (1.0 = full source resolution) with data drawn over it"""
+    with Image.open(image_path) as source:
+        image = source.convert("RGB")
+    if scale != 1.0:
+        size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        image = image.resize(size, Image.Resampling.LANCZOS)
+    if isinstance(data, dict):
+        draw_overlay(image, data, labels)
+    return image
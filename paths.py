@@ -0,0 +1,23 @@
+"""Per-user locations for caches and settings"""
+import os
+import sys
+
+APP_NAME = "PlayCoverKeybindsEditor"
+
+
+def user_cache_dir():
+    """Directory for data that can be rebuilt at any time"""
+    if sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Caches")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, APP_NAME)
+
+
+def user_config_dir():
+    """Directory for settings and session state"""
+    if sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Application Support")
+    else:
+        base = os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config")
+    return os.path.join(base, APP_NAME)
@@ -0,0 +1,169 @@
+"""Opt-in latency histograms for the editor's hot paths
+
+Nothing is wrapped unless profiling is switched on, with --profile or the
+PLAYCOVER_EDITOR_PROFILE environment variable, so there is no cost when off.
+Set the variable to 1 to only show the live window, or to a file path to
+also write the histograms there as JSON on exit.
+"""
+import atexit
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+
+ENV_VAR = "PLAYCOVER_EDITOR_PROFILE"
+
+# Upper bounds of the histogram buckets in milliseconds; the last bucket
+# holds everything slower
+BUCKET_BOUNDS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 16, 25, 50, 100, 250, 500, 1000, 2500)
+
+
+def _round(ms):
+    return None if ms is None else round(ms, 3)
+
+
+class Histogram:
+    """Call count, total and bucketed latencies of one function"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKET_BOUNDS) + 1)
+
+    def record(self, ms):
+        self.count += 1
+        self.total += ms
+        if self.min is None or ms < self.min:
+            self.min = ms
+        if ms > self.max:
+            self.max = ms
+        self.buckets[bisect.bisect_left(BUCKET_BOUNDS, ms)] += 1
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of calls"""
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                if bucket < len(BUCKET_BOUNDS):
+                    return min(BUCKET_BOUNDS[bucket], self.max)
+                return self.max
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "total_ms": round(self.total, 3),
+            "mean_ms": _round(self.total / self.count if self.count else None),
+            "min_ms": _round(self.min),
+            "max_ms": round(self.max, 3),
+            "p50_ms": _round(self.percentile(0.5)),
+            "p95_ms": _round(self.percentile(0.95)),
+            "p99_ms": _round(self.percentile(0.99)),
+            "buckets": {
+                bound: count
+                for bound, count in zip(
+                    [f"<={b}" for b in BUCKET_BOUNDS] + [f">{BUCKET_BOUNDS[-1]}"],
+                    self.buckets,
+                )
+                if count
+            },
+        }
+
+
+class Profiler:
+    """Histograms per instrumented function; safe to record from worker threads"""
+
+    def __init__(self):
+        self.histograms = {}
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+    def record(self, name, ms):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.record(ms)
+
+    def wrap(self, func, name):
+        """Return func timed under name"""
+
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(name, (time.perf_counter() - start) * 1000)
+
+        timed.__wrapped_by_profiler__ = True
+        return timed
+
+    def instrument(self, owner, names, prefix=None):
+        """Replace owner.<name> (a class or module attribute) with a timed version"""
+        prefix = prefix or owner.__name__
+        for name in names:
+            func = getattr(owner, name)
+            if getattr(func, "__wrapped_by_profiler__", False):
+                continue
+            setattr(owner, name, self.wrap(func, f"{prefix}.{name}"))
+
+    def report(self):
+        with self.lock:
+            return {
+                "started": self.started,
+                "elapsed_s": round(time.time() - self.started, 3),
+                "functions": {
+                    name: histogram.summary()
+                    for name, histogram in sorted(self.histograms.items())
+                },
+            }
+
+    def format_table(self):
+        """Plain-text summary, slowest total first"""
+        with self.lock:
+            rows = sorted(
+                self.histograms.items(), key=lambda item: item[1].total, reverse=True
+            )
+            lines = [
+                f"{'function':<34}{'calls':>7}{'mean':>9}{'p95':>9}{'max':>9}{'total':>10}"
+            ]
+            for name, histogram in rows:
+                lines.append(
+                    f"{name:<34}{histogram.count:>7}"
+                    f"{histogram.total / histogram.count:>9.2f}"
+                    f"{histogram.percentile(0.95):>9.2f}"
+                    f"{histogram.max:>9.2f}"
+                    f"{histogram.total:>10.1f}"
+                )
+        return "\n".join(lines)
+
+    def dump(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=2)
+
+
+def setting_from_env():
+    """None when profiling is off, "" to profile without a dump, else the dump path"""
+    value = os.environ.get(ENV_VAR, "").strip()
+    if value.lower() in ("", "0", "false", "no", "off"):
+        return None
+    if value.lower() in ("1", "true", "yes", "on"):
+        return ""
+    return value
+
+
+def start(dump_path=""):
+    """Create a profiler, writing it to dump_path (if any) at exit"""
+    profiler = Profiler()
+    if dump_path:
+        atexit.register(profiler.dump, dump_path)
+    return profiler
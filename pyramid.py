@@ -0,0 +1,99 @@
+"""Multi-resolution tile pyramid for zooming into large screenshots"""
+import math
+
+from PIL import Image
+
+TILE_SIZE = 256
+
+
+class TilePyramid:
+    """Power-of-two reductions of a source image, cut into fixed-size tiles
+
+    Level 0 is the source image and each further level halves it. For a
+    given zoom only the level closest to the on-screen density is sampled,
+    and only the tiles that intersect the view are resampled at all.
+    """
+
+    def __init__(self, image, tile_size=TILE_SIZE):
+        self.image = image
+        self.tile_size = tile_size
+        self.levels = [image]
+
+    @property
+    def size(self):
+        return self.image.size
+
+    def build(self):
+        """Decode the source and compute every reduced level (worker-thread safe)"""
+        self.image.load()
+        image = self.image
+        if image.mode not in ("L", "RGB", "RGBA"):
+            image = image.convert("RGBA")
+        levels = [image]
+        while max(levels[-1].size) > self.tile_size:
+            levels.append(levels[-1].reduce(2))
+        self.levels = levels
+        return self
+
+    def level_for_scale(self, scale):
+        """Pick the coarsest level with at least scale pixels per source pixel"""
+        if scale >= 1:
+            return 0
+        level = int(math.floor(math.log2(1 / scale)))
+        return min(level, len(self.levels) - 1)
+
+    def visible_tiles(self, scale, x1, y1, x2, y2):
+        """Yield (level, col, row, bounds) for tiles intersecting a view rectangle
+
+        scale is screen pixels per source pixel and the rectangle and bounds
+        are in screen (canvas) coordinates.
+        """
+        level = self.level_for_scale(scale)
+        level_width, level_height = self.levels[level].size
+        factor = scale * (2**level)
+        size = self.tile_size
+
+        cols = math.ceil(level_width / size)
+        rows = math.ceil(level_height / size)
+        first_col = max(0, int(x1 / factor) // size)
+        last_col = min(cols - 1, int(x2 / factor) // size)
+        first_row = max(0, int(y1 / factor) // size)
+        last_row = min(rows - 1, int(y2 / factor) // size)
+
+        for row in range(first_row, last_row + 1):
+            for col in range(first_col, last_col + 1):
+                yield level, col, row, self.tile_bounds(scale, level, col, row)
+
+    def tile_bounds(self, scale, level, col, row):
+        """Screen rectangle covered by a tile; neighbours share edges exactly"""
+        level_width, level_height = self.levels[level].size
+        factor = scale * (2**level)
+        size = self.tile_size
+        return (
+            round(col * size * factor),
+            round(row * size * factor),
+            round(min((col + 1) * size, level_width) * factor),
+            round(min((row + 1) * size, level_height) * factor),
+        )
+
+    def render_tile(self, scale, level, col, row):
+        """Return the tile resampled to its on-screen size"""
+        image = self.levels[level]
+        size = self.tile_size
+        box = (
+            col * size,
+            row * size,
+            min((col + 1) * size, image.width),
+            min((row + 1) * size, image.height),
+        )
+        x1, y1, x2, y2 = self.tile_bounds(scale, level, col, row)
+        target = (max(1, x2 - x1), max(1, y2 - y1))
+
+        tile = image.crop(box)
+        if tile.size == target:
+            return tile
+
+        # Show crisp source pixels when zoomed past 1:1
+        if target[0] > tile.width:
+            return tile.resize(target, Image.Resampling.NEAREST)
+        return tile.resize(target, Image.Resampling.LANCZOS)
@@ -0,0 +1,64 @@
+"""The last image/keymap pair and how it was being viewed, kept between launches"""
+import json
+import os
+
+import paths
+
+SESSION_FILE = "session.json"
+
+# Bump when the layout changes; older sessions are then ignored
+VERSION = 1
+
+
+def session_path():
+    return os.path.join(paths.user_config_dir(), SESSION_FILE)
+
+
+def load_session(path=None):
+    """Return the saved session, or None if there is no usable one"""
+    try:
+        with open(path or session_path(), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict) or data.get("version") != VERSION:
+        return None
+    return data
+
+
+def save_session(image_filename, keymap_filename, view, path=None):
+    """Remember a pair of files and the view state of the editor"""
+    # Imported here so reading the session at start-up doesn't load the
+    # keymap module (and plistlib) before the first file dialog
+    import keymap
+
+    path = path or session_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    data = {
+        "version": VERSION,
+        "image": os.path.abspath(image_filename),
+        "keymap": os.path.abspath(keymap_filename),
+        "view": view,
+    }
+    keymap.write_atomic(path, json.dumps(data, indent=2).encode("utf-8"))
+
+
+def restorable_files(data):
+    """(image, keymap) of a session if both files still exist, else None"""
+    if data is None:
+        return None
+    files = (data.get("image"), data.get("keymap"))
+    if all(isinstance(f, str) and os.path.isfile(f) for f in files):
+        return files
+    return None
+
+
+def saved_view(data, image_filename, keymap_filename):
+    """The session's view state if it was saved for this pair of files"""
+    if data is None:
+        return None
+    pair = (os.path.abspath(image_filename), os.path.abspath(keymap_filename))
+    if (data.get("image"), data.get("keymap")) != pair:
+        return None
+    view = data.get("view")
+    return view if isinstance(view, dict) else None
@@ -0,0 +1,158 @@
+"""Uniform grid index over button circles for hit-testing and neighbour queries"""
+import math
+
+# Circles covering more cells than this are kept in a separate list that every
+# query checks, so one absurdly large button can't flood the grid
+MAX_CELLS_PER_CIRCLE = 256
+
+
+class SpatialGrid:
+    """Buckets circles by the grid cells their bounding boxes cover
+
+    Point and neighbour queries only look at the few cells around the query,
+    so they cost O(k) in the number of nearby circles rather than O(n).
+    """
+
+    def __init__(self, cell_size=64):
+        self.cell_size = float(cell_size)
+        self.cells = {}  # (col, row) -> set of keys
+        self.circles = {}  # key -> (center_x, center_y, radius, cells)
+        self.oversized = set()
+
+    def __len__(self):
+        return len(self.circles)
+
+    def __contains__(self, key):
+        return key in self.circles
+
+    def clear(self):
+        self.cells = {}
+        self.circles = {}
+        self.oversized = set()
+
+    def _cell_range(self, x1, y1, x2, y2):
+        size = self.cell_size
+        for col in range(math.floor(x1 / size), math.floor(x2 / size) + 1):
+            for row in range(math.floor(y1 / size), math.floor(y2 / size) + 1):
+                yield col, row
+
+    def _circle_cells(self, center_x, center_y, radius):
+        size = self.cell_size
+        cols = math.floor((center_x + radius) / size) - math.floor(
+            (center_x - radius) / size
+        )
+        rows = math.floor((center_y + radius) / size) - math.floor(
+            (center_y - radius) / size
+        )
+        if (cols + 1) * (rows + 1) > MAX_CELLS_PER_CIRCLE:
+            return None
+        return tuple(
+            self._cell_range(
+                center_x - radius, center_y - radius, center_x + radius, center_y + radius
+            )
+        )
+
+    def _add(self, key, cells):
+        if cells is None:
+            self.oversized.add(key)
+            return
+        for cell in cells:
+            self.cells.setdefault(cell, set()).add(key)
+
+    def insert(self, key, center_x, center_y, radius):
+        """Add a circle, replacing any previous entry for key"""
+        if key in self.circles:
+            self.remove(key)
+
+        cells = self._circle_cells(center_x, center_y, radius)
+        self._add(key, cells)
+        self.circles[key] = (center_x, center_y, radius, cells)
+
+    def move(self, key, center_x, center_y, radius=None):
+        """Reposition a circle, only touching buckets when it changes cells"""
+        _, _, old_radius, old_cells = self.circles[key]
+        if radius is None:
+            radius = old_radius
+
+        cells = self._circle_cells(center_x, center_y, radius)
+        if cells != old_cells:
+            self.remove(key)
+            self._add(key, cells)
+        self.circles[key] = (center_x, center_y, radius, cells)
+
+    def remove(self, key):
+        entry = self.circles.pop(key, None)
+        if entry is None:
+            return
+        if entry[3] is None:
+            self.oversized.discard(key)
+            return
+        for cell in entry[3]:
+            bucket = self.cells.get(cell)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self.cells[cell]
+
+    def _candidates(self, x1, y1, x2, y2):
+        found = set(self.oversized)
+        for cell in self._cell_range(x1, y1, x2, y2):
+            bucket = self.cells.get(cell)
+            if bucket:
+                found.update(bucket)
+        return found
+
+    def hit(self, x, y, tolerance=0.0):
+        """Return the key of the circle under (x, y), or None
+
+        When circles overlap the one whose centre is nearest wins, so picking
+        follows geometry rather than Tk stacking order. A point up to
+        tolerance pixels outside a circle's edge still counts as a hit.
+        """
+        best_key = None
+        best_rank = None
+
+        candidates = self._candidates(
+            x - tolerance, y - tolerance, x + tolerance, y + tolerance
+        )
+        for key in candidates:
+            center_x, center_y, radius, _ = self.circles[key]
+            distance = math.hypot(x - center_x, y - center_y)
+            outside = max(0.0, distance - radius)
+            if outside > tolerance:
+                continue
+            rank = (outside, distance)
+            if best_rank is None or rank < best_rank:
+                best_key = key
+                best_rank = rank
+
+        return best_key
+
+    def in_rect(self, x1, y1, x2, y2):
+        """Return the keys of circles whose centres lie inside a rectangle"""
+        x1, x2 = min(x1, x2), max(x1, x2)
+        y1, y2 = min(y1, y2), max(y1, y2)
+        result = []
+        for key in self._candidates(x1, y1, x2, y2):
+            center_x, center_y, _, _ = self.circles[key]
+            if x1 <= center_x <= x2 and y1 <= center_y <= y2:
+                result.append(key)
+        return result
+
+    def neighbours(self, key):
+        """Return the keys of every other circle that overlaps the circle for key"""
+        center_x, center_y, radius, _ = self.circles[key]
+        return self.overlapping(center_x, center_y, radius, exclude=key)
+
+    def overlapping(self, center_x, center_y, radius, exclude=None):
+        """Return the keys of circles that intersect the given circle"""
+        result = []
+        for other in self._candidates(
+            center_x - radius, center_y - radius, center_x + radius, center_y + radius
+        ):
+            if other == exclude:
+                continue
+            other_x, other_y, other_radius, _ = self.circles[other]
+            if math.hypot(center_x - other_x, center_y - other_y) < radius + other_radius:
+                result.append(other)
+        return result
@@ -0,0 +1,116 @@
+"""Thumbnails of screenshots with their keymap drawn over them, for the library
+
+Screenshots are decoded at a reduced scale (JPEG draft mode, Image.reduce)
+and the models are drawn over them by overlay.draw_overlay. Rendering runs
+on a process pool and results land in a cache keyed by the content hashes
+of the image and the keymap, so editing either one invalidates the entry.
+"""
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import imaging
+import keymap
+import overlay
+import paths
+from image_cache import ScaledImageCache
+
+# Largest thumbnail; the screenshot's aspect ratio is kept
+THUMBNAIL_SIZE = (320, 200)
+
+# Bump when drawing changes so cached thumbnails are rendered again
+RENDER_VERSION = 2
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+HASH_CHUNK = 1024 * 1024
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ThumbnailCache(ScaledImageCache):
+    """Thumbnails keyed by the content of the screenshot and keymap they show"""
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        super().__init__(
+            directory or os.path.join(paths.user_cache_dir(), "thumbnails"), max_bytes
+        )
+
+    def thumbnail_key(self, image_digest, keymap_digest, size):
+        identity = "\0".join(
+            [str(RENDER_VERSION), image_digest, keymap_digest, f"{size[0]}x{size[1]}"]
+        )
+        return hashlib.sha256(identity.encode("utf-8")).hexdigest()
+
+    def lookup(self, key):
+        """Path of a cached thumbnail, marked as recently used, or None"""
+        path = self._path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+
+def render_thumbnail(image_path, keymap_path=None, size=THUMBNAIL_SIZE):
+    """Decode a reduced screenshot and draw a keymap over it"""
+    width, height = imaging.read_size(image_path)
+    thumbnail_size = imaging.fit_size(width, height, *size)
+    image = imaging.decode_preview(image_path, thumbnail_size).convert("RGB")
+    if keymap_path is not None:
+        data = keymap.load_keymap(keymap_path)
+        if isinstance(data, dict):
+            # Labels would be unreadable at this size
+            overlay.draw_overlay(image, data, labels=False)
+    return image
+
+
+def thumbnail_task(args):
+    """Render one thumbnail into the cache unless it is there already
+
+    Returns (image_path, keymap_path, thumbnail_path, error). Runs in worker
+    processes, so only paths cross the process boundary, not pixels.
+    """
+    image_path, keymap_path, size, directory = args
+    try:
+        cache = ThumbnailCache(directory)
+        key = cache.thumbnail_key(
+            file_digest(image_path),
+            file_digest(keymap_path) if keymap_path is not None else "",
+            size,
+        )
+        path = cache.lookup(key)
+        if path is None:
+            cache.store(key, render_thumbnail(image_path, keymap_path, size), evict=False)
+            path = cache.lookup(key)
+            if path is None:
+                raise Exception("Failed to write the thumbnail cache")
+    except Exception as e:
+        return image_path, keymap_path, None, str(e)
+    return image_path, keymap_path, path, None
+
+
+def render_thumbnails(pairs, size=THUMBNAIL_SIZE, directory=None, jobs=None):
+    """Yield (image_path, keymap_path, thumbnail_path, error) as each pair finishes
+
+    pairs are (image_path, keymap_path or None). With more than one pair
+    and jobs != 1 they are rendered on a process pool.
+    """
+    cache = ThumbnailCache(directory)
+    tasks = [(image, km, tuple(size), cache.directory) for image, km in pairs]
+    if jobs == 1 or len(tasks) < 2:
+        for task in tasks:
+            yield thumbnail_task(task)
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(thumbnail_task, task) for task in tasks]
+            for future in as_completed(futures):
+                yield future.result()
+    if tasks and os.path.isdir(cache.directory):
+        cache.evict()
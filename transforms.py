@@ -0,0 +1,96 @@
+"""Vectorized bulk operations on the transforms of selected buttons
+
+Every function takes and returns a dict of NumPy columns ("xCoord",
+"yCoord", "size"), one entry per selected button (see ButtonStore.gather),
+so a whole selection is transformed with a handful of array operations.
+"""
+import numpy as np
+
+from keymap import MAX_BUTTON_SIZE, MIN_BUTTON_SIZE
+
+# Snapped coordinates are rounded so grid positions serialize cleanly
+SNAP_DECIMALS = 6
+
+
+def radii(columns, aspect):
+    """Circle radii in normalized x and y units; aspect is width / height"""
+    # Size is a percentage of the image width, so the diameter is size / 100
+    radius_x = columns["size"] / 200
+    return radius_x, radius_x * aspect
+
+
+def snap(value, step):
+    """Round a normalized coordinate to the nearest multiple of step"""
+    return round(round(value / step) * step, SNAP_DECIMALS)
+
+
+def move(columns, dx, dy, decimals=None):
+    """Shift every button by (dx, dy) in normalized units"""
+    x = columns["xCoord"] + dx
+    y = columns["yCoord"] + dy
+    if decimals is not None:
+        x = np.round(x, decimals)
+        y = np.round(y, decimals)
+    return {"xCoord": x, "yCoord": y, "size": columns["size"]}
+
+
+def scale(columns, factor, pivot_x=None, pivot_y=None):
+    """Scale positions and sizes about a pivot (default: the selection centre)"""
+    if pivot_x is None:
+        pivot_x = float(columns["xCoord"].mean())
+    if pivot_y is None:
+        pivot_y = float(columns["yCoord"].mean())
+    return {
+        "xCoord": pivot_x + (columns["xCoord"] - pivot_x) * factor,
+        "yCoord": pivot_y + (columns["yCoord"] - pivot_y) * factor,
+        "size": np.clip(columns["size"] * factor, MIN_BUTTON_SIZE, MAX_BUTTON_SIZE),
+    }
+
+
+def align(columns, edge, aspect):
+    """Line buttons up on a shared edge or centre line
+
+    edge is one of "left", "center", "right", "top", "middle", "bottom".
+    """
+    radius_x, radius_y = radii(columns, aspect)
+    x = columns["xCoord"]
+    y = columns["yCoord"]
+    result = dict(columns)
+
+    if edge == "left":
+        result["xCoord"] = (x - radius_x).min() + radius_x
+    elif edge == "right":
+        result["xCoord"] = (x + radius_x).max() - radius_x
+    elif edge == "center":
+        result["xCoord"] = np.full_like(x, x.mean())
+    elif edge == "top":
+        result["yCoord"] = (y - radius_y).min() + radius_y
+    elif edge == "bottom":
+        result["yCoord"] = (y + radius_y).max() - radius_y
+    elif edge == "middle":
+        result["yCoord"] = np.full_like(y, y.mean())
+    else:
+        raise ValueError(f"Unknown alignment: {edge}")
+    return result
+
+
+def distribute(columns, axis):
+    """Space button centres evenly between the outermost ones along "x" or "y" """
+    field = "xCoord" if axis == "x" else "yCoord"
+    values = columns[field]
+    result = dict(columns)
+    if len(values) < 3:
+        return result
+
+    order = np.argsort(values, kind="stable")
+    spaced = np.empty_like(values)
+    spaced[order] = np.linspace(values[order[0]], values[order[-1]], len(values))
+    result[field] = spaced
+    return result
+
+
+def set_size(columns, size):
+    """Give every button the same size"""
+    result = dict(columns)
+    result["size"] = np.full_like(columns["size"], size)
+    return result
@@ -0,0 +1,170 @@
+"""Notice when files being edited are changed on disk by another program
+
+On Linux the folders holding the files are watched with inotify, so a check
+is one non-blocking read; elsewhere, or if inotify can't be used, every
+watched file is stat()ed on each check instead. Either way a file is only
+reported when its mtime, size or inode differ from when it was last seen,
+so events for neighbouring files (or the editor's own journal) cost nothing.
+"""
+import ctypes
+import ctypes.util
+import os
+import struct
+import sys
+
+# Milliseconds between checks
+INOTIFY_INTERVAL = 250
+POLL_INTERVAL = 1000
+
+# Event bits from <sys/inotify.h>
+IN_ATTRIB = 0x004
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+
+# Writes in place, atomic renames over the file, and deletions
+WATCH_MASK = (
+    IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+)
+
+# struct inotify_event: wd, mask, cookie, len, then len bytes of name
+EVENT_HEADER = struct.Struct("iIII")
+READ_SIZE = 64 * 1024
+
+
+def signature(path):
+    """(mtime_ns, size, inode) of a file, or None if it doesn't exist"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+class Inotify:
+    """Just enough of the Linux inotify API, through ctypes"""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = (ctypes.c_int, ctypes.c_int)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+    def add_watch(self, directory):
+        wd = self._add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), directory)
+        return wd
+
+    def rm_watch(self, wd):
+        self._rm_watch(self.fd, wd)
+
+    def read_events(self):
+        """Yield (wd, mask, name) for every queued event without blocking"""
+        while True:
+            try:
+                buffer = os.read(self.fd, READ_SIZE)
+            except BlockingIOError:
+                return
+            offset = 0
+            while offset < len(buffer):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(buffer, offset)
+                offset += EVENT_HEADER.size
+                name = buffer[offset : offset + length].rstrip(b"\0")
+                offset += length
+                yield wd, mask, os.fsdecode(name)
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FileWatcher:
+    """Files to watch and the state each was last seen in
+
+    Call changes() periodically (every interval ms) from the GUI thread.
+    """
+
+    def __init__(self, use_inotify=True):
+        self.signatures = {}  # path -> signature when last seen
+        self.directories = {}  # directory -> inotify watch descriptor
+        self.inotify = None
+        if use_inotify and sys.platform.startswith("linux"):
+            try:
+                self.inotify = Inotify()
+            except (OSError, AttributeError):
+                # No inotify in this libc, or out of instances
+                self.inotify = None
+        self.interval = INOTIFY_INTERVAL if self.inotify else POLL_INTERVAL
+
+    def _fall_back_to_polling(self):
+        self.inotify.close()
+        self.inotify = None
+        self.directories = {}
+        self.interval = POLL_INTERVAL
+
+    def watch(self, path):
+        """Start watching a file, taking its current state as seen"""
+        path = os.path.abspath(path)
+        self.signatures[path] = signature(path)
+        directory = os.path.dirname(path)
+        if self.inotify is not None and directory not in self.directories:
+            try:
+                self.directories[directory] = self.inotify.add_watch(directory)
+            except OSError:
+                # e.g. the watch limit is reached
+                self._fall_back_to_polling()
+
+    def unwatch(self, path):
+        path = os.path.abspath(path)
+        self.signatures.pop(path, None)
+        directory = os.path.dirname(path)
+        if directory in self.directories and not any(
+            os.path.dirname(other) == directory for other in self.signatures
+        ):
+            self.inotify.rm_watch(self.directories.pop(directory))
+
+    def acknowledge(self, path):
+        """Take a file's current state as seen, e.g. after writing it ourselves"""
+        path = os.path.abspath(path)
+        if path in self.signatures:
+            self.signatures[path] = signature(path)
+
+    def changes(self):
+        """Watched files changed since the last check; deleted files aren't listed"""
+        if self.inotify is None:
+            candidates = list(self.signatures)
+        else:
+            folders = {wd: directory for directory, wd in self.directories.items()}
+            candidates = set()
+            for wd, mask, name in self.inotify.read_events():
+                if mask & IN_Q_OVERFLOW:
+                    # Events were dropped; look at everything
+                    candidates.update(self.signatures)
+                elif wd in folders and name:
+                    candidates.add(os.path.join(folders[wd], name))
+
+        changed = []
+        for path in candidates:
+            if path not in self.signatures:
+                continue
+            current = signature(path)
+            if current != self.signatures[path]:
+                self.signatures[path] = current
+                if current is not None:
+                    changed.append(path)
+        return changed
+
+    def close(self):
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
+        self.directories = {}